@@ -0,0 +1,161 @@
+from pathlib import Path
+from typing import List, NamedTuple
+
+from pmt.blocks import BlockReference, BlockSnapshot
+
+INFRA_STYLES = ("slug", "variable", "load", "none")
+
+_HEADER = '''\
+"""Generated deployment script {index}."""
+from prefect import flow
+from prefect.blocks.core import Block
+from prefect.deployments import Deployment
+from prefect.filesystems import GitHub
+from prefect.infrastructure import KubernetesJob
+
+'''
+
+_HELPER = """
+
+def helper_{index}(value: int) -> int:
+    total = value
+    for i in range({index}):
+        total += i
+    return total
+"""
+
+_FLOW = """
+
+@flow(log_prints=True)
+def flow_{index}(name: str = "world"):
+    print(f"Hello {{name}} from flow {index}")
+"""
+
+_CALL = """\
+    Deployment.build_from_flow(
+        flow_{index},
+        name="deployment-{file_index}-{index}",
+        storage=GitHub.load("repo-{file_index}"),
+        entrypoint="flows/flow_{file_index}.py:flow_{index}",{infrastructure}
+        tags=["generated", "file-{file_index}"],
+        version="{index}",
+        work_pool_name="pool-{index}",
+        parameters={{"name": "Marvin", "index": {index}}},
+    )
+"""
+
+
+class Corpus(NamedTuple):
+    """
+    A generated set of deployment scripts and the block documents they use.
+    """
+
+    paths: List[Path]
+    snapshot: BlockSnapshot
+    calls: int
+
+
+def _infrastructure_style(infra_style: str, index: int) -> str:
+    if infra_style == "mixed":
+        return INFRA_STYLES[index % len(INFRA_STYLES)]
+    return infra_style
+
+
+def generate_module(
+    file_index: int,
+    calls_per_file: int = 5,
+    infra_style: str = "mixed",
+    helpers: int = 10,
+    blocks: int = 10,
+) -> str:
+    """
+    Render a deployment script with `calls_per_file` calls to
+    `Deployment.build_from_flow` and `helpers` unrelated functions to pad out the
+    module.
+
+    `infra_style` controls how each call references its infrastructure block:
+    as a block slug, through a variable, with `KubernetesJob.load`, without any
+    infrastructure, or, with `mixed`, cycling through each of those styles.
+    Calls reference `blocks` distinct block documents between them.
+    """
+    source = _HEADER.format(index=file_index)
+    source += "".join(_HELPER.format(index=i) for i in range(helpers))
+    source += "".join(_FLOW.format(index=i) for i in range(calls_per_file))
+    source += '\n\nif __name__ == "__main__":\n'
+    for i in range(calls_per_file):
+        block_name = f"job-{(file_index * calls_per_file + i) % blocks}"
+        style = _infrastructure_style(infra_style, i)
+        if style == "slug":
+            infrastructure = f'\n        infrastructure="kubernetes-job/{block_name}",'
+        elif style == "variable":
+            source += f'    infra_{i} = Block.load("kubernetes-job/{block_name}")\n'
+            infrastructure = f"\n        infrastructure=infra_{i},"
+        elif style == "load":
+            infrastructure = (
+                f'\n        infrastructure=KubernetesJob.load("{block_name}"),'
+            )
+        elif style == "none":
+            infrastructure = ""
+        else:
+            raise ValueError(
+                f"Unknown infrastructure style {style!r}. Expected one of"
+                f" {', '.join(INFRA_STYLES + ('mixed',))}."
+            )
+        source += _CALL.format(
+            index=i, file_index=file_index, infrastructure=infrastructure
+        )
+    return source
+
+
+def generate_snapshot(blocks: int = 10) -> BlockSnapshot:
+    """
+    A block snapshot with the block documents referenced by generated modules.
+    Every other block configures a custom image.
+    """
+    return BlockSnapshot(
+        {
+            BlockReference("kubernetes-job", f"job-{i}"): {
+                "image": (
+                    f"registry.example.com/flows:{i}"
+                    if i % 2 == 0
+                    else "prefecthq/prefect:2-latest"
+                ),
+                "namespace": "default",
+                "env": {"INDEX": str(i)},
+            }
+            for i in range(blocks)
+        }
+    )
+
+
+def generate_corpus(
+    directory: Path,
+    files: int = 100,
+    calls_per_file: int = 5,
+    infra_style: str = "mixed",
+    helpers: int = 10,
+    blocks: int = 10,
+) -> Corpus:
+    """
+    Write `files` generated deployment scripts to `directory` and return their
+    paths along with a snapshot of the block documents they reference. See
+    `generate_module` for a description of the options.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for file_index in range(files):
+        path = directory / f"flow_{file_index}.py"
+        path.write_text(
+            generate_module(
+                file_index,
+                calls_per_file=calls_per_file,
+                infra_style=infra_style,
+                helpers=helpers,
+                blocks=blocks,
+            )
+        )
+        paths.append(path)
+    return Corpus(
+        paths=paths, snapshot=generate_snapshot(blocks), calls=files * calls_per_file
+    )
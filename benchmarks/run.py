@@ -0,0 +1,252 @@
+import ast
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import typer
+from rich import print
+from rich.table import Table
+from typing_extensions import Annotated
+
+from benchmarks.corpus import INFRA_STYLES, Corpus, generate_corpus
+from pmt.blocks import BlockDocumentCache
+from pmt.cache import pmt_version
+from pmt.transformers import BuildFromFlowTransformer
+from pmt.formatting import default_formatter
+from pmt.utils import (
+    convert_ast_node_to_source_code,
+    convert_ast_nodes_to_source_code,
+)
+
+PHASES = ("parse", "transform", "resolve_blocks", "format")
+
+app = typer.Typer()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(corpus: Corpus) -> Dict[str, float]:
+    """
+    Migrate every file in `corpus` once and return the wall time spent in each
+    phase, in seconds.
+
+    Blocks are resolved from the corpus snapshot through a fresh offline block
+    cache and formatted code is not memoized between runs, so no Prefect API is
+    involved and every run starts cold.
+    """
+    sources = [path.read_bytes() for path in corpus.paths]
+    timings = dict.fromkeys(PHASES, 0.0)
+
+    start = time.perf_counter()
+    trees = [ast.parse(source) for source in sources]
+    timings["parse"] += time.perf_counter() - start
+
+    block_cache = BlockDocumentCache(source=corpus.snapshot)
+    start = time.perf_counter()
+    transformers = []
+    for path, tree in zip(corpus.paths, trees):
+        transformer = BuildFromFlowTransformer(
+            current_file=path, tree=tree, block_cache=block_cache
+        )
+        transformer.collect(tree)
+        transformers.append(transformer)
+    timings["transform"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for transformer in transformers:
+        for call in transformer.calls:
+            if call.infrastructure:
+                call.infrastructure.block_document_data
+    timings["resolve_blocks"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for transformer, tree in zip(transformers, trees):
+        transformer.rewrite(tree)
+    timings["transform"] += time.perf_counter() - start
+
+    default_formatter().clear()
+    start = time.perf_counter()
+    for transformer, tree in zip(transformers, trees):
+        convert_ast_nodes_to_source_code(
+            [call.node for call in transformer.calls]
+            + [call.updated_node for call in transformer.calls]
+        )
+        convert_ast_node_to_source_code(tree)
+    timings["format"] += time.perf_counter() - start
+
+    return timings
+
+
+def run_benchmark(corpus: Corpus, repeats: int = 3) -> Dict[str, dict]:
+    """
+    Run `run_once` `repeats` times and summarize the time spent in each phase.
+    """
+    runs = [run_once(corpus) for _ in range(repeats)]
+    return {
+        phase: {
+            "min": min(run[phase] for run in runs),
+            "median": statistics.median(run[phase] for run in runs),
+            "mean": statistics.mean(run[phase] for run in runs),
+            "runs": [run[phase] for run in runs],
+        }
+        for phase in PHASES
+    }
+
+
+def compare_results(baseline: dict, results: dict) -> Dict[str, float]:
+    """
+    The ratio of the median time of each phase in `results` to the median time
+    in `baseline`. Ratios above 1 are regressions.
+    """
+    return {
+        phase: results["phases"][phase]["median"] / baseline["phases"][phase]["median"]
+        for phase in PHASES
+        if phase in baseline["phases"] and baseline["phases"][phase]["median"]
+    }
+
+
+def _print_results(results: dict, ratios: Dict[str, float]):
+    table = Table(
+        title=(
+            f"{results['corpus']['files']} files,"
+            f" {results['corpus']['calls']} calls,"
+            f" {results['repeats']} repeats"
+        )
+    )
+    table.add_column("Phase")
+    table.add_column("Min (s)", justify="right")
+    table.add_column("Median (s)", justify="right")
+    if ratios:
+        table.add_column("vs. baseline", justify="right")
+    for phase in PHASES:
+        row = [
+            phase,
+            f"{results['phases'][phase]['min']:.4f}",
+            f"{results['phases'][phase]['median']:.4f}",
+        ]
+        if ratios:
+            ratio = ratios.get(phase)
+            if ratio is None:
+                row.append("")
+            else:
+                color = "red" if ratio > 1.1 else "green" if ratio < 0.9 else "dim"
+                row.append(f"[{color}]{ratio:.2f}x[/]")
+        table.add_row(*row)
+    print(table)
+
+
+@app.command()
+def main(
+    files: Annotated[
+        int, typer.Option(help="Number of generated files in the corpus.")
+    ] = 100,
+    calls_per_file: Annotated[
+        int,
+        typer.Option(help="Number of Deployment.build_from_flow calls per file."),
+    ] = 5,
+    infra_style: Annotated[
+        str,
+        typer.Option(
+            help=(
+                "How calls reference their infrastructure: slug, variable, load,"
+                " none, or mixed."
+            )
+        ),
+    ] = "mixed",
+    helpers: Annotated[
+        int,
+        typer.Option(help="Number of unrelated functions to pad each module with."),
+    ] = 10,
+    blocks: Annotated[
+        int, typer.Option(help="Number of distinct infrastructure blocks.")
+    ] = 10,
+    repeats: Annotated[int, typer.Option(help="Number of timed runs.")] = 3,
+    corpus_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            help=(
+                "Directory to write the corpus to. A temporary directory is used"
+                " if not provided."
+            )
+        ),
+    ] = None,
+    output: Annotated[
+        Optional[Path],
+        typer.Option("--output", "-o", help="File to write JSON results to."),
+    ] = None,
+    compare: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            dir_okay=False,
+            help="JSON results from an earlier run to compare against.",
+        ),
+    ] = None,
+):
+    """
+    Benchmark the phases of upgrading a generated corpus of deployment scripts.
+    """
+    if infra_style not in INFRA_STYLES + ("mixed",):
+        raise typer.BadParameter(
+            f"Expected one of {', '.join(INFRA_STYLES + ('mixed',))}.",
+            param_hint="'--infra-style'",
+        )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = generate_corpus(
+            corpus_dir or Path(temp_dir),
+            files=files,
+            calls_per_file=calls_per_file,
+            infra_style=infra_style,
+            helpers=helpers,
+            blocks=blocks,
+        )
+        phases = run_benchmark(corpus, repeats=repeats)
+        corpus_bytes = sum(path.stat().st_size for path in corpus.paths)
+
+    results = {
+        "pmt_version": pmt_version(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {
+            "files": files,
+            "calls_per_file": calls_per_file,
+            "calls": corpus.calls,
+            "infra_style": infra_style,
+            "helpers": helpers,
+            "blocks": blocks,
+            "bytes": corpus_bytes,
+        },
+        "repeats": repeats,
+        "phases": phases,
+    }
+
+    ratios: Dict[str, float] = {}
+    if compare:
+        ratios = compare_results(json.loads(compare.read_text()), results)
+    _print_results(results, ratios)
+
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+        print(f"Results written to [blue]{output}[/].")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,80 @@
+"""
+Upgrade code to new versions of the Prefect Python API.
+
+The functions and classes exported here can be used to run upgrades in-process
+instead of through the `pmt` command line interface:
+
+    import pmt
+
+    block_cache = pmt.BlockDocumentCache()
+    for migration in pmt.migrate_files(
+        pmt.find_python_files(["flows/"]),
+        render_source=True,
+        block_cache=block_cache,
+    ):
+        for call in migration.calls:
+            print(migration.path, call.span, call.updated_code)
+
+Attributes are imported on first access so that importing `pmt` stays cheap.
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pmt.blocks import (
+        BlockDocumentCache,
+        BlockReference,
+        BlockSnapshot,
+        InMemoryBlockSource,
+    )
+    from pmt.cache import MigrationCache
+    from pmt.files import find_python_files
+    from pmt.migrate import (
+        CallMigration,
+        FileMigration,
+        Span,
+        migrate_file,
+        migrate_files,
+        migrate_source,
+    )
+
+_EXPORTS = {
+    "BlockDocumentCache": "pmt.blocks",
+    "BlockReference": "pmt.blocks",
+    "BlockSnapshot": "pmt.blocks",
+    "InMemoryBlockSource": "pmt.blocks",
+    "MigrationCache": "pmt.cache",
+    "find_python_files": "pmt.files",
+    "CallMigration": "pmt.migrate",
+    "FileMigration": "pmt.migrate",
+    "Span": "pmt.migrate",
+    "migrate_file": "pmt.migrate",
+    "migrate_files": "pmt.migrate",
+    "migrate_source": "pmt.migrate",
+}
+
+__all__ = [
+    "BlockDocumentCache",
+    "BlockReference",
+    "BlockSnapshot",
+    "InMemoryBlockSource",
+    "MigrationCache",
+    "find_python_files",
+    "CallMigration",
+    "FileMigration",
+    "Span",
+    "migrate_file",
+    "migrate_files",
+    "migrate_source",
+]
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
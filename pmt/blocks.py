@@ -0,0 +1,478 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pmt.options import DEFAULT_CONCURRENCY
+from pmt.profiling import count, phase
+
+_CAMEL_CASE_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+
+
+def block_type_slug_from_class_name(class_name: str) -> str:
+    """
+    Convert a block class name into the block type slug it is registered under
+    by default, e.g. `KubernetesJob` -> `kubernetes-job`.
+    """
+    return _CAMEL_CASE_BOUNDARY.sub("-", class_name).lower()
+
+
+class BlockReference(NamedTuple):
+    """
+    A normalized reference to a saved block document.
+    """
+
+    block_type_slug: str
+    block_document_name: str
+
+    @classmethod
+    def from_slug(cls, slug: str) -> "BlockReference":
+        block_type_slug, _, block_document_name = slug.partition("/")
+        if not block_type_slug or not block_document_name:
+            raise ValueError(
+                f"Invalid block slug {slug!r}. Block slugs must be of the form"
+                " '<block-type-slug>/<block-document-name>'."
+            )
+        return cls(block_type_slug, block_document_name)
+
+    @classmethod
+    def from_class_name(
+        cls, class_name: str, block_document_name: str
+    ) -> "BlockReference":
+        return cls(block_type_slug_from_class_name(class_name), block_document_name)
+
+    @property
+    def slug(self) -> str:
+        return f"{self.block_type_slug}/{self.block_document_name}"
+
+    def __str__(self):
+        return self.slug
+
+
+class BlockNotFoundError(LookupError):
+    """
+    Raised when a block document cannot be resolved without the Prefect API.
+    """
+
+
+class BlockSource(ABC):
+    """
+    Where block documents missing from a `BlockDocumentCache` are read from.
+
+    Offline sources never reach the Prefect API: blocks missing from them are
+    reported as not found instead of being loaded by evaluating the code that
+    references them.
+    """
+
+    offline = False
+
+    @abstractmethod
+    def read_many(
+        self,
+        references: Iterable[BlockReference],
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> Dict[BlockReference, dict]:
+        """
+        Read the data for many block documents, omitting any that do not exist.
+        """
+        raise NotImplementedError
+
+    def read(self, reference: BlockReference) -> Optional[dict]:
+        """
+        Read the data for a single block document, returning `None` if it does
+        not exist.
+        """
+        return self.read_many([reference]).get(reference)
+
+
+class PrefectBlockSource(BlockSource):
+    """
+    Reads block documents from the Prefect API.
+    """
+
+    def read_many(
+        self,
+        references: Iterable[BlockReference],
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> Dict[BlockReference, dict]:
+        import asyncio
+
+        with phase("load_blocks"):
+            return asyncio.run(read_block_documents(references, concurrency))
+
+
+class InMemoryBlockSource(BlockSource):
+    """
+    Serves block documents from memory, without a Prefect server, e.g. for tests
+    and dry runs. Block documents are keyed by `BlockReference` or by slug, e.g.
+    `kubernetes-job/my-job`.
+    """
+
+    offline = True
+
+    def __init__(self, block_documents: Mapping[Union[str, BlockReference], dict]):
+        self._block_documents = {
+            (
+                reference
+                if isinstance(reference, BlockReference)
+                else BlockReference.from_slug(reference)
+            ): data
+            for reference, data in block_documents.items()
+        }
+
+    def __len__(self):
+        return len(self._block_documents)
+
+    def __contains__(self, reference: BlockReference) -> bool:
+        return reference in self._block_documents
+
+    def get(self, reference: BlockReference) -> Optional[dict]:
+        return self._block_documents.get(reference)
+
+    def read_many(
+        self,
+        references: Iterable[BlockReference],
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> Dict[BlockReference, dict]:
+        return {
+            reference: self._block_documents[reference]
+            for reference in references
+            if reference in self._block_documents
+        }
+
+    @classmethod
+    def from_file(cls, path: Path) -> "InMemoryBlockSource":
+        """
+        Load block documents from a snapshot written by `BlockSnapshot.dump` or
+        from a JSON object mapping block slugs to block document data.
+        """
+        data = json.loads(Path(path).read_text())
+        if "version" in data:
+            return BlockSnapshot.load(path)
+        return cls(data)
+
+    def _serialize(self) -> str:
+        blocks = {
+            reference.slug: self._block_documents[reference]
+            for reference in sorted(self._block_documents)
+        }
+        return json.dumps(
+            {"version": BlockSnapshot.version, "blocks": blocks},
+            separators=(",", ":"),
+            sort_keys=True,
+        )
+
+    @property
+    def digest(self) -> str:
+        """
+        A digest of the block documents in the source.
+        """
+        return hashlib.sha256(self._serialize().encode()).hexdigest()
+
+
+class BlockSnapshot(InMemoryBlockSource):
+    """
+    A set of block documents exported from the Prefect API so that blocks can be
+    resolved later without network access.
+    """
+
+    version = 1
+
+    @classmethod
+    def load(cls, path: Path) -> "BlockSnapshot":
+        snapshot = json.loads(Path(path).read_text())
+        if snapshot.get("version") != cls.version:
+            raise ValueError(
+                f"Unsupported block snapshot version {snapshot.get('version')!r} in"
+                f" {path}."
+            )
+        return cls(snapshot["blocks"])
+
+    def dump(self, path: Path):
+        Path(path).write_text(self._serialize())
+
+
+_default_source: Optional[BlockSource] = None
+
+
+def default_block_source() -> BlockSource:
+    """
+    The source used by caches created without one: the Prefect API unless
+    another source is in use with `use_block_source`.
+    """
+    if _default_source is None:
+        return PrefectBlockSource()
+    return _default_source
+
+
+@contextmanager
+def use_block_source(source: BlockSource) -> Iterator[BlockSource]:
+    """
+    Use `source` for every `BlockDocumentCache` created without a source while
+    the context is active, e.g. to run code that expects the Prefect API
+    against an `InMemoryBlockSource`.
+    """
+    global _default_source
+    previous_source = _default_source
+    _default_source = source
+    try:
+        yield source
+    finally:
+        _default_source = previous_source
+
+
+class BlockDocumentCache:
+    """
+    A cache of block document data keyed by `BlockReference`.
+
+    Entries are always kept in memory for the lifetime of the cache. If `path` is
+    provided, entries are also persisted to that directory so that they can be
+    reused by later runs. Persisted entries older than `ttl` seconds are ignored
+    and, when `max_entries` is set, the least recently written entries are
+    evicted once the directory grows beyond that many entries. Entries are
+    evicted in batches, so the directory is only listed once every
+    `max_entries // 10` writes or so rather than on every write.
+
+    Blocks missing from the cache are read from `source`, which defaults to
+    `default_block_source()`. If the source is offline, e.g. a `snapshot`,
+    `get_or_load` reads missing blocks from it instead of calling `load`, and
+    blocks missing from the source are never loaded from the Prefect API.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        snapshot: Optional[BlockSnapshot] = None,
+        source: Optional[BlockSource] = None,
+    ):
+        self._path = Path(path) if path else None
+        self._ttl = ttl
+        self._max_entries = max_entries
+        if source is None:
+            source = snapshot if snapshot is not None else default_block_source()
+        self._source = source
+        self._entries: Dict[BlockReference, dict] = {}
+        # the number of persisted entries, counted on the first write
+        self._disk_entries: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def path(self) -> Optional[Path]:
+        return self._path
+
+    @property
+    def source(self) -> BlockSource:
+        return self._source
+
+    @property
+    def snapshot(self) -> Optional[InMemoryBlockSource]:
+        if isinstance(self._source, InMemoryBlockSource):
+            return self._source
+        return None
+
+    @property
+    def offline(self) -> bool:
+        return self._source.offline
+
+    def _entry_path(self, reference: BlockReference) -> Path:
+        key = hashlib.sha256(reference.slug.encode()).hexdigest()
+        return self._path / f"{key}.json"
+
+    def _read_from_disk(self, reference: BlockReference) -> Optional[dict]:
+        entry_path = self._entry_path(reference)
+        try:
+            entry = json.loads(entry_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if entry.get("reference") != reference.slug:
+            return None
+        if self._ttl is not None and time.time() - entry["stored_at"] > self._ttl:
+            self._unlink(entry_path)
+            return None
+        return entry["data"]
+
+    def _write_to_disk(self, reference: BlockReference, data: dict):
+        self._path.mkdir(parents=True, exist_ok=True)
+        entry = {"reference": reference.slug, "stored_at": time.time(), "data": data}
+        entry_path = self._entry_path(reference)
+        if self._max_entries is not None and self._disk_entries is None:
+            self._disk_entries = len(self._stat_entries())
+        is_new = not entry_path.exists()
+        fd, temp_path = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, entry_path)
+        if self._disk_entries is not None and is_new:
+            self._disk_entries += 1
+            if self._disk_entries > self._max_entries:
+                self._evict()
+
+    def _stat_entries(self) -> List[Tuple[float, Path]]:
+        entries = []
+        for entry_path in self._path.glob("*.json"):
+            try:
+                entries.append((entry_path.stat().st_mtime, entry_path))
+            except FileNotFoundError:
+                # removed by another process sharing the directory
+                continue
+        return entries
+
+    def _evict(self):
+        # evict a batch of entries at once so that the directory is not listed
+        # again on the next write
+        target = max(self._max_entries - max(self._max_entries // 10, 1), 0)
+        entries = sorted(self._stat_entries())
+        for _, entry_path in entries[: max(len(entries) - target, 0)]:
+            entry_path.unlink(missing_ok=True)
+        self._disk_entries = min(len(entries), target)
+
+    def _unlink(self, entry_path: Path):
+        try:
+            entry_path.unlink()
+        except FileNotFoundError:
+            return
+        if self._disk_entries:
+            self._disk_entries -= 1
+
+    def _lookup(self, reference: BlockReference) -> Optional[dict]:
+        data = self._entries.get(reference)
+        if data is None and self._path:
+            data = self._read_from_disk(reference)
+            if data is not None:
+                self._entries[reference] = data
+        return data
+
+    def __contains__(self, reference: BlockReference) -> bool:
+        return self._lookup(reference) is not None
+
+    def get(self, reference: BlockReference) -> Optional[dict]:
+        data = self._lookup(reference)
+        if data is None:
+            self.misses += 1
+            count("block_cache_misses")
+        else:
+            self.hits += 1
+            count("block_cache_hits")
+        return data
+
+    def set(self, reference: BlockReference, data: dict):
+        self._entries[reference] = data
+        if self._path:
+            self._write_to_disk(reference, data)
+
+    def get_or_load(self, reference: BlockReference, load: Callable[[], dict]) -> dict:
+        data = self.get(reference)
+        if data is None:
+            if self.offline:
+                data = self._source.read(reference)
+                if data is None:
+                    raise BlockNotFoundError(
+                        f"Block {reference} was not found in the block snapshot."
+                    )
+            else:
+                data = load()
+            self.set(reference, data)
+        return data
+
+    def invalidate(self, reference: BlockReference):
+        """
+        Remove a single entry from the cache, including any persisted entry.
+        """
+        self._entries.pop(reference, None)
+        if self._path:
+            self._unlink(self._entry_path(reference))
+
+    def clear(self):
+        """
+        Remove all entries from the cache, including any persisted entries.
+        """
+        self._entries.clear()
+        if self._path and self._path.exists():
+            for entry_path in self._path.glob("*.json"):
+                entry_path.unlink(missing_ok=True)
+        self._disk_entries = None
+
+
+async def _read_block_document(
+    client, reference: BlockReference
+) -> Optional[Tuple[BlockReference, dict]]:
+    from prefect.exceptions import ObjectNotFound
+
+    try:
+        block_document = await client.read_block_document_by_name(
+            reference.block_document_name,
+            block_type_slug=reference.block_type_slug,
+            include_secrets=False,
+        )
+    except ObjectNotFound:
+        return None
+    finally:
+        count("block_api_requests")
+    return reference, json.loads(json.dumps(block_document.data, default=str))
+
+
+async def read_block_documents(
+    references: Iterable[BlockReference], concurrency: int = DEFAULT_CONCURRENCY
+) -> Dict[BlockReference, dict]:
+    """
+    Read the data for many block documents through a single Prefect client,
+    with at most `concurrency` requests in flight at once. References that do
+    not match a saved block document, including those of block types the server
+    does not know, are omitted from the result.
+    """
+    import asyncio
+
+    from prefect.client.orchestration import get_client
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with get_client() as client:
+
+        async def read(reference: BlockReference):
+            async with semaphore:
+                return await _read_block_document(client, reference)
+
+        results = await asyncio.gather(*map(read, sorted(set(references))))
+
+    block_documents = dict(result for result in results if result is not None)
+    count("blocks_loaded", len(block_documents))
+    return block_documents
+
+
+def prefetch_block_documents(
+    references: Iterable[BlockReference],
+    block_cache: BlockDocumentCache,
+    concurrency: int = DEFAULT_CONCURRENCY,
+):
+    """
+    Load every reference that is not already in `block_cache` from the cache's
+    source and store the results in the cache. Offline caches are left untouched.
+    """
+    if block_cache.offline:
+        return
+    missing = {reference for reference in references if reference not in block_cache}
+    if not missing:
+        return
+
+    block_documents = block_cache.source.read_many(missing, concurrency)
+    for reference, data in block_documents.items():
+        block_cache.set(reference, data)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from pmt.options import DEFAULT_CACHE_MAX_SIZE
+
+if TYPE_CHECKING:
+    from pmt.migrate import FileMigration
+
+DEFAULT_MAX_SIZE = DEFAULT_CACHE_MAX_SIZE
+
+
+def pmt_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("pmt")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class MigrationCache:
+    """
+    A content-addressed cache of file migration results.
+
+    Results are keyed on the path and contents of the migrated file, the version
+    of `pmt`, and a digest of the block documents used to resolve infrastructure
+    (for example, the digest of a block snapshot), so a cached result is only
+    reused when re-running the migration would produce the same output. Once
+    the cache directory grows beyond `max_size` bytes, `prune` evicts the least
+    recently used results.
+
+    Without a digest of the block documents, a result cannot tell whether the
+    blocks it was resolved from have changed since, so results stored more than
+    `ttl` seconds ago are ignored.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_size: int = DEFAULT_MAX_SIZE,
+        blocks_digest: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ):
+        self._path = Path(path)
+        self._max_size = max_size
+        self._blocks_digest = blocks_digest or ""
+        self._ttl = ttl
+        self._version = pmt_version()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def key(self, path: Path, source: bytes, variant: str = "") -> str:
+        """
+        The cache key for the result of migrating `source` from `path`. `variant`
+        distinguishes results rendered with different output options.
+        """
+        digest = hashlib.sha256()
+        for part in (str(path).encode(), self._version.encode(), source):
+            digest.update(hashlib.sha256(part).digest())
+        digest.update(self._blocks_digest.encode())
+        digest.update(variant.encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self._path / f"{key}.json"
+
+    def get(self, key: str, render_source: bool = False) -> Optional["FileMigration"]:
+        """
+        Return the cached result for `key`, or `None` if there is no usable
+        result. Results cached without the updated source of the file are not
+        usable when `render_source` is `True`.
+        """
+        from pmt.migrate import FileMigration
+
+        entry_path = self._entry_path(key)
+        try:
+            entry = json.loads(entry_path.read_text())
+            stored_at = entry["stored_at"]
+            migration = FileMigration.from_dict(entry["migration"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.misses += 1
+            return None
+        if self._ttl is not None and time.time() - stored_at > self._ttl:
+            self.misses += 1
+            return None
+        if render_source and migration.calls and migration.updated_source is None:
+            self.misses += 1
+            return None
+
+        # mark the entry as recently used so that it is pruned last
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self.hits += 1
+        migration.cached = True
+        return migration
+
+    def set(self, key: str, migration: "FileMigration"):
+        if migration.error:
+            return
+        self._path.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"stored_at": time.time(), "migration": migration.to_dict()}, f)
+        os.replace(temp_path, self._entry_path(key))
+
+    def prune(self):
+        """
+        Evict the least recently used results until the cache is no larger than
+        `max_size` bytes.
+        """
+        if not self._path.exists():
+            return
+        entries = []
+        size = 0
+        for entry_path in self._path.glob("*.json"):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            size += stat.st_size
+
+        for _, entry_size, entry_path in sorted(entries):
+            if size <= self._max_size:
+                break
+            entry_path.unlink(missing_ok=True)
+            size -= entry_size
@@ -1,10 +1,13 @@
 import typer
 
-from pmt.cli import upgrade
+from pmt.cli import blocks, daemon, report, upgrade
 
 
 app = typer.Typer()
 app.add_typer(upgrade.app, name="upgrade")
+app.add_typer(blocks.app, name="blocks")
+app.add_typer(daemon.app, name="daemon")
+app.add_typer(report.app, name="report")
 
 
 @app.callback()
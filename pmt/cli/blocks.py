@@ -0,0 +1,67 @@
+from pathlib import Path
+import typer
+from rich import print
+
+from typing import List
+from typing_extensions import Annotated
+
+from pmt.options import DEFAULT_CONCURRENCY
+
+
+app = typer.Typer()
+
+
+@app.callback()
+def callback():
+    pass
+
+
+@app.command()
+def snapshot(
+    files: Annotated[
+        List[Path],
+        typer.Argument(
+            help=(
+                "Files, directories, or glob patterns containing"
+                " Deployment.build_from_flow calls whose infrastructure blocks"
+                " should be exported."
+            ),
+        ),
+    ],
+    output: Annotated[
+        Path,
+        typer.Option(
+            "--output",
+            "-o",
+            help="File to write the block snapshot to.",
+        ),
+    ],
+    concurrency: Annotated[
+        int,
+        typer.Option(
+            "--concurrency",
+            help="Maximum number of concurrent requests to the Prefect API.",
+        ),
+    ] = DEFAULT_CONCURRENCY,
+):
+    """
+    Exports the infrastructure blocks referenced by Deployment.build_from_flow
+    calls to a snapshot file that can be used with
+    `pmt upgrade build-from-flow --blocks-from` to upgrade code without access to
+    the Prefect API.
+    """
+    import asyncio
+
+    from pmt.blocks import BlockSnapshot, read_block_documents
+    from pmt.files import filter_candidates, find_python_files
+    from pmt.migrate import collect_block_references
+
+    references = collect_block_references(filter_candidates(find_python_files(files)))
+    block_documents = asyncio.run(read_block_documents(references, concurrency))
+
+    missing = sorted(set(references) - set(block_documents))
+    for reference in missing:
+        print(f"[yellow]Block [blue]{reference}[/] was not found.[/]")
+
+    BlockSnapshot(block_documents).dump(output)
+    print(f"Saved {len(block_documents)} block document(s) to [blue]{output}[/].")
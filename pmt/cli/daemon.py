@@ -0,0 +1,195 @@
+from pathlib import Path
+import typer
+from rich import print
+
+from typing import List, Optional
+from typing_extensions import Annotated
+
+from pmt.options import DEFAULT_CONCURRENCY
+
+
+app = typer.Typer()
+
+SocketOption = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--socket",
+        envvar="PMT_DAEMON_SOCKET",
+        help=(
+            "Unix socket the daemon listens on. Defaults to `pmt.sock` in"
+            " $XDG_RUNTIME_DIR, or a per-user socket in the temporary directory."
+        ),
+        show_default=False,
+    ),
+]
+
+
+def resolve_socket_path(socket: Optional[Path]) -> Path:
+    from pmt.daemon import default_socket_path
+
+    return socket or default_socket_path()
+
+
+@app.callback()
+def callback():
+    pass
+
+
+@app.command()
+def start(
+    socket: SocketOption = None,
+    watch: Annotated[
+        Optional[List[Path]],
+        typer.Option(
+            "--watch",
+            exists=True,
+            help=(
+                "File or directory to watch. Python files in it are upgraded when"
+                " the daemon starts and again whenever they change, so that"
+                " requests for them are answered from memory. Can be repeated."
+            ),
+        ),
+    ] = None,
+    polling: Annotated[
+        bool,
+        typer.Option(
+            "--polling",
+            help=(
+                "Watch for changes by polling instead of with inotify, e.g. for"
+                " network file systems."
+            ),
+        ),
+    ] = False,
+    interval: Annotated[
+        float,
+        typer.Option(
+            "--interval",
+            help="Number of seconds between polls when watching by polling.",
+        ),
+    ] = 1.0,
+    block_cache_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--block-cache-dir",
+            envvar="PMT_BLOCK_CACHE_DIR",
+            help=(
+                "Directory to persist loaded infrastructure block documents in so"
+                " that later runs can reuse them without calling the Prefect API."
+            ),
+        ),
+    ] = None,
+    block_concurrency: Annotated[
+        int,
+        typer.Option(
+            "--block-concurrency",
+            help=(
+                "Maximum number of concurrent requests to the Prefect API when"
+                " loading infrastructure blocks."
+            ),
+        ),
+    ] = DEFAULT_CONCURRENCY,
+    blocks_from: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--blocks-from",
+            exists=True,
+            dir_okay=False,
+            help=(
+                "Block snapshot created with `pmt blocks snapshot`, or a JSON"
+                " object mapping block slugs like `kubernetes-job/my-job` to block"
+                " data, to resolve infrastructure blocks from instead of the"
+                " Prefect API."
+            ),
+        ),
+    ] = None,
+):
+    """
+    Starts a daemon that upgrades files for `pmt upgrade build-from-flow --daemon`,
+    keeping loaded infrastructure blocks and the results for unchanged files in
+    memory between runs. Runs in the foreground until stopped with
+    `pmt daemon stop` or Ctrl-C.
+    """
+    import threading
+
+    from pmt.blocks import BlockDocumentCache, InMemoryBlockSource
+    from pmt.daemon import DaemonError, DaemonServer, MigrationService
+    from pmt.daemon import watch as watch_paths
+
+    if blocks_from:
+        block_cache = BlockDocumentCache(
+            source=InMemoryBlockSource.from_file(blocks_from)
+        )
+    else:
+        block_cache = BlockDocumentCache(path=block_cache_dir)
+    service = MigrationService(block_cache, concurrency=block_concurrency)
+
+    socket_path = resolve_socket_path(socket)
+    try:
+        server = DaemonServer(socket_path, service)
+    except DaemonError as exc:
+        print(f"[red]{exc}[/]")
+        raise typer.Exit(code=1)
+
+    stop = threading.Event()
+    if watch:
+        threading.Thread(
+            target=watch_paths,
+            args=(service, watch),
+            kwargs={
+                "polling": polling,
+                "interval": interval,
+                "log": print,
+                "stop": stop,
+            },
+            daemon=True,
+        ).start()
+
+    print(f"Listening on [blue]{socket_path}[/].")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    print("Daemon stopped.")
+
+
+@app.command()
+def status(socket: SocketOption = None):
+    """
+    Prints the status of a running daemon.
+    """
+    from rich.table import Table
+
+    from pmt.daemon import DaemonError
+    from pmt.daemon import status as daemon_status
+
+    try:
+        result = daemon_status(resolve_socket_path(socket))
+    except DaemonError as exc:
+        print(f"[red]{exc}[/]")
+        raise typer.Exit(code=1)
+
+    table = Table(title="Daemon")
+    table.add_column("Key")
+    table.add_column("Value", justify="right")
+    for key, value in result.items():
+        table.add_row(key, str(value))
+    print(table)
+
+
+@app.command()
+def stop(socket: SocketOption = None):
+    """
+    Stops a running daemon.
+    """
+    from pmt.daemon import DaemonError, shutdown
+
+    socket_path = resolve_socket_path(socket)
+    try:
+        shutdown(socket_path)
+    except DaemonError as exc:
+        print(f"[red]{exc}[/]")
+        raise typer.Exit(code=1)
+    print(f"Stopped the daemon listening on [blue]{socket_path}[/].")
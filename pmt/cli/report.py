@@ -0,0 +1,76 @@
+from pathlib import Path
+import typer
+from rich import print
+
+from typing import List, Optional
+from typing_extensions import Annotated
+
+
+app = typer.Typer()
+
+
+@app.callback()
+def callback():
+    pass
+
+
+@app.command()
+def merge(
+    reports: Annotated[
+        List[Path],
+        typer.Argument(
+            exists=True,
+            dir_okay=False,
+            help=(
+                "Files written by `pmt upgrade build-from-flow --format jsonl`, e.g."
+                " one per shard."
+            ),
+        ),
+    ],
+    output: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--output",
+            "-o",
+            help=(
+                "File to write the merged JSON report to. If not provided, the"
+                " report will be printed to stdout."
+            ),
+        ),
+    ] = None,
+):
+    """
+    Merges the results of several runs of `pmt upgrade build-from-flow`, e.g. one
+    per shard, into a single JSON report with a summary of the additional info
+    for every call.
+    """
+    import json
+
+    from rich.table import Table
+
+    from pmt.report import ReportError, merge_reports
+
+    try:
+        report = merge_reports(reports)
+    except ReportError as exc:
+        raise typer.BadParameter(str(exc), param_hint="'REPORTS...'")
+
+    if not output:
+        typer.echo(json.dumps(report, indent=2))
+        return
+
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    summary = report["summary"]
+    print(
+        f"Merged {len(reports)} report(s) with {summary['calls']} call(s) in"
+        f" {summary['files']} file(s) and {summary['errors']} error(s) into"
+        f" [blue]{output}[/]."
+    )
+    if report["additional_info"]:
+        table = Table(title="Additional Info")
+        table.add_column("Action")
+        table.add_column("Calls", justify="right")
+        table.add_column("Files", justify="right")
+        for info in report["additional_info"]:
+            table.add_row(info["message"], str(info["calls"]), str(len(info["files"])))
+        print(table)
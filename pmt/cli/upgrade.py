@@ -1,15 +1,26 @@
-import ast
+import sys
 from pathlib import Path
 import typer
 from rich import print
-from rich.rule import Rule
-from rich.markdown import Markdown
 
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional
 from typing_extensions import Annotated
 
-from pmt.transformers import BuildFromFlowTransformer
-from pmt.utils import convert_ast_node_to_source_code
+from pmt.options import (
+    DEFAULT_CACHE_MAX_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_EVALUATION_MEMORY_LIMIT,
+    DEFAULT_EVALUATION_TIMEOUT,
+    OutputFormat,
+    ShardBalance,
+)
+
+if TYPE_CHECKING:
+    from pmt.grouping import CallGroup, CallSite
+    from pmt.migrate import FileMigration
+    from pmt.profiling import Profiler
+    from pmt.summary import RunSummary
+    from pmt.writer import AtomicFileWriter
 
 
 app = typer.Typer()
@@ -20,14 +31,278 @@ def callback():
     pass
 
 
+def _print_call_updates(migration: "FileMigration"):
+    from rich.markdown import Markdown
+    from rich.rule import Rule
+
+    print(
+        "Refer to the output below to see how to update your code in"
+        f" [blue]{migration.path}[/]"
+    )
+
+    for i, call in enumerate(migration.calls):
+        markdown = f"# Call {i + 1} of {len(migration.calls)}: {call.deployment_name}\n"
+        markdown += "\n"
+        markdown += (
+            "To upgrade to the new deployment API, replace your original code with"
+            " the updated code below.\n"
+        )
+        markdown += "\n"
+        markdown += "## Original Code\n"
+        markdown += f"```python\n{call.original_code}\n```\n"
+        markdown += "\n"
+        markdown += "## Updated Code\n"
+        markdown += f"```python\n{call.updated_code}\n```\n"
+        markdown += "\n"
+        if call.additional_info:
+            markdown += "## Additional Info\n"
+            markdown += "\n"
+            for action in call.additional_info:
+                markdown += f"- {action}\n"
+            markdown += "\n"
+        print(
+            Rule(),
+            Markdown(markdown),
+        )
+    print(Rule())
+
+
+def _format_call_site(site: "CallSite") -> str:
+    location = str(site.path)
+    if site.span:
+        location += f":{site.span.start_line}"
+    if site.deployment_name:
+        location += f" ({site.deployment_name.strip()})"
+    return location
+
+
+def _print_call_groups(groups: List["CallGroup"]):
+    from rich.markdown import Markdown
+    from rich.markup import escape
+    from rich.rule import Rule
+
+    calls = sum(len(group) for group in groups)
+    print(
+        f"Found {calls} call(s) with {len(groups)} distinct shape(s). Calls with the"
+        " same shape differ only in values such as names and parameters, so each"
+        " group is shown once below."
+    )
+
+    for i, group in enumerate(groups):
+        call = group.representative
+        markdown = f"# Group {i + 1} of {len(groups)}: {len(group)} call(s)\n"
+        markdown += "\n"
+        markdown += (
+            "To upgrade to the new deployment API, replace the original code of each"
+            " call below with updated code like the example for"
+            f" `{_format_call_site(group.sites[0])}`.\n"
+        )
+        markdown += "\n"
+        markdown += "## Original Code\n"
+        markdown += f"```python\n{call.original_code}\n```\n"
+        markdown += "\n"
+        markdown += "## Updated Code\n"
+        markdown += f"```python\n{call.updated_code}\n```\n"
+        markdown += "\n"
+        if call.additional_info:
+            markdown += "## Additional Info\n"
+            markdown += "\n"
+            for action in call.additional_info:
+                markdown += f"- {action}\n"
+            markdown += "\n"
+        markdown += "## Calls\n"
+        print(Rule(), Markdown(markdown))
+        # printed as plain lines since there may be thousands of calls
+        for site in group.sites:
+            print(f"  [blue]{escape(_format_call_site(site))}[/]")
+    print(Rule())
+
+
+def _print_summary(summary: "RunSummary"):
+    from rich.table import Table
+
+    table = Table(title="Summary")
+    table.add_column("File")
+    table.add_column("Calls", justify="right")
+    table.add_column("Status")
+    for file in summary.files:
+        if file.error:
+            status = f"[red]error: {file.error}[/]"
+        elif file.calls and file.cached:
+            status = "[green]upgraded[/] [dim](cached)[/]"
+        elif file.calls:
+            status = "[green]upgraded[/]"
+        else:
+            status = "[dim]no calls[/]"
+        table.add_row(str(file.path), str(len(file.calls)), status)
+    print(table)
+
+
+def _print_profile(profiler: "Profiler", log: Callable[..., None] = print):
+    from rich.table import Table
+
+    table = Table(title="Profile")
+    table.add_column("Phase")
+    table.add_column("Count", justify="right")
+    table.add_column("Total (s)", justify="right")
+    table.add_column("Self (s)", justify="right")
+    phase_totals = profiler.phase_totals()
+    for name in sorted(
+        phase_totals, key=lambda name: phase_totals[name]["self"], reverse=True
+    ):
+        totals = phase_totals[name]
+        table.add_row(
+            name,
+            str(totals["count"]),
+            f"{totals['total']:.3f}",
+            f"{totals['self']:.3f}",
+        )
+    log(table)
+
+    if profiler.counters:
+        table = Table(title="Counters")
+        table.add_column("Counter")
+        table.add_column("Value", justify="right")
+        for name, value in sorted(profiler.counters.items()):
+            table.add_row(name, str(value))
+        log(table)
+
+    file_totals = profiler.file_totals()
+    if file_totals:
+        table = Table(title="Slowest Files")
+        table.add_column("File")
+        table.add_column("Time (s)", justify="right")
+        for path in sorted(file_totals, key=file_totals.get, reverse=True)[:10]:
+            table.add_row(path, f"{file_totals[path]:.3f}")
+        log(table)
+
+
+def _print_write_results(file_writer: "AtomicFileWriter", dry_run: bool) -> bool:
+    """
+    Report the files written by `--in-place`, returning `True` if any file could
+    not be written.
+    """
+    has_errors = False
+    changed = []
+    for result in file_writer.results:
+        if result.error:
+            has_errors = True
+            print(f"[red]Failed to write [blue]{result.path}[/]: {result.error}")
+        elif result.original_sha256 != result.updated_sha256:
+            changed.append(result)
+
+    if dry_run:
+        for result in changed:
+            print(f"Would update [blue]{result.path}[/]")
+        print(f"{len(changed)} file(s) would be updated.")
+    else:
+        print(f"Updated {len(changed)} file(s) in place.")
+    return has_errors
+
+
+def _results_from_daemon(
+    results: Iterator["FileMigration"], log: Callable[..., None]
+) -> Iterator["FileMigration"]:
+    """
+    Yield the results of an upgrade in the daemon, exiting with an error if the
+    daemon fails before every file has been upgraded.
+    """
+    from pmt.daemon import DaemonError
+
+    try:
+        yield from results
+    except DaemonError as exc:
+        log(f"[red]The daemon failed to upgrade the files: {exc}[/]")
+        raise typer.Exit(code=1)
+
+
+# options that configure how files are upgraded in this process; the daemon
+# upgrades files with the options it was started with
+_IN_PROCESS_OPTIONS = {
+    "jobs": "--jobs",
+    "block_cache_dir": "--block-cache-dir",
+    "block_cache_ttl": "--block-cache-ttl",
+    "block_cache_max_entries": "--block-cache-max-entries",
+    "block_concurrency": "--block-concurrency",
+    "blocks_from": "--blocks-from",
+    "eval_timeout": "--eval-timeout",
+    "eval_memory_limit": "--eval-memory-limit",
+    "cache_dir": "--cache-dir",
+    "cache_max_size": "--cache-max-size",
+    "profile": "--profile",
+    "trace_json": "--trace-json",
+}
+
+
+def _option_envvar(ctx: typer.Context, name: str) -> Optional[str]:
+    for param in ctx.command.params:
+        if param.name == name:
+            return param.envvar
+    return None
+
+
 @app.command()
 def build_from_flow(
-    file: Annotated[
-        Path,
+    ctx: typer.Context,
+    files: Annotated[
+        Optional[List[Path]],
         typer.Argument(
-            help="File containing Deployment.build_from_flow calls to update."
+            help=(
+                "Files, directories, or glob patterns containing"
+                " Deployment.build_from_flow calls to update. Directories are"
+                " searched recursively for Python files. Defaults to the current"
+                " directory with --since or --staged."
+            ),
+            show_default=False,
+        ),
+    ] = None,
+    since: Annotated[
+        Optional[str],
+        typer.Option(
+            "--since",
+            help=(
+                "Only update files added or changed since the git ref, e.g."
+                " `origin/main`: files changed in commits since the current branch"
+                " diverged from the ref, uncommitted changes, and untracked files."
+            ),
+        ),
+    ] = None,
+    staged: Annotated[
+        bool,
+        typer.Option(
+            "--staged",
+            help=(
+                "Only update files with changes staged for the next git commit."
+                " Files are read from the working tree, so unstaged changes to"
+                " them are included."
+            ),
+        ),
+    ] = False,
+    shard: Annotated[
+        Optional[str],
+        typer.Option(
+            "--shard",
+            help=(
+                "Only update the files in one part of the run, written as"
+                " INDEX/COUNT, e.g. `2/4`, to split a run across CI machines. Every"
+                " machine computes the same split of the provided files. Combine"
+                " the output of each shard with `pmt report merge`."
+            ),
+            show_default=False,
+        ),
+    ] = None,
+    shard_balance: Annotated[
+        ShardBalance,
+        typer.Option(
+            "--shard-balance",
+            help=(
+                "How to split files between shards. `none` assigns files by a hash"
+                " of their path, `size` balances the total size of each shard, and"
+                " `calls` balances the number of Deployment.build_from_flow calls"
+                " found by a quick scan of each file."
+            ),
         ),
-    ],
+    ] = ShardBalance.none,
     output: Annotated[
         Optional[Path],
         typer.Option(
@@ -35,7 +310,231 @@ def build_from_flow(
             "-o",
             help=(
                 "File to write updated code to. If not provided, updates will be"
-                " printed to stdout."
+                " printed to stdout. Can only be used with a single input file."
+            ),
+        ),
+    ] = None,
+    in_place: Annotated[
+        bool,
+        typer.Option(
+            "--in-place",
+            "-i",
+            help=(
+                "Write updated code back to each file. Files are replaced"
+                " atomically, so an interrupted run never leaves a file partially"
+                " written."
+            ),
+        ),
+    ] = False,
+    backup_suffix: Annotated[
+        Optional[str],
+        typer.Option(
+            "--backup-suffix",
+            help=(
+                "With --in-place, keep the original contents of each updated file"
+                " next to it with this suffix, e.g. `.bak`."
+            ),
+        ),
+    ] = None,
+    dry_run: Annotated[
+        bool,
+        typer.Option(
+            "--dry-run",
+            help="With --in-place, report the files that would be updated.",
+        ),
+    ] = False,
+    manifest: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--manifest",
+            help=(
+                "With --in-place, write a JSON lines record of each updated file,"
+                " including the hashes of its original and updated contents, to"
+                " this file."
+            ),
+        ),
+    ] = None,
+    output_format: Annotated[
+        OutputFormat,
+        typer.Option(
+            "--format",
+            help=(
+                "Format to print updates to stdout in. `jsonl` prints one JSON"
+                " record per call, `diff` prints a unified diff per file that can"
+                " be applied with `git apply`, and `sarif` prints a SARIF log."
+                " Records are printed as soon as each file is updated."
+            ),
+        ),
+    ] = OutputFormat.markdown,
+    group: Annotated[
+        bool,
+        typer.Option(
+            "--group",
+            help=(
+                "Print one example update for each group of calls with the same"
+                " shape (the same keyword arguments, kinds of storage and"
+                " infrastructure, and additional info) along with the location of"
+                " every call in the group, instead of every update."
+            ),
+        ),
+    ] = False,
+    patch: Annotated[
+        bool,
+        typer.Option(
+            "--patch",
+            help=(
+                "When writing updated code, only replace the updated calls and add"
+                " required imports, preserving comments and the formatting of the"
+                " rest of the file."
+            ),
+        ),
+    ] = False,
+    format_calls: Annotated[
+        bool,
+        typer.Option(
+            "--format-calls/--no-format-calls",
+            help=(
+                "Format the original and updated code of each call with black."
+                " Disable for machine-readable output that does not need formatted"
+                " code, e.g. `--format jsonl`, to skip formatting entirely."
+                " Updated files are always formatted."
+            ),
+        ),
+    ] = True,
+    daemon: Annotated[
+        bool,
+        typer.Option(
+            "--daemon",
+            help=(
+                "Upgrade files in the daemon started with `pmt daemon start`"
+                " instead of in this process, reusing the blocks it has loaded and"
+                " its results for unchanged files. The daemon's socket is read from"
+                " $PMT_DAEMON_SOCKET. Options that configure how files are upgraded,"
+                " such as --jobs and --blocks-from, cannot be combined with it."
+            ),
+        ),
+    ] = False,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "--jobs",
+            "-j",
+            help=(
+                "Number of worker processes to use when updating multiple files."
+                " Use 0 to start one worker per CPU."
+            ),
+        ),
+    ] = 1,
+    block_cache_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--block-cache-dir",
+            envvar="PMT_BLOCK_CACHE_DIR",
+            help=(
+                "Directory to persist loaded infrastructure block documents in so"
+                " that later runs can reuse them without calling the Prefect API."
+            ),
+        ),
+    ] = None,
+    block_cache_ttl: Annotated[
+        float,
+        typer.Option(
+            "--block-cache-ttl",
+            help="Number of seconds persisted block documents remain valid for.",
+        ),
+    ] = 24
+    * 60
+    * 60,
+    block_cache_max_entries: Annotated[
+        int,
+        typer.Option(
+            "--block-cache-max-entries",
+            help="Maximum number of block documents to keep in the block cache.",
+        ),
+    ] = 1000,
+    block_concurrency: Annotated[
+        int,
+        typer.Option(
+            "--block-concurrency",
+            help=(
+                "Maximum number of concurrent requests to the Prefect API when"
+                " loading infrastructure blocks."
+            ),
+        ),
+    ] = DEFAULT_CONCURRENCY,
+    blocks_from: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--blocks-from",
+            exists=True,
+            dir_okay=False,
+            help=(
+                "Block snapshot created with `pmt blocks snapshot`, or a JSON"
+                " object mapping block slugs like `kubernetes-job/my-job` to block"
+                " data, to resolve infrastructure blocks from instead of the"
+                " Prefect API."
+            ),
+        ),
+    ] = None,
+    eval_timeout: Annotated[
+        float,
+        typer.Option(
+            "--eval-timeout",
+            help=(
+                "Number of seconds code loading an infrastructure block that cannot"
+                " be resolved statically may run for. Such code runs in a separate"
+                " worker process."
+            ),
+        ),
+    ] = DEFAULT_EVALUATION_TIMEOUT,
+    eval_memory_limit: Annotated[
+        int,
+        typer.Option(
+            "--eval-memory-limit",
+            help=(
+                "Maximum memory, in MB, of the worker process that runs code"
+                " loading infrastructure blocks. Use 0 for no limit."
+            ),
+        ),
+    ] = DEFAULT_EVALUATION_MEMORY_LIMIT
+    // (1024 * 1024),
+    cache_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--cache-dir",
+            envvar="PMT_CACHE_DIR",
+            help=(
+                "Directory to cache upgrade results in. Files that have not changed"
+                " since they were last upgraded are skipped. Without --blocks-from,"
+                " a cached result does not reflect changes to the blocks it used"
+                " until it is older than --block-cache-ttl."
+            ),
+        ),
+    ] = None,
+    cache_max_size: Annotated[
+        int,
+        typer.Option(
+            "--cache-max-size",
+            help="Maximum size of the upgrade result cache in bytes.",
+        ),
+    ] = DEFAULT_CACHE_MAX_SIZE,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            "--profile",
+            help=(
+                "Print the time spent in each phase of the upgrade and counters"
+                " such as the number of blocks loaded."
+            ),
+        ),
+    ] = False,
+    trace_json: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--trace-json",
+            help=(
+                "File to write a trace of the upgrade to, in the Chrome trace"
+                " event format used by chrome://tracing and Perfetto."
             ),
         ),
     ] = None,
@@ -43,70 +542,351 @@ def build_from_flow(
     """
     Updates any calls to Deployment.build_from_flow to flow.serve or flow.deploy
     """
-    current_code = file.read_text()
-    tree = ast.parse(current_code)
+    from click.core import ParameterSource
 
-    transformer = BuildFromFlowTransformer(current_file=file, tree=tree)
-    transformer.visit(tree)
-    if not transformer.calls:
-        print(
+    from pmt.profiling import Profiler
+
+    if daemon:
+        for name, option in _IN_PROCESS_OPTIONS.items():
+            # options set through their environment variable would be ignored
+            # just the same
+            source = ctx.get_parameter_source(name)
+            if source in (ParameterSource.COMMANDLINE, ParameterSource.ENVIRONMENT):
+                raise typer.BadParameter(
+                    f"{option} cannot be used with --daemon, which upgrades files"
+                    " with the options the daemon was started with.",
+                    param_hint=(
+                        f"'{option}' (set by ${_option_envvar(ctx, name)})"
+                        if source == ParameterSource.ENVIRONMENT
+                        else f"'{option}'"
+                    ),
+                )
+
+    log = print
+    if output_format != OutputFormat.markdown:
+        from rich.console import Console
+
+        # keep stdout free of anything but the machine-readable output
+        log = Console(stderr=True).print
+
+    profiler = Profiler()
+    try:
+        with profiler.activate():
+            _upgrade_files(
+                files,
+                since=since,
+                staged=staged,
+                shard=shard,
+                shard_balance=shard_balance,
+                output=output,
+                in_place=in_place,
+                backup_suffix=backup_suffix,
+                dry_run=dry_run,
+                manifest=manifest,
+                output_format=output_format,
+                group=group,
+                log=log,
+                patch=patch,
+                format_calls=format_calls,
+                daemon=daemon,
+                jobs=jobs,
+                block_cache_dir=block_cache_dir,
+                block_cache_ttl=block_cache_ttl,
+                block_cache_max_entries=block_cache_max_entries,
+                block_concurrency=block_concurrency,
+                blocks_from=blocks_from,
+                eval_timeout=eval_timeout,
+                eval_memory_limit=eval_memory_limit,
+                cache_dir=cache_dir,
+                cache_max_size=cache_max_size,
+                profiler=profiler if profile or trace_json else None,
+            )
+    finally:
+        if profile:
+            _print_profile(profiler, log=log)
+        if trace_json:
+            profiler.dump_trace(trace_json)
+            log(f"Trace written to [blue]{trace_json}[/].")
+
+
+def _upgrade_files(
+    files: Optional[List[Path]],
+    since: Optional[str],
+    staged: bool,
+    shard: Optional[str],
+    shard_balance: ShardBalance,
+    output: Optional[Path],
+    in_place: bool,
+    backup_suffix: Optional[str],
+    dry_run: bool,
+    manifest: Optional[Path],
+    output_format: OutputFormat,
+    group: bool,
+    log: Callable[..., None],
+    patch: bool,
+    format_calls: bool,
+    daemon: bool,
+    jobs: int,
+    block_cache_dir: Optional[Path],
+    block_cache_ttl: float,
+    block_cache_max_entries: int,
+    block_concurrency: int,
+    blocks_from: Optional[Path],
+    eval_timeout: float,
+    eval_memory_limit: int,
+    cache_dir: Optional[Path],
+    cache_max_size: int,
+    profiler: Optional["Profiler"],
+):
+    from rich.markdown import Markdown
+
+    from pmt.blocks import BlockDocumentCache, InMemoryBlockSource
+    from pmt.cache import MigrationCache
+    from pmt.files import find_python_files, select_python_files
+    from pmt.formats import create_writer
+    from pmt.migrate import migrate_files
+    from pmt.profiling import count, phase
+    from pmt.shard import Shard
+
+    if shard:
+        try:
+            selected_shard = Shard.parse(shard)
+        except ValueError as exc:
+            raise typer.BadParameter(str(exc), param_hint="'--shard'")
+
+    if since and staged:
+        raise typer.BadParameter(
+            "--since and --staged cannot be used together.", param_hint="'--staged'"
+        )
+    if since or staged:
+        from pmt.git import GitError, changed_files, unstaged_files
+
+        with phase("discover"):
+            try:
+                changed = changed_files(since=since, staged=staged)
+                unstaged = set(unstaged_files()) if staged else set()
+            except GitError as exc:
+                raise typer.BadParameter(
+                    str(exc), param_hint="'--since'" if since else "'--staged'"
+                )
+            paths = select_python_files(changed, files or [Path(".")])
+        if not paths:
+            log("No changed Python files found in the provided paths.")
+            return
+        partially_staged = [path for path in paths if path in unstaged]
+        if partially_staged:
+            log(
+                f"[yellow]{len(partially_staged)} staged file(s) also have unstaged"
+                " changes, which are upgraded too: "
+                + ", ".join(f"[blue]{path}[/]" for path in partially_staged)
+                + "[/]"
+            )
+    else:
+        if not files:
+            raise typer.BadParameter(
+                "Provide at least one file, directory, or glob pattern.",
+                param_hint="'FILES...'",
+            )
+        with phase("discover"):
+            paths = find_python_files(files)
+        if not paths:
+            log("No Python files found in the provided paths.")
+            return
+
+    if shard:
+        from pmt.shard import select_shard
+
+        with phase("shard"):
+            paths = select_shard(paths, selected_shard, shard_balance)
+        if not paths:
+            log(f"No files in shard {selected_shard}.")
+            return
+
+    if output and len(paths) != 1:
+        raise typer.BadParameter(
+            "--output can only be used with a single input file.",
+            param_hint="'--output'",
+        )
+    if output and in_place:
+        raise typer.BadParameter(
+            "--output and --in-place cannot be used together.",
+            param_hint="'--in-place'",
+        )
+    if (output or in_place) and output_format != OutputFormat.markdown:
+        raise typer.BadParameter(
+            "--format can only be used when updates are printed to stdout.",
+            param_hint="'--format'",
+        )
+    if group and (output or in_place or output_format != OutputFormat.markdown):
+        raise typer.BadParameter(
+            "--group can only be used when updates are printed to stdout as"
+            " markdown.",
+            param_hint="'--group'",
+        )
+    for value, option in (
+        (backup_suffix, "--backup-suffix"),
+        (dry_run, "--dry-run"),
+        (manifest, "--manifest"),
+    ):
+        if value and not in_place:
+            raise typer.BadParameter(
+                f"{option} can only be used with --in-place.",
+                param_hint=f"'{option}'",
+            )
+    if daemon:
+        from pmt.daemon import DaemonError, default_socket_path, status, upgrade
+
+        socket_path = default_socket_path()
+        try:
+            status(socket_path)
+        except DaemonError as exc:
+            log(f"[red]{exc}[/]")
+            raise typer.Exit(code=1)
+
+    writer = create_writer(output_format, sys.stdout)
+
+    if blocks_from:
+        block_cache = BlockDocumentCache(
+            source=InMemoryBlockSource.from_file(blocks_from)
+        )
+    else:
+        block_cache = BlockDocumentCache(
+            path=block_cache_dir,
+            ttl=block_cache_ttl,
+            max_entries=block_cache_max_entries,
+        )
+
+    migration_cache = None
+    if cache_dir:
+        migration_cache = MigrationCache(
+            cache_dir,
+            max_size=cache_max_size,
+            blocks_digest=block_cache.source.digest if blocks_from else None,
+            # results resolved from live blocks expire with the blocks
+            ttl=None if blocks_from else block_cache_ttl,
+        )
+
+    file_writer = None
+    if in_place:
+        from pmt.writer import AtomicFileWriter
+
+        file_writer = AtomicFileWriter(
+            backup_suffix=backup_suffix, dry_run=dry_run, manifest=manifest
+        )
+
+    render_source = bool(output) or in_place or output_format == OutputFormat.diff
+    patch = patch or output_format == OutputFormat.diff
+    if daemon:
+        results = _results_from_daemon(
+            upgrade(
+                socket_path,
+                paths,
+                render_source=render_source,
+                patch=patch,
+                format_calls=format_calls,
+            ),
+            log,
+        )
+    else:
+        from pmt.evaluation import configure_evaluation
+
+        configure_evaluation(
+            timeout=eval_timeout, memory_limit=eval_memory_limit * 1024 * 1024
+        )
+        results = migrate_files(
+            paths,
+            jobs=jobs,
+            render_source=render_source,
+            patch=patch,
+            block_cache=block_cache,
+            concurrency=block_concurrency,
+            migration_cache=migration_cache,
+            profile=profiler is not None,
+            format_calls=format_calls,
+        )
+
+    grouper = None
+    if group:
+        from pmt.grouping import CallGrouper
+
+        grouper = CallGrouper()
+
+    from pmt.summary import RunSummary
+
+    # only a compact record of each file is kept once it has been reported
+    summary = RunSummary()
+    updated_source = None
+    try:
+        for migration in results:
+            if profiler:
+                profiler.merge(migration.profile)
+                count("files_cached", int(migration.cached))
+            summary.add(migration)
+            if migration.error:
+                log(
+                    f"[red]Failed to update [blue]{migration.path}[/]:"
+                    f" {migration.error}"
+                )
+            if writer:
+                with phase("render_output", path=migration.path):
+                    writer.write(migration)
+                continue
+            if migration.error or not migration.calls:
+                continue
+            if output:
+                updated_source = migration.updated_source
+            elif file_writer:
+                # blocks while too many files are waiting to be written
+                file_writer.submit(migration.path, migration.updated_source)
+            elif grouper:
+                with phase("group_calls", path=migration.path):
+                    grouper.add(migration)
+            else:
+                with phase("render_output", path=migration.path):
+                    _print_call_updates(migration)
+    finally:
+        if writer:
+            writer.close()
+        if file_writer:
+            with phase("write_output"):
+                file_writer.close()
+
+    if grouper:
+        with phase("render_output"):
+            _print_call_groups(grouper.groups)
+
+    if migration_cache:
+        with phase("prune_cache"):
+            migration_cache.prune()
+
+    if len(paths) > 1 and not writer:
+        _print_summary(summary)
+
+    has_errors = summary.has_errors
+    if file_writer and summary.has_calls:
+        has_errors = _print_write_results(file_writer, dry_run) or has_errors
+
+    if has_errors:
+        raise typer.Exit(code=1)
+
+    if not summary.has_calls:
+        log(
             "No calls to [blue]Deployment.build_from_flow[/] found in the provided"
-            " file."
+            f" {'file' if len(paths) == 1 else 'files'}."
         )
         return
 
-    for required_import in transformer.required_imports:
-        tree.body.insert(0, required_import)
-
     if output:
-        output.write_text(convert_ast_node_to_source_code(tree))
+        with phase("write_output", path=output):
+            output.write_text(updated_source)
+        count("bytes_written", len(updated_source.encode()))
         print(f"Updated code written to [blue]{output}[/].")
+
+    if output or (in_place and not dry_run):
         markdown = "## Additional Info\n"
-        additional_info = {
-            action
-            for call in transformer.calls
-            for action in call.additional_info
-            if call.additional_info
-        }
-        for action in additional_info:
+        for action in summary.additional_info:
             markdown += f"- {action}\n"
 
         print(
             Markdown(markdown),
         )
-
-    else:
-        print(
-            "Refer to the output below to see how to update your code in"
-            f" [blue]{file}[/]"
-        )
-
-        for i, call in enumerate(transformer.calls):
-            markdown = (
-                f"# Call {i + 1} of {len(transformer.calls)}: {call.deployment_name}\n"
-            )
-            markdown += "\n"
-            markdown += (
-                "To upgrade to the new deployment API, replace your original code with"
-                " the updated code below.\n"
-            )
-            markdown += "\n"
-            markdown += "## Original Code\n"
-            markdown += (
-                f"```python\n{convert_ast_node_to_source_code(call.node)}\n```\n"
-            )
-            markdown += "\n"
-            markdown += "## Updated Code\n"
-            markdown += f"```python\n{convert_ast_node_to_source_code(call.updated_node)}\n```\n"  # noqa
-            markdown += "\n"
-            if call.additional_info:
-                markdown += "## Additional Info\n"
-                markdown += "\n"
-                for action in call.additional_info:
-                    markdown += f"- {action}\n"
-                markdown += "\n"
-            print(
-                Rule(),
-                Markdown(markdown),
-            )
-        print(Rule())
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pmt.blocks import DEFAULT_CONCURRENCY, BlockDocumentCache
+from pmt.migrate import FileMigration, _failed_migration, _Migrator
+from pmt.watch import DEFAULT_INTERVAL, create_watcher
+
+
+class DaemonError(RuntimeError):
+    """
+    Raised when the daemon cannot be reached or reports an error.
+    """
+
+
+def default_socket_path() -> Path:
+    """
+    The socket the daemon listens on by default: `$PMT_DAEMON_SOCKET` if it is
+    set, otherwise `pmt.sock` in the user's runtime directory, or a per-user
+    socket in the temporary directory.
+    """
+    if os.environ.get("PMT_DAEMON_SOCKET"):
+        return Path(os.environ["PMT_DAEMON_SOCKET"])
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "pmt.sock"
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return Path(tempfile.gettempdir()) / f"pmt-{user}.sock"
+
+
+class MigrationService:
+    """
+    Migrates files in a long-lived process, keeping loaded block documents and
+    the result for each file in memory so that only files that changed since
+    they were last migrated are migrated again.
+    """
+
+    def __init__(
+        self,
+        block_cache: Optional[BlockDocumentCache] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ):
+        if block_cache is None:
+            block_cache = BlockDocumentCache()
+        self._block_cache = block_cache
+        self._concurrency = concurrency
+        # results are keyed by the resolved location of a file, the path it was
+        # requested with, which entrypoints are built from, and the options
+        self._results: Dict[
+            Tuple[Path, Path, bool, bool, bool], Tuple[str, FileMigration]
+        ] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def block_cache(self) -> BlockDocumentCache:
+        return self._block_cache
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "files": len({path for path, *_ in self._results}),
+            "hits": self.hits,
+            "misses": self.misses,
+            "block_cache_hits": self._block_cache.hits,
+            "block_cache_misses": self._block_cache.misses,
+        }
+
+    def forget(self, path: Path):
+        """
+        Drop every result for `path`, e.g. because it was deleted.
+        """
+        path = Path(path).resolve()
+        with self._lock:
+            for key in [key for key in self._results if key[0] == path]:
+                del self._results[key]
+
+    def migrate(
+        self,
+        paths: Iterable[Union[str, Path]],
+        render_source: bool = False,
+        patch: bool = False,
+        format_calls: bool = True,
+        cwd: Optional[Union[str, Path]] = None,
+    ) -> List[FileMigration]:
+        """
+        Migrate `paths`, reusing the result for every file whose contents have
+        not changed since it was last migrated with the same path and options.
+        Reused results are marked as `cached`.
+
+        Relative paths are read relative to `cwd`, by default the daemon's
+        working directory, but files are migrated with the paths as given, so
+        that entrypoints match those of a migration in the requesting process.
+        """
+        files = []
+        for path in map(Path, paths):
+            location = path if cwd is None else Path(cwd) / path
+            files.append((path, location))
+        with self._lock:
+            return self._migrate(files, render_source, patch, format_calls)
+
+    def refresh(self, paths: Iterable[Union[str, Path]]):
+        """
+        Migrate `paths` again after they changed, with every combination of
+        options they were previously migrated with, so that the next request for
+        them is answered from memory. Deleted files are forgotten.
+        """
+        for location in map(Path, paths):
+            if not location.exists():
+                self.forget(location)
+                continue
+            resolved = location.resolve()
+            with self._lock:
+                variants = {key[1:] for key in self._results if key[0] == resolved} or {
+                    (location, False, False, True)
+                }
+                for path, render_source, patch, format_calls in variants:
+                    self._migrate(
+                        [(path, location)], render_source, patch, format_calls
+                    )
+
+    def _migrate(
+        self,
+        files: List[Tuple[Path, Path]],
+        render_source: bool,
+        patch: bool,
+        format_calls: bool,
+    ) -> List[FileMigration]:
+        migrations: Dict[Path, FileMigration] = {}
+        pending = {}
+        for path, location in files:
+            try:
+                source = location.read_bytes()
+            except OSError as exc:
+                migrations[path] = _failed_migration(path, exc)
+                continue
+            key = (location.resolve(), path, render_source, patch, format_calls)
+            digest = hashlib.sha256(source).hexdigest()
+            result = self._results.get(key)
+            if result and result[0] == digest:
+                self.hits += 1
+                migrations[path] = replace(result[1], cached=True)
+            else:
+                self.misses += 1
+                pending[path] = (key, digest, source)
+
+        if pending:
+            # the blocks used by changed files are loaded together, as
+            # `migrate_files` does
+            migrator = _Migrator(
+                render_source=render_source,
+                patch=patch,
+                block_cache=self._block_cache,
+                concurrency=self._concurrency,
+                format_calls=format_calls,
+            )
+            migrated = migrator.migrate_sources(
+                [(path, source) for path, (_, _, source) in pending.items()]
+            )
+            for (path, (key, digest, _)), migration in zip(pending.items(), migrated):
+                if not migration.error:
+                    self._results[key] = (digest, migration)
+                migrations[path] = migration
+
+        return [migrations[path] for path, _ in files]
+
+
+def watch(
+    service: MigrationService,
+    paths: Iterable[Union[str, Path]],
+    polling: bool = False,
+    interval: float = DEFAULT_INTERVAL,
+    log: Callable[[str], None] = lambda message: None,
+    stop: Optional[threading.Event] = None,
+):
+    """
+    Migrate the Python files in `paths` and migrate each file again whenever it
+    changes, until `stop` is set.
+    """
+    from pmt.files import find_python_files
+
+    paths = list(paths)
+    watcher = create_watcher(paths, polling=polling, interval=interval)
+    try:
+        service.migrate(find_python_files(paths))
+        log(f"Watching {len(paths)} path(s) with {type(watcher).__name__}.")
+        while stop is None or not stop.is_set():
+            changed = watcher.wait(timeout=interval)
+            if changed:
+                service.refresh(sorted(changed))
+                log(f"Updated {len(changed)} changed file(s).")
+    finally:
+        watcher.close()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+
+    def _send(self, message: dict):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+            command = request["command"]
+        except (ValueError, KeyError, TypeError):
+            self._send({"error": "Invalid request."})
+            return
+
+        try:
+            self._handle(command, request)
+        except Exception as exc:
+            # the client must not mistake a failed request for one with fewer
+            # results
+            self._send({"error": f"{type(exc).__name__}: {exc}"})
+
+    def _handle(self, command: str, request: dict):
+        service = self.server.service
+        if command == "status":
+            self._send(service.status())
+        elif command == "upgrade":
+            for migration in service.migrate(
+                request["files"],
+                render_source=request.get("render_source", False),
+                patch=request.get("patch", False),
+                format_calls=request.get("format_calls", True),
+                cwd=request.get("cwd"),
+            ):
+                self._send(
+                    {"migration": migration.to_dict(), "cached": migration.cached}
+                )
+            self._send({"done": True})
+        elif command == "shutdown":
+            self._send({"done": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self._send({"error": f"Unknown command {command!r}."})
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves requests from `request` over a Unix socket. Each connection carries
+    a single JSON request, answered with one or more JSON lines.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, service: MigrationService):
+        self.service = service
+        self.socket_path = Path(socket_path)
+        if self.socket_path.exists():
+            # a socket left behind by a daemon that did not shut down cleanly
+            try:
+                status(self.socket_path)
+            except DaemonError:
+                self.socket_path.unlink()
+            else:
+                raise DaemonError(
+                    f"A daemon is already listening on {self.socket_path}."
+                )
+        super().__init__(str(self.socket_path), _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            self.socket_path.unlink()
+        except OSError:
+            pass
+
+
+def request(socket_path: Path, message: dict) -> Iterator[dict]:
+    """
+    Send `message` to the daemon listening on `socket_path` and yield each
+    response.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(socket_path))
+    except OSError as exc:
+        client.close()
+        raise DaemonError(
+            f"Unable to connect to a daemon on {socket_path}: {exc}. Start one with"
+            " `pmt daemon start`."
+        ) from exc
+    with client, client.makefile("rb") as responses:
+        client.sendall(json.dumps(message).encode() + b"\n")
+        for line in responses:
+            response = json.loads(line)
+            if "error" in response:
+                raise DaemonError(response["error"])
+            yield response
+
+
+def status(socket_path: Path) -> dict:
+    return next(request(socket_path, {"command": "status"}))
+
+
+def upgrade(
+    socket_path: Path,
+    paths: Iterable[Union[str, Path]],
+    render_source: bool = False,
+    patch: bool = False,
+    format_calls: bool = True,
+) -> Iterator[FileMigration]:
+    """
+    Migrate `paths` in the daemon listening on `socket_path`, yielding results
+    in the same order as `paths`. Raises `DaemonError` if the daemon fails or
+    does not answer with exactly one result per path.
+    """
+    paths = [Path(path) for path in paths]
+    message = {
+        "command": "upgrade",
+        # the daemon may have been started from another directory
+        "cwd": os.getcwd(),
+        "files": [str(path) for path in paths],
+        "render_source": render_source,
+        "patch": patch,
+        "format_calls": format_calls,
+    }
+    remaining = iter(paths)
+    for response in request(socket_path, message):
+        if response.get("done"):
+            break
+        path = next(remaining, None)
+        if path is None:
+            raise DaemonError("The daemon sent more results than files requested.")
+        migration = FileMigration.from_dict(response["migration"])
+        migration.path = path
+        migration.cached = response["cached"]
+        yield migration
+    else:
+        raise DaemonError("The daemon closed the connection before it was done.")
+    if next(remaining, None) is not None:
+        raise DaemonError("The daemon sent fewer results than files requested.")
+
+
+def shutdown(socket_path: Path):
+    for _ in request(socket_path, {"command": "shutdown"}):
+        pass
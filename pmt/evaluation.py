@@ -0,0 +1,294 @@
+import ast
+import atexit
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from pmt.options import DEFAULT_EVALUATION_MEMORY_LIMIT as DEFAULT_MEMORY_LIMIT
+from pmt.options import DEFAULT_EVALUATION_TIMEOUT as DEFAULT_TIMEOUT
+from pmt.profiling import count
+
+DEFAULT_PROCESSES = 1
+
+# the number of files whose namespaces each worker keeps
+MAX_NAMESPACES = 128
+
+
+class EvaluationError(RuntimeError):
+    """
+    Raised when evaluating code that loads a block fails, times out, or crashes
+    the worker evaluating it.
+    """
+
+
+class EvaluationTimeout(EvaluationError):
+    pass
+
+
+def _limit_memory(memory_limit: Optional[int]):
+    if not memory_limit:
+        return
+    try:
+        import resource
+    except ImportError:
+        # resource limits are not supported on Windows
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        memory_limit = min(memory_limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+
+
+def serialize_block(block) -> dict:
+    import json
+
+    # round trip through JSON so that data loaded from a block matches data
+    # read back from a persisted block cache
+    return json.loads(block.json(exclude_unset=True, exclude_defaults=True))
+
+
+def _is_import(statement: str) -> bool:
+    try:
+        body = ast.parse(statement).body
+    except SyntaxError:
+        return False
+    return bool(body) and all(
+        isinstance(node, (ast.Import, ast.ImportFrom)) for node in body
+    )
+
+
+def _evaluate(
+    namespaces: "OrderedDict[str, Tuple[dict, Set[str]]]",
+    namespace: str,
+    statements: Sequence[str],
+    expression: str,
+) -> Tuple[dict, int]:
+    """
+    Evaluate `expression` after executing `statements`, returning the data of
+    the block and the number of imports that were executed.
+    """
+    # namespaces are kept in order of use, and the least recently used are
+    # dropped so that a long-lived worker does not grow without bound
+    globals_, executed_imports = namespaces.pop(namespace, None) or (
+        {"__name__": "__pmt__"},
+        set(),
+    )
+    namespaces[namespace] = (globals_, executed_imports)
+    while len(namespaces) > MAX_NAMESPACES:
+        namespaces.popitem(last=False)
+    # other statements, e.g. assignments, run in a copy of the namespace on
+    # every evaluation since calls in different scopes of a file may bind the
+    # same name to different values
+    scope = None
+    imports_executed = 0
+    for statement in statements:
+        if scope is None and _is_import(statement):
+            # imports shared by many calls in a file only run once
+            if statement not in executed_imports:
+                exec(statement, globals_)
+                executed_imports.add(statement)
+                imports_executed += 1
+        else:
+            if scope is None:
+                scope = dict(globals_)
+            exec(statement, scope)
+    block = eval(expression, globals_ if scope is None else scope)
+    return serialize_block(block), imports_executed
+
+
+def _run_worker(connection, memory_limit: Optional[int]):
+    _limit_memory(memory_limit)
+    namespaces: "OrderedDict[str, Tuple[dict, Set[str]]]" = OrderedDict()
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        try:
+            response = ("ok", _evaluate(namespaces, *request))
+        except MemoryError:
+            # drop the namespaces that may be holding on to the memory
+            namespaces.clear()
+            response = ("error", "MemoryError: evaluation exceeded the memory limit")
+        except BaseException as exc:
+            response = ("error", f"{type(exc).__name__}: {exc}")
+        connection.send(response)
+
+
+class _Worker:
+    def __init__(self, memory_limit: Optional[int]):
+        self._memory_limit = memory_limit
+        self._process: Optional[multiprocessing.Process] = None
+        self._connection: Any = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        parent_connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_run_worker,
+            args=(child_connection, self._memory_limit),
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+        self._connection = parent_connection
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+            self._connection.close()
+        self._process = None
+        self._connection = None
+
+    def evaluate(
+        self,
+        namespace: str,
+        statements: Sequence[str],
+        expression: str,
+        timeout: Optional[float],
+    ) -> dict:
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._kill()
+                self._start()
+            self._connection.send((namespace, list(statements), expression))
+            try:
+                ready = self._connection.poll(timeout)
+                if ready:
+                    status, result = self._connection.recv()
+            except (EOFError, OSError):
+                self._kill()
+                raise EvaluationError(
+                    f"The worker evaluating `{expression}` exited unexpectedly."
+                )
+            if not ready:
+                # the worker may be stuck in user code, so it cannot be reused
+                self._kill()
+                raise EvaluationTimeout(
+                    f"Evaluating `{expression}` took longer than {timeout} seconds."
+                )
+        if status == "error":
+            raise EvaluationError(result)
+        data, imports_executed = result
+        count("imports_executed", imports_executed)
+        return data
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                try:
+                    self._connection.send(None)
+                except OSError:
+                    pass
+                self._process.join(timeout=1)
+            self._kill()
+
+
+class EvaluationPool:
+    """
+    Long-lived worker processes that evaluate the code loading infrastructure
+    blocks that cannot be resolved statically, so that slow, crashing, or
+    memory-hungry user code cannot take down the process running the upgrade.
+
+    Imports are executed in a namespace per file that the worker keeps, so the
+    imports shared by every call in a file are only executed once; any other
+    statements are executed again for every evaluation, in a copy of that
+    namespace. Every file is always evaluated by the same worker, which keeps
+    the namespaces of the `MAX_NAMESPACES` files it evaluated most recently.
+    Each evaluation must finish within `timeout` seconds and each worker may use
+    at most `memory_limit` bytes of address space; a worker that times out or
+    crashes is replaced. Only the block document data is sent back.
+    """
+
+    def __init__(
+        self,
+        processes: int = DEFAULT_PROCESSES,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        memory_limit: Optional[int] = DEFAULT_MEMORY_LIMIT,
+    ):
+        self._timeout = timeout
+        self._workers = [_Worker(memory_limit) for _ in range(max(processes, 1))]
+        self._pid = os.getpid()
+
+    @property
+    def pid(self) -> int:
+        """
+        The process the pool was created in; workers cannot be shared with
+        processes forked from it.
+        """
+        return self._pid
+
+    def evaluate(
+        self, namespace: str, statements: Sequence[str], expression: str
+    ) -> dict:
+        """
+        Execute `statements` in the namespace named `namespace`, skipping any
+        import already executed in it, then return the data of the block that
+        `expression` evaluates to.
+        """
+        worker = self._workers[zlib.crc32(namespace.encode()) % len(self._workers)]
+        return worker.evaluate(namespace, statements, expression, self._timeout)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+    def __enter__(self) -> "EvaluationPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_settings: Dict[str, Any] = {}
+_pool: Optional[EvaluationPool] = None
+_pool_lock = threading.Lock()
+
+
+def configure_evaluation(
+    processes: int = DEFAULT_PROCESSES,
+    timeout: Optional[float] = DEFAULT_TIMEOUT,
+    memory_limit: Optional[int] = DEFAULT_MEMORY_LIMIT,
+):
+    """
+    Set the options of the pool used by `evaluate_block_document_data`. Workers
+    are started on the first evaluation.
+    """
+    global _pool
+    with _pool_lock:
+        _settings.update(
+            processes=processes, timeout=timeout, memory_limit=memory_limit
+        )
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def evaluation_pool() -> EvaluationPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = EvaluationPool(**_settings)
+        return _pool
+
+
+def evaluate_block_document_data(
+    namespace: str, statements: List[str], expression: str
+) -> dict:
+    """
+    Evaluate `expression` in the shared evaluation pool; see
+    `EvaluationPool.evaluate`.
+    """
+    return evaluation_pool().evaluate(namespace, statements, expression)
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.close()
@@ -0,0 +1,203 @@
+import fnmatch
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+# for each rule, byte strings that must all appear in a file for the rule to
+# find anything in it; see `pmt.rules.Rule.markers`
+Markers = Sequence[Tuple[bytes, ...]]
+
+CHUNK_SIZE = 64 * 1024
+
+EXCLUDED_DIRECTORIES = {
+    ".git",
+    ".hg",
+    ".mypy_cache",
+    ".nox",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".tox",
+    ".venv",
+    "__pycache__",
+    "build",
+    "dist",
+    "node_modules",
+    "venv",
+}
+
+
+def _is_glob_pattern(path: str) -> bool:
+    return any(char in path for char in "*?[")
+
+
+def _iter_directory(directory: Path) -> Iterable[Path]:
+    for path in directory.rglob("*.py"):
+        relative_parts = path.relative_to(directory).parts[:-1]
+        if any(part in EXCLUDED_DIRECTORIES for part in relative_parts):
+            continue
+        if path.is_file():
+            yield path
+
+
+def find_python_files(paths: Iterable[Union[str, Path]]) -> List[Path]:
+    """
+    Expand the provided files, directories, and glob patterns into a sorted,
+    de-duplicated list of Python files.
+
+    Directories are searched recursively and common virtual environment, cache,
+    and VCS directories are skipped. Files that are passed explicitly are always
+    included, regardless of their extension.
+    """
+    found = set()
+    for path in paths:
+        path_str = str(path)
+        if not Path(path_str).exists() and _is_glob_pattern(path_str):
+            candidates = [Path(match) for match in glob.glob(path_str, recursive=True)]
+        else:
+            candidates = [Path(path_str)]
+
+        for candidate in candidates:
+            if candidate.is_dir():
+                found.update(_iter_directory(candidate))
+            elif candidate.suffix == ".py" or Path(path_str) == candidate:
+                found.add(candidate)
+
+    return sorted(found)
+
+
+def _is_within(path: Path, directory: Path) -> bool:
+    try:
+        relative_parts = path.relative_to(directory).parts[:-1]
+    except ValueError:
+        return False
+    return not any(part in EXCLUDED_DIRECTORIES for part in relative_parts)
+
+
+def select_python_files(
+    candidates: Iterable[Path], paths: Iterable[Union[str, Path]]
+) -> List[Path]:
+    """
+    Select the Python files from `candidates`, for example the files changed in
+    a git repository, that `find_python_files` would find in `paths`, without
+    searching any directories. Candidates that no longer exist are skipped.
+    """
+    patterns = [str(path) for path in paths]
+    selected = set()
+    for candidate in candidates:
+        candidate = Path(candidate)
+        if candidate.suffix != ".py" or not candidate.is_file():
+            continue
+        resolved_candidate = candidate.resolve()
+        for pattern in patterns:
+            path = Path(pattern)
+            if path.exists():
+                resolved_path = path.resolve()
+                matches = resolved_candidate == resolved_path or (
+                    path.is_dir() and _is_within(resolved_candidate, resolved_path)
+                )
+            else:
+                matches = _is_glob_pattern(pattern) and fnmatch.fnmatch(
+                    candidate.as_posix(), Path(pattern).as_posix()
+                )
+            if matches:
+                selected.add(candidate)
+                break
+    return sorted(selected)
+
+
+def _resolve_markers(markers: Optional[Markers]) -> Markers:
+    if markers is None:
+        from pmt.rules import candidate_markers
+
+        markers = candidate_markers()
+    return markers
+
+
+def contains_candidate_markers(
+    source: bytes, markers: Optional[Markers] = None
+) -> bool:
+    """
+    Check whether `source` contains every marker of any rule, by default of
+    every registered rule.
+    """
+    return any(
+        all(marker in source for marker in rule_markers)
+        for rule_markers in _resolve_markers(markers)
+    )
+
+
+def is_candidate(
+    path: Path, chunk_size: int = CHUNK_SIZE, markers: Optional[Markers] = None
+) -> bool:
+    """
+    Check whether any rule, by default any registered rule, might find something
+    to rewrite in a file without parsing it.
+
+    The file is streamed in chunks and reading stops as soon as every marker of
+    a rule has been found. Files that cannot be read are treated as candidates
+    so that the error is reported when they are migrated.
+    """
+    markers = _resolve_markers(markers)
+    if not markers:
+        return False
+    if not all(markers):
+        # a rule without markers applies to every file
+        return True
+    remaining = [set(rule_markers) for rule_markers in markers]
+    overlap = (
+        max(len(marker) for rule_markers in markers for marker in rule_markers) - 1
+    )
+    tail = b""
+    try:
+        with open(path, "rb") as f:
+            while all(remaining):
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                window = tail + chunk
+                remaining = [
+                    {marker for marker in rule_remaining if marker not in window}
+                    for rule_remaining in remaining
+                ]
+                tail = window[-overlap:] if overlap else b""
+    except OSError:
+        return True
+    return not all(remaining)
+
+
+def count_candidate_calls(path: Path, markers: Optional[Markers] = None) -> int:
+    """
+    Estimate the number of nodes the registered rules rewrite in a file without
+    parsing it, by counting mentions of the first marker of each rule whose
+    markers all appear in the file, e.g. `build_from_flow`. Files that cannot be
+    read count as a single call.
+    """
+    try:
+        source = Path(path).read_bytes()
+    except OSError:
+        return 1
+    return sum(
+        source.count(rule_markers[0]) if rule_markers else 1
+        for rule_markers in _resolve_markers(markers)
+        if contains_candidate_markers(source, [rule_markers])
+    )
+
+
+def filter_candidates(
+    paths: Sequence[Path], threads: int = 8, markers: Optional[Markers] = None
+) -> List[Path]:
+    """
+    Return the paths that any rule, by default any registered rule, might find
+    something to rewrite in, preserving their order. Files are scanned
+    concurrently in a small thread pool so that scanning many files is bound by
+    I/O.
+    """
+    markers = _resolve_markers(markers)
+    if len(paths) <= 1:
+        return [path for path in paths if is_candidate(path, markers=markers)]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        candidates = executor.map(
+            lambda path: is_candidate(path, markers=markers), paths
+        )
+        return [path for path, candidate in zip(paths, candidates) if candidate]
@@ -0,0 +1,253 @@
+import difflib
+import io
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, List, Optional
+
+from pmt.cache import pmt_version
+from pmt.options import OutputFormat
+
+if TYPE_CHECKING:
+    from pmt.migrate import FileMigration, Span
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+SARIF_RULE_ID = "build-from-flow"
+
+
+def display_path(path: Path) -> str:
+    """
+    The path relative to the current directory if it is inside it, using
+    forward slashes so that output is the same on every platform.
+    """
+    try:
+        return Path(path).resolve().relative_to(Path.cwd()).as_posix()
+    except ValueError:
+        return Path(path).as_posix()
+
+
+class MigrationWriter(ABC):
+    """
+    Streams the results of an upgrade to `stream` one file at a time.
+    """
+
+    def __init__(self, stream: IO[str]):
+        self._stream = stream
+
+    @abstractmethod
+    def write(self, migration: "FileMigration"):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonLinesWriter(MigrationWriter):
+    """
+    Writes one JSON record per upgraded call, and one per file that failed to
+    upgrade, as soon as each file is done.
+    """
+
+    def write(self, migration: "FileMigration"):
+        path = display_path(migration.path)
+        if migration.error:
+            self._write_record({"path": path, "error": migration.error})
+        for call in migration.calls:
+            self._write_record(
+                {
+                    "path": path,
+                    "deployment_name": call.deployment_name,
+                    "span": call.span._asdict() if call.span else None,
+                    "original_code": call.original_code,
+                    "updated_code": call.updated_code,
+                    "additional_info": call.additional_info,
+                    "required_imports": migration.required_imports,
+                    "shape": call.shape,
+                }
+            )
+        self._stream.flush()
+
+    def _write_record(self, record: dict):
+        self._stream.write(json.dumps(record) + "\n")
+
+
+def _split_lines(text: str) -> List[str]:
+    # only `\n` ends a line for Python and `git apply`, while `str.splitlines`
+    # also splits on characters such as `\x0c` and `\u2028`
+    return io.StringIO(text, newline="\n").readlines()
+
+
+class DiffWriter(MigrationWriter):
+    """
+    Writes a unified diff per upgraded file that can be applied with
+    `git apply` or `patch -p1`. Requires migrations rendered with
+    `render_source=True`.
+    """
+
+    def write(self, migration: "FileMigration"):
+        if migration.error or not migration.calls:
+            return
+        path = display_path(migration.path)
+        original = _split_lines(migration.path.read_bytes().decode())
+        updated = _split_lines(migration.updated_source)
+        for line in difflib.unified_diff(
+            original, updated, fromfile=f"a/{path}", tofile=f"b/{path}"
+        ):
+            self._stream.write(line)
+            if not line.endswith("\n"):
+                self._stream.write("\n\\ No newline at end of file\n")
+        self._stream.flush()
+
+
+def _sarif_region(span: "Span", lines: List[bytes]) -> dict:
+    # SARIF columns are 1-indexed code points while spans use byte offsets
+    def column(line: int, byte_offset: int) -> int:
+        return len(lines[line - 1][:byte_offset].decode(errors="replace")) + 1
+
+    return {
+        "startLine": span.start_line,
+        "startColumn": column(span.start_line, span.start_column),
+        "endLine": span.end_line,
+        "endColumn": column(span.end_line, span.end_column),
+    }
+
+
+def _indent(code: str, line: bytes) -> str:
+    indent = line[: len(line) - len(line.lstrip(b" \t"))].decode()
+    return "\n".join(
+        indent + code_line if i and code_line else code_line
+        for i, code_line in enumerate(code.rstrip("\n").split("\n"))
+    )
+
+
+class SarifWriter(MigrationWriter):
+    """
+    Writes a SARIF log with a result, including a fix, for each upgraded call.
+    Results are written as each file is done; the log is completed by `close`.
+    """
+
+    def __init__(self, stream: IO[str]):
+        super().__init__(stream)
+        self._results = 0
+        self._notifications: List[dict] = []
+        self._stream.write(
+            '{"$schema": '
+            + json.dumps(SARIF_SCHEMA)
+            + ', "version": "2.1.0", "runs": [{"tool": '
+            + json.dumps(self._tool())
+            + ', "columnKind": "unicodeCodePoints", "results": ['
+        )
+
+    @staticmethod
+    def _tool() -> dict:
+        return {
+            "driver": {
+                "name": "pmt",
+                "version": pmt_version(),
+                "informationUri": "https://github.com/PrefectHQ/pmt",
+                "rules": [
+                    {
+                        "id": SARIF_RULE_ID,
+                        "shortDescription": {
+                            "text": (
+                                "Deployment.build_from_flow can be upgraded to"
+                                " flow.deploy or flow.serve"
+                            )
+                        },
+                    }
+                ],
+            }
+        }
+
+    def write(self, migration: "FileMigration"):
+        path = display_path(migration.path)
+        if migration.error:
+            self._notifications.append(
+                {
+                    "level": "error",
+                    "message": {"text": migration.error},
+                    "locations": [
+                        {"physicalLocation": {"artifactLocation": {"uri": path}}}
+                    ],
+                }
+            )
+        if not migration.calls:
+            return
+
+        lines = migration.path.read_bytes().splitlines()
+        for call in migration.calls:
+            message = (
+                "Replace this call to Deployment.build_from_flow with:\n\n"
+                + call.updated_code
+            )
+            if call.additional_info:
+                message += "\n" + "\n".join(call.additional_info)
+            result = {
+                "ruleId": SARIF_RULE_ID,
+                "level": "warning",
+                "message": {"text": message},
+            }
+            if call.span:
+                region = _sarif_region(call.span, lines)
+                artifact_location = {"uri": path}
+                result["locations"] = [
+                    {
+                        "physicalLocation": {
+                            "artifactLocation": artifact_location,
+                            "region": region,
+                        }
+                    }
+                ]
+                result["fixes"] = [
+                    {
+                        "description": {"text": "Upgrade to the new deployment API"},
+                        "artifactChanges": [
+                            {
+                                "artifactLocation": artifact_location,
+                                "replacements": [
+                                    {
+                                        "deletedRegion": region,
+                                        "insertedContent": {
+                                            "text": _indent(
+                                                call.updated_code,
+                                                lines[call.span.start_line - 1],
+                                            )
+                                        },
+                                    }
+                                ],
+                            }
+                        ],
+                    }
+                ]
+            self._stream.write((", " if self._results else "") + json.dumps(result))
+            self._results += 1
+        self._stream.flush()
+
+    def close(self):
+        invocation = {
+            "executionSuccessful": not self._notifications,
+            "toolExecutionNotifications": self._notifications,
+        }
+        self._stream.write('], "invocations": [' + json.dumps(invocation) + "]}]}\n")
+        self._stream.flush()
+
+
+_WRITERS = {
+    OutputFormat.jsonl: JsonLinesWriter,
+    OutputFormat.diff: DiffWriter,
+    OutputFormat.sarif: SarifWriter,
+}
+
+
+def create_writer(
+    output_format: OutputFormat, stream: IO[str]
+) -> Optional[MigrationWriter]:
+    """
+    Create a writer that streams migrations to `stream` in `output_format`, or
+    return `None` for formats rendered for the terminal.
+    """
+    writer_class = _WRITERS.get(output_format)
+    if writer_class is None:
+        return None
+    return writer_class(stream)
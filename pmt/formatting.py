@@ -0,0 +1,142 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pmt.profiling import count, phase
+
+DEFAULT_LINE_LENGTH = 88
+
+DEFAULT_MAX_ENTRIES = 4096
+
+# separates snippets formatted together; black keeps standalone comments in place
+_BOUNDARY = "# pmt: snippet boundary"
+
+
+class Formatter:
+    """
+    Formats generated source code with black.
+
+    Formatted code is memoized by a hash of the source and the line length, and
+    the least recently used entries are evicted once more than `max_entries` are
+    stored. Since the sources formatted are rendered from syntax trees, the same
+    call shape always produces the same source and is only formatted once.
+
+    `format_many` formats many snippets, e.g. every call in a file, with a
+    single black invocation per line length.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(source: str, line_length: int) -> Tuple[str, int]:
+        return (hashlib.sha256(source.encode()).hexdigest(), line_length)
+
+    def _get(self, key: Tuple[str, int]) -> Optional[str]:
+        with self._lock:
+            formatted = self._entries.get(key)
+            if formatted is None:
+                self.misses += 1
+                count("format_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            count("format_cache_hits")
+            return formatted
+
+    def _set(self, key: Tuple[str, int], formatted: str):
+        with self._lock:
+            self._entries[key] = formatted
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def format(self, source: str, line_length: Optional[int] = None) -> str:
+        (formatted,) = self.format_many([source], line_length)
+        return formatted
+
+    def format_many(
+        self, sources: Sequence[str], line_length: Optional[int] = None
+    ) -> List[str]:
+        """
+        Format each of `sources`, formatting every source that has not been
+        formatted before with a single black invocation. Each source must be a
+        sequence of complete statements.
+        """
+        line_length = line_length or DEFAULT_LINE_LENGTH
+        sources = [source.strip() for source in sources]
+        keys = [self._key(source, line_length) for source in sources]
+
+        formatted: Dict[Tuple[str, int], str] = {}
+        pending: Dict[Tuple[str, int], str] = {}
+        for key, source in zip(keys, sources):
+            if key in formatted or key in pending:
+                continue
+            cached = self._get(key)
+            if cached is None:
+                pending[key] = source
+            else:
+                formatted[key] = cached
+
+        if pending:
+            for key, result in zip(
+                pending, _format_batch(list(pending.values()), line_length)
+            ):
+                self._set(key, result)
+                formatted[key] = result
+
+        return [formatted[key] for key in keys]
+
+
+def _format_str(source: str, line_length: int) -> str:
+    import black
+
+    with phase("format"):
+        formatted = black.format_str(
+            source, mode=black.FileMode(line_length=line_length)
+        )
+    count("black_format_calls")
+    return formatted
+
+
+def _format_batch(sources: List[str], line_length: int) -> List[str]:
+    if len(sources) == 1 or any(_BOUNDARY in source for source in sources):
+        return [_format_str(source, line_length) for source in sources]
+
+    joined = "".join(f"{source}\n{_BOUNDARY}\n" for source in sources)
+    try:
+        chunks = _format_str(joined, line_length).split(f"{_BOUNDARY}\n")
+    except Exception:
+        chunks = []
+    if len(chunks) != len(sources) + 1:
+        # e.g. a `from __future__` import that is only valid at the top of a
+        # module; format the snippets on their own instead
+        return [_format_str(source, line_length) for source in sources]
+    return [chunk.strip("\n") + "\n" if chunk.strip() else "" for chunk in chunks[:-1]]
+
+
+_formatter: Optional[Formatter] = None
+_formatter_lock = threading.Lock()
+
+
+def default_formatter() -> Formatter:
+    """
+    The formatter shared by every migration in the current process.
+    """
+    global _formatter
+    with _formatter_lock:
+        if _formatter is None:
+            _formatter = Formatter()
+        return _formatter
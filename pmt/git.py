@@ -0,0 +1,86 @@
+import os
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+
+class GitError(RuntimeError):
+    """
+    Raised when a git command fails, e.g. because the current directory is not
+    in a git repository or a ref does not exist.
+    """
+
+
+def _git(args: List[str], cwd: Optional[Path] = None) -> str:
+    try:
+        result = subprocess.run(
+            ["git", *args], cwd=cwd, capture_output=True, text=True, check=False
+        )
+    except OSError as exc:
+        raise GitError(f"Unable to run git: {exc}") from exc
+    if result.returncode != 0:
+        raise GitError(result.stderr.strip() or f"git {' '.join(args)} failed.")
+    return result.stdout
+
+
+def _split_paths(output: str) -> List[str]:
+    return [path for path in output.split("\0") if path]
+
+
+def repository_root(cwd: Optional[Path] = None) -> Path:
+    return Path(_git(["rev-parse", "--show-toplevel"], cwd=cwd).strip())
+
+
+def changed_files(
+    since: Optional[str] = None, staged: bool = False, cwd: Optional[Path] = None
+) -> List[Path]:
+    """
+    List the files in the git repository containing `cwd` that were added or
+    modified, sorted and relative to `cwd` where possible. Deleted files are
+    never included.
+
+    With `staged`, only files with changes staged for the next commit are
+    listed; see `unstaged_files` for those with further changes. With
+    `since`, changes made after the working tree diverged from `since` are
+    listed: commits since the merge base of `since` and `HEAD`, uncommitted
+    changes, and untracked files that are not ignored.
+    """
+    root = repository_root(cwd)
+    if staged:
+        paths = _split_paths(
+            _git(["diff", "--name-only", "--cached", "--diff-filter=d", "-z"], cwd=root)
+        )
+    else:
+        merge_base = _git(["merge-base", since or "HEAD", "HEAD"], cwd=root).strip()
+        paths = _split_paths(
+            _git(["diff", "--name-only", "--diff-filter=d", "-z", merge_base], cwd=root)
+        )
+        paths += _split_paths(
+            _git(["ls-files", "--others", "--exclude-standard", "-z"], cwd=root)
+        )
+
+    return _relative_paths(root, paths, cwd)
+
+
+def unstaged_files(cwd: Optional[Path] = None) -> List[Path]:
+    """
+    List the files in the git repository containing `cwd` with changes in the
+    working tree that are not staged, sorted and relative to `cwd` where
+    possible. Files are always read from the working tree, so a file listed by
+    `changed_files(staged=True)` is upgraded with these changes included.
+    """
+    root = repository_root(cwd)
+    paths = _split_paths(_git(["diff", "--name-only", "-z"], cwd=root))
+    return _relative_paths(root, paths, cwd)
+
+
+def _relative_paths(root: Path, paths: List[str], cwd: Optional[Path]) -> List[Path]:
+    base = Path(cwd or os.getcwd()).resolve()
+    relative_paths = set()
+    for path in paths:
+        absolute_path = root / path
+        try:
+            relative_paths.add(absolute_path.relative_to(base))
+        except ValueError:
+            relative_paths.add(absolute_path)
+    return sorted(relative_paths)
@@ -0,0 +1,81 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from pmt.migrate import CallMigration, FileMigration, Span
+
+
+class CallSite(NamedTuple):
+    path: Path
+    span: Optional["Span"]
+    deployment_name: Optional[str]
+
+
+class CallGroup:
+    """
+    Calls with the same shape: the same keyword arguments, kinds of storage and
+    infrastructure, and additional info. Only the first call in the group is
+    kept in full, as the representative of every other call.
+    """
+
+    def __init__(self, shape: Optional[str], representative: "CallMigration"):
+        self._shape = shape
+        self._representative = representative
+        self._sites: List[CallSite] = []
+
+    @property
+    def shape(self) -> Optional[str]:
+        return self._shape
+
+    @property
+    def representative(self) -> "CallMigration":
+        return self._representative
+
+    @property
+    def sites(self) -> List[CallSite]:
+        return self._sites
+
+    def __len__(self):
+        return len(self._sites)
+
+
+class CallGrouper:
+    """
+    Groups the calls of migrations as they are added, keeping a single
+    representative call per group and the location of every other call.
+    Calls without a shape are never grouped with other calls.
+    """
+
+    def __init__(self):
+        self._groups: Dict[Tuple[str, object], CallGroup] = {}
+
+    def add(self, migration: "FileMigration"):
+        for call in migration.calls:
+            if call.shape is None:
+                key: Tuple[str, object] = ("call", (migration.path, call.span))
+            else:
+                key = ("shape", call.shape)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = CallGroup(call.shape, call)
+            group.sites.append(
+                CallSite(migration.path, call.span, call.deployment_name)
+            )
+
+    @property
+    def groups(self) -> List[CallGroup]:
+        """
+        The groups found so far, largest first and otherwise in the order their
+        first call was added.
+        """
+        return sorted(self._groups.values(), key=len, reverse=True)
+
+
+def group_calls(migrations: Iterable["FileMigration"]) -> List[CallGroup]:
+    """
+    Group the calls of `migrations` by shape; see `CallGrouper`.
+    """
+    grouper = CallGrouper()
+    for migration in migrations:
+        grouper.add(migration)
+    return grouper.groups
@@ -0,0 +1,696 @@
+import ast
+import os
+from collections import Counter, deque
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import astor
+
+from pmt.blocks import (
+    DEFAULT_CONCURRENCY,
+    BlockDocumentCache,
+    BlockReference,
+    prefetch_block_documents,
+)
+from pmt.cache import MigrationCache
+from pmt.files import contains_candidate_markers, filter_candidates
+from pmt.profiling import Profiler, count, phase
+from pmt.rules import RuleEngine
+from pmt.utils import (
+    convert_ast_node_to_source_code,
+    convert_ast_nodes_to_source_code,
+    patch_source,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+T = TypeVar("T")
+
+# the number of files whose calls are collected, and whose blocks are loaded
+# together, before any of them is rewritten
+PREFETCH_WINDOW = 64
+
+
+class Span(NamedTuple):
+    """
+    The location of a node in its source file. Lines are 1-indexed and columns
+    are 0-indexed UTF-8 byte offsets, as reported by `ast`.
+    """
+
+    start_line: int
+    start_column: int
+    end_line: int
+    end_column: int
+
+    @classmethod
+    def from_node(cls, node: ast.AST) -> "Span":
+        return cls(node.lineno, node.col_offset, node.end_lineno, node.end_col_offset)
+
+
+@dataclass
+class CallMigration:
+    """
+    The result of upgrading a single `Deployment.build_from_flow` call.
+    """
+
+    deployment_name: Optional[str]
+    original_code: str
+    updated_code: str
+    additional_info: List[str] = field(default_factory=list)
+    span: Optional[Span] = None
+    shape: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CallMigration":
+        data = dict(data)
+        if data.get("span"):
+            data["span"] = Span(*data["span"])
+        return cls(**data)
+
+
+@dataclass
+class FileMigration:
+    """
+    The result of upgrading all `Deployment.build_from_flow` calls in a file.
+    """
+
+    path: Path
+    calls: List[CallMigration] = field(default_factory=list)
+    updated_source: Optional[str] = None
+    required_imports: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    cached: bool = False
+    profile: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    @property
+    def additional_info(self) -> List[str]:
+        additional_info = []
+        for call in self.calls:
+            for action in call.additional_info:
+                if action not in additional_info:
+                    additional_info.append(action)
+        return additional_info
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["path"] = str(self.path)
+        del data["cached"]
+        del data["profile"]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FileMigration":
+        data = dict(data)
+        data["path"] = Path(data["path"])
+        data["calls"] = [CallMigration.from_dict(call) for call in data["calls"]]
+        return cls(**data)
+
+
+class _CollectedFile:
+    """
+    A file whose calls have been collected but not rewritten yet, or the result
+    for a file that has nothing to rewrite.
+    """
+
+    __slots__ = ("path", "source", "engine", "migration", "profiler")
+
+    def __init__(
+        self,
+        path: Path,
+        source: Optional[bytes] = None,
+        engine: Optional[RuleEngine] = None,
+        migration: Optional[FileMigration] = None,
+        profiler: Optional[Profiler] = None,
+    ):
+        self.path = path
+        self.source = source
+        self.engine = engine
+        self.migration = migration
+        self.profiler = profiler
+
+
+def _activate(profiler: Optional[Profiler]):
+    return profiler.activate() if profiler else nullcontext()
+
+
+class _Migrator:
+    """
+    Migrates files with a fixed set of options. Instances are sent to worker
+    processes, so everything they hold must be picklable.
+    """
+
+    def __init__(
+        self,
+        render_source: bool = False,
+        patch: bool = False,
+        block_cache: Optional[BlockDocumentCache] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        migration_cache: Optional[MigrationCache] = None,
+        profile: bool = False,
+        format_calls: bool = True,
+    ):
+        self.render_source = render_source
+        self.patch = patch
+        self.format_calls = format_calls
+        if block_cache is None:
+            block_cache = BlockDocumentCache()
+        self.block_cache = block_cache
+        self.concurrency = concurrency
+        self.migration_cache = migration_cache
+        self.profile = profile
+
+    @property
+    def cache_variant(self) -> str:
+        variant = "patch" if self.patch else ""
+        if not self.format_calls:
+            variant += "-unformatted"
+        return variant
+
+    def cached_migration(self, path: Path, source: bytes) -> Optional[FileMigration]:
+        if not self.migration_cache:
+            return None
+        return self.migration_cache.get(
+            self.migration_cache.key(path, source, self.cache_variant),
+            self.render_source,
+        )
+
+    def migrate_file(self, path: Path) -> FileMigration:
+        if self.migration_cache:
+            try:
+                cached_migration = self.cached_migration(path, path.read_bytes())
+            except OSError as exc:
+                return _failed_migration(path, exc)
+            if cached_migration:
+                return cached_migration
+        return self.migrate_path(path)
+
+    def migrate_path(self, path: Path) -> FileMigration:
+        if not self.profile:
+            return self._migrate_path(path)
+
+        # each file is profiled separately so that files migrated in worker
+        # processes can send their profile back with the result
+        profiler = Profiler()
+        with profiler.activate(), phase("migrate_file", path=path):
+            migration = self._migrate_path(path)
+        migration.profile = profiler.export()
+        return migration
+
+    def _migrate_path(self, path: Path) -> FileMigration:
+        try:
+            with phase("read"):
+                source = path.read_bytes()
+        except OSError as exc:
+            return _failed_migration(path, exc)
+        count("bytes_read", len(source))
+        return self.migrate_source(path, source)
+
+    def migrate_source(self, path: Path, source: bytes) -> FileMigration:
+        try:
+            engine = self._collect(path, source)
+        except Exception as exc:
+            return _failed_migration(path, exc)
+        return self._transform(path, source, engine)
+
+    def migrate_paths(self, paths: Sequence[Path]) -> Iterator[FileMigration]:
+        """
+        Migrate `paths` in windows of `PREFETCH_WINDOW` files. Every file in a
+        window is parsed and its calls collected, then the blocks referenced
+        across the window that are not cached yet are loaded together before any
+        call in the window is rewritten. Each file is only parsed once, and only
+        the trees of a single window are held at a time.
+        """
+        return self._migrate_together(paths, self._collect_path)
+
+    def migrate_sources(
+        self, sources: Sequence[Tuple[Path, bytes]]
+    ) -> Iterator[FileMigration]:
+        """
+        Like `migrate_paths`, for sources that have already been read.
+        """
+        return self._migrate_together(sources, lambda item: self._collect_source(*item))
+
+    def _migrate_together(
+        self, items: Sequence[T], collect: Callable[[T], "_CollectedFile"]
+    ) -> Iterator[FileMigration]:
+        for start in range(0, len(items), PREFETCH_WINDOW):
+            window: List[Optional[_CollectedFile]] = [
+                collect(item) for item in items[start : start + PREFETCH_WINDOW]
+            ]
+            profiler = Profiler() if self.profile else None
+            with _activate(profiler), phase("prefetch_blocks"):
+                try:
+                    prefetch_block_documents(
+                        {
+                            reference
+                            for collected in window
+                            if collected and collected.engine
+                            for reference in collected.engine.block_references
+                        },
+                        self.block_cache,
+                        self.concurrency,
+                    )
+                except Exception:
+                    # each file loads the blocks it uses when it is rewritten,
+                    # and reports any error as its own
+                    count("prefetch_errors")
+            for index, collected in enumerate(window):
+                # release each tree as soon as its file has been migrated
+                window[index] = None
+                migration = self._finish(collected)
+                if profiler and index == 0:
+                    # the blocks loaded for the window are counted once
+                    profiler.merge(migration.profile)
+                    migration.profile = profiler.export()
+                yield migration
+
+    def _collect_path(self, path: Path) -> "_CollectedFile":
+        profiler = Profiler() if self.profile else None
+        with _activate(profiler), phase("migrate_file", path=path):
+            try:
+                with phase("read"):
+                    source = path.read_bytes()
+            except OSError as exc:
+                return _CollectedFile(path, migration=_failed_migration(path, exc))
+            count("bytes_read", len(source))
+            collected = self._collect_source(path, source)
+        collected.profiler = profiler
+        return collected
+
+    def _collect_source(self, path: Path, source: bytes) -> "_CollectedFile":
+        try:
+            engine = self._collect(path, source)
+        except Exception as exc:
+            return _CollectedFile(path, migration=_failed_migration(path, exc))
+        return _CollectedFile(path, source=source, engine=engine)
+
+    def _finish(self, collected: "_CollectedFile") -> FileMigration:
+        path = collected.path
+        with _activate(collected.profiler), phase("migrate_file", path=path):
+            migration = collected.migration
+            if migration is None:
+                migration = self._transform(path, collected.source, collected.engine)
+        if collected.profiler:
+            migration.profile = collected.profiler.export()
+        return migration
+
+    def _collect(self, path: Path, source: bytes) -> Optional[RuleEngine]:
+        """
+        Parse `source` and find the nodes every rule rewrites, returning `None`
+        if there are none.
+        """
+        if not contains_candidate_markers(source):
+            return None
+
+        with phase("parse"):
+            tree = ast.parse(source)
+        count("files_parsed")
+
+        # every registered rule is applied in a single traversal of the tree
+        engine = RuleEngine(current_file=path, tree=tree, block_cache=self.block_cache)
+        with phase("collect"):
+            engine.collect(tree)
+        if not engine.rewrites:
+            engine.release()
+            return None
+        return engine
+
+    def _transform(
+        self, path: Path, source: bytes, engine: Optional[RuleEngine]
+    ) -> FileMigration:
+        try:
+            if engine is None:
+                migration = FileMigration(path=path)
+            else:
+                migration = self._transform_engine(path, source, engine)
+        except Exception as exc:
+            return _failed_migration(path, exc)
+
+        if self.migration_cache:
+            self.migration_cache.set(
+                self.migration_cache.key(path, source, self.cache_variant), migration
+            )
+        return migration
+
+    def transform_source(self, path: Path, source: bytes) -> FileMigration:
+        engine = self._collect(path, source)
+        if engine is None:
+            return FileMigration(path=path)
+        return self._transform_engine(path, source, engine)
+
+    def _transform_engine(
+        self, path: Path, source: bytes, engine: RuleEngine
+    ) -> FileMigration:
+        try:
+            return self._transform_tree(path, source, engine.tree, engine)
+        finally:
+            # free the tree as soon as the result has been built
+            engine.release()
+
+    def _transform_tree(
+        self, path: Path, source: bytes, tree: ast.AST, engine: RuleEngine
+    ) -> FileMigration:
+        rewrites = engine.rewrites
+        count("calls", len(rewrites))
+
+        with phase("resolve_blocks"):
+            prefetch_block_documents(
+                engine.block_references, self.block_cache, self.concurrency
+            )
+        with phase("rewrite"):
+            tree = engine.rewrite(tree)
+
+        with phase("render_calls"):
+            # the code of every call in the file is formatted together
+            code = convert_ast_nodes_to_source_code(
+                [rewrite.node for rewrite in rewrites]
+                + [rewrite.updated_node for rewrite in rewrites],
+                format=self.format_calls,
+            )
+            calls = [
+                CallMigration(
+                    deployment_name=rewrite.deployment_name,
+                    original_code=original_code,
+                    updated_code=updated_code,
+                    additional_info=rewrite.additional_info,
+                    span=Span.from_node(rewrite.node),
+                    shape=rewrite.shape,
+                )
+                for rewrite, original_code, updated_code in zip(
+                    rewrites, code[: len(rewrites)], code[len(rewrites) :]
+                )
+            ]
+        # many calls may require the same import, e.g. of `Block`
+        imports_by_source = {
+            astor.to_source(required_import).strip(): required_import
+            for required_import in engine.required_imports
+        }
+        required_imports = sorted(imports_by_source)
+
+        updated_source = None
+        if self.render_source and self.patch:
+            with phase("render_source"):
+                updated_source = patch_source(
+                    source,
+                    tree,
+                    [(rewrite.node, rewrite.updated_node) for rewrite in rewrites],
+                    required_imports,
+                )
+        elif self.render_source:
+            for required_import in reversed(required_imports):
+                tree.body.insert(0, imports_by_source[required_import])
+            with phase("render_source"):
+                updated_source = convert_ast_node_to_source_code(tree)
+
+        return FileMigration(
+            path=path,
+            calls=calls,
+            updated_source=updated_source,
+            required_imports=required_imports,
+        )
+
+
+def _failed_migration(path: Path, exc: Exception) -> FileMigration:
+    return FileMigration(path=path, error=f"{type(exc).__name__}: {exc}")
+
+
+def migrate_source(
+    source: Union[str, bytes],
+    path: Union[str, Path] = "<string>",
+    render_source: bool = False,
+    block_cache: Optional[BlockDocumentCache] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    patch: bool = False,
+    format_calls: bool = True,
+) -> FileMigration:
+    """
+    Upgrade any `Deployment.build_from_flow` calls in `source` without reading
+    or writing any files. `path` is the path the source would be loaded from;
+    it is used to build the entrypoints of flows loaded from remote storage.
+
+    See `migrate_file` for a description of the options. Pass the same
+    `block_cache` to many calls to load each infrastructure block only once.
+    """
+    if isinstance(source, str):
+        source = source.encode()
+    migrator = _Migrator(
+        render_source=render_source,
+        patch=patch,
+        block_cache=block_cache,
+        concurrency=concurrency,
+        format_calls=format_calls,
+    )
+    return migrator.migrate_source(Path(path), source)
+
+
+def migrate_file(
+    path: Union[str, Path],
+    render_source: bool = False,
+    block_cache: Optional[BlockDocumentCache] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    migration_cache: Optional[MigrationCache] = None,
+    patch: bool = False,
+    profile: bool = False,
+    format_calls: bool = True,
+) -> FileMigration:
+    """
+    Parse a file, upgrade any `Deployment.build_from_flow` calls it contains, and
+    render the original and updated code for each call.
+
+    If `render_source` is `True`, the full updated source of the file is rendered
+    as well: by default the whole module is regenerated and formatted, while with
+    `patch=True` only the spans of the updated calls are replaced and formatted,
+    leaving comments and the formatting of the rest of the file untouched.
+
+    Infrastructure blocks are resolved through `block_cache` so that a block
+    referenced from many files is only loaded once; any blocks missing from the
+    cache are loaded together before calls are rewritten. Errors are captured on
+    the returned result instead of being raised so that a single bad file does not
+    abort a run over many files.
+
+    If a `migration_cache` is provided, the result for a file whose contents have
+    not changed since it was last migrated is returned from the cache without
+    parsing the file.
+
+    If `profile` is `True`, the time spent in each phase of the migration and
+    counters such as the number of blocks loaded are recorded on the result's
+    `profile`; see `pmt.profiling.Profiler`.
+
+    The original and updated code of every call in a file are formatted with
+    black together, and formatted code is memoized for the rest of the process
+    so that repeated call shapes are only formatted once. With
+    `format_calls=False` the code is not formatted at all, which is faster when
+    the results are only read by other programs.
+    """
+    migrator = _Migrator(
+        render_source=render_source,
+        patch=patch,
+        block_cache=block_cache,
+        concurrency=concurrency,
+        migration_cache=migration_cache,
+        profile=profile,
+        format_calls=format_calls,
+    )
+    return migrator.migrate_file(Path(path))
+
+
+def collect_block_references(paths: Sequence[Path]) -> Set[BlockReference]:
+    """
+    Collect references to the infrastructure blocks used by the calls that the
+    registered rules rewrite in the provided files. Files that cannot be read
+    or parsed are skipped; they are reported when they are migrated.
+    """
+    references = set()
+    for path in paths:
+        try:
+            source = path.read_bytes()
+            if not contains_candidate_markers(source):
+                continue
+            tree = ast.parse(source)
+            engine = RuleEngine(current_file=path, tree=tree)
+            engine.collect(tree)
+            references.update(engine.block_references)
+            engine.release()
+        except (OSError, SyntaxError, ValueError):
+            continue
+    return references
+
+
+_worker_migrator: Optional[_Migrator] = None
+
+
+def _initialize_worker(migrator: _Migrator):
+    global _worker_migrator
+    _worker_migrator = migrator
+
+
+def _migrate_paths_in_worker(paths: List[Path]) -> List[FileMigration]:
+    return list(_worker_migrator.migrate_paths(paths))
+
+
+def resolve_jobs(jobs: int) -> int:
+    """
+    Resolve the number of worker processes to use. `0` means one per CPU.
+    """
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def migrate_files(
+    paths: Iterable[Union[str, Path]],
+    jobs: int = 1,
+    render_source: bool = False,
+    block_cache: Optional[BlockDocumentCache] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    migration_cache: Optional[MigrationCache] = None,
+    patch: bool = False,
+    profile: bool = False,
+    format_calls: bool = True,
+) -> Iterator[FileMigration]:
+    """
+    Upgrade each of the provided files, yielding results in the same order as
+    `paths`. See `migrate_file` for a description of the options. Use
+    `pmt.files.find_python_files` to expand directories and glob patterns into
+    the files they contain.
+
+    When `jobs` is greater than one, files are processed in a pool of worker
+    processes. Results are still yielded in input order so output is stable
+    between runs. A single `block_cache` is shared by every file in the run; each
+    worker process receives its own copy of the cache.
+
+    Files that do not mention `Deployment` and `build_from_flow` are skipped
+    without being parsed, and files with a result in `migration_cache` are not
+    processed again. Every other file is parsed once: files are migrated in
+    windows of `PREFETCH_WINDOW` files, and the infrastructure blocks referenced
+    across a window that are not cached yet are loaded concurrently, with at
+    most `concurrency` requests to the Prefect API in flight, before any call in
+    the window is rewritten. With many jobs, each worker loads the blocks for
+    the windows it migrates.
+
+    Each file's tree is released once its result has been built, and results
+    are not kept once they have been yielded; with many jobs, only a couple of
+    chunks of results per worker are waiting to be consumed at any time. Use
+    `pmt.summary.RunSummary` to keep a compact record of every file.
+    """
+    paths = [Path(path) for path in paths]
+    # a path given more than once is only migrated once
+    unique_paths = list(dict.fromkeys(paths))
+    migrator = _Migrator(
+        render_source=render_source,
+        patch=patch,
+        block_cache=block_cache,
+        concurrency=concurrency,
+        migration_cache=migration_cache,
+        profile=profile,
+        format_calls=format_calls,
+    )
+
+    with phase("prescan"):
+        candidates = filter_candidates(unique_paths)
+    count("files_skipped", len(unique_paths) - len(candidates))
+    skipped_migrations = {
+        path: FileMigration(path=path)
+        for path in set(unique_paths).difference(candidates)
+    }
+    if migration_cache:
+        with phase("cache_lookup"):
+            for path in candidates:
+                try:
+                    cached_migration = migrator.cached_migration(
+                        path, path.read_bytes()
+                    )
+                except OSError:
+                    continue
+                if cached_migration:
+                    skipped_migrations[path] = cached_migration
+    pending = [path for path in candidates if path not in skipped_migrations]
+
+    # results are released as soon as they are yielded, so only the files
+    # being migrated are held in memory
+    jobs = min(resolve_jobs(jobs), max(len(pending), 1))
+    if jobs == 1:
+        yield from _in_order(paths, skipped_migrations, migrator.migrate_paths(pending))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, len(pending) // (jobs * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_initialize_worker, initargs=(migrator,)
+    ) as executor:
+        migrations = _bounded_map(
+            executor,
+            _migrate_paths_in_worker,
+            [
+                pending[start : start + chunksize]
+                for start in range(0, len(pending), chunksize)
+            ],
+            window=jobs * 2,
+        )
+        yield from _in_order(paths, skipped_migrations, migrations)
+
+
+def _in_order(
+    paths: List[Path],
+    ready: Dict[Path, FileMigration],
+    migrations: Iterator[FileMigration],
+) -> Iterator[FileMigration]:
+    """
+    Yield a result for each of `paths`, taking it from `ready` or, for the first
+    occurrence of any other path, from `migrations`. A result is released once
+    the last occurrence of its path has been yielded.
+    """
+    remaining = Counter(paths)
+    for path in paths:
+        migration = ready.get(path)
+        if migration is None:
+            migration = next(migrations)
+        remaining[path] -= 1
+        if remaining[path]:
+            ready[path] = migration
+        else:
+            ready.pop(path, None)
+        yield migration
+
+
+def _bounded_map(
+    executor: "Executor",
+    fn: Callable[[List[Path]], List[FileMigration]],
+    chunks: List[List[Path]],
+    window: int,
+) -> Iterator[FileMigration]:
+    """
+    Like `executor.map`, but with at most `window` chunks submitted and not yet
+    consumed, so that results finished ahead of a slow consumer do not pile up
+    in memory.
+    """
+    chunks_iter = iter(chunks)
+    futures: Deque["Future[List[FileMigration]]"] = deque(
+        executor.submit(fn, chunk) for chunk in islice(chunks_iter, window)
+    )
+    while futures:
+        migrations = futures.popleft().result()
+        for chunk in islice(chunks_iter, 1):
+            futures.append(executor.submit(fn, chunk))
+        yield from migrations
@@ -0,0 +1,30 @@
+from enum import Enum
+
+# Defaults and choices of options that the CLI declares. They are kept apart
+# from the modules that use them, which are only imported once a command runs,
+# so that starting the CLI stays cheap.
+
+# the number of block documents read from the Prefect API at once
+DEFAULT_CONCURRENCY = 16
+
+# the size in bytes the migration cache is pruned to
+DEFAULT_CACHE_MAX_SIZE = 100 * 1024 * 1024
+
+# seconds an evaluation of the code that loads a block may take
+DEFAULT_EVALUATION_TIMEOUT = 30.0
+
+# bytes of address space each evaluation worker may use
+DEFAULT_EVALUATION_MEMORY_LIMIT = 4 * 1024 * 1024 * 1024
+
+
+class OutputFormat(str, Enum):
+    markdown = "markdown"
+    jsonl = "jsonl"
+    diff = "diff"
+    sarif = "sarif"
+
+
+class ShardBalance(str, Enum):
+    none = "none"
+    size = "size"
+    calls = "calls"
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+_active_profiler: Optional["Profiler"] = None
+
+
+class Profiler:
+    """
+    Records the wall time spent in named phases of a migration run, along with
+    counters such as the number of blocks loaded.
+
+    Phases can be nested; the self time of a phase excludes the time spent in
+    phases nested inside it. Profilers from worker processes can be exported and
+    merged into the profiler of the main process.
+    """
+
+    def __init__(self):
+        self._events: List[dict] = []
+        self._counters: Counter = Counter()
+        self._stack: List[List[float]] = []
+
+    @property
+    def events(self) -> List[dict]:
+        return self._events
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        return dict(self._counters)
+
+    @contextmanager
+    def activate(self) -> Iterator["Profiler"]:
+        """
+        Make this profiler the one that `phase` and `count` record to.
+        """
+        global _active_profiler
+        previous = _active_profiler
+        _active_profiler = self
+        try:
+            yield self
+        finally:
+            _active_profiler = previous
+
+    @contextmanager
+    def phase(self, name: str, path: Optional[Union[str, Path]] = None):
+        # each entry holds the time spent in nested phases so far
+        self._stack.append([0.0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            (children,) = self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += duration
+            event = {
+                "name": name,
+                "ts": start,
+                "dur": duration,
+                "self": duration - children,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if path is not None:
+                event["path"] = str(path)
+            self._events.append(event)
+
+    def count(self, name: str, value: int = 1):
+        self._counters[name] += value
+
+    def export(self) -> dict:
+        return {"events": self._events, "counters": dict(self._counters)}
+
+    def merge(self, exported: Optional[dict]):
+        """
+        Add the events and counters of a profiler exported with `export`.
+        """
+        if not exported:
+            return
+        self._events.extend(exported["events"])
+        self._counters.update(exported["counters"])
+
+    def phase_totals(self) -> Dict[str, Dict[str, float]]:
+        """
+        The number of times each phase ran and its total and self time in
+        seconds.
+        """
+        totals: Dict[str, Dict[str, float]] = {}
+        for event in self._events:
+            total = totals.setdefault(
+                event["name"], {"count": 0, "total": 0.0, "self": 0.0}
+            )
+            total["count"] += 1
+            total["total"] += event["dur"]
+            total["self"] += event["self"]
+        return totals
+
+    def file_totals(self) -> Dict[str, float]:
+        """
+        The time in seconds spent migrating each file.
+        """
+        totals: Dict[str, float] = {}
+        for event in self._events:
+            if event["name"] == "migrate_file":
+                totals[event["path"]] = totals.get(event["path"], 0.0) + event["dur"]
+        return totals
+
+    def to_chrome_trace(self) -> dict:
+        """
+        The recorded phases in the Chrome trace event format, which can be
+        loaded into chrome://tracing, Perfetto, or speedscope.
+        """
+        trace_events = []
+        for event in sorted(self._events, key=lambda event: event["ts"]):
+            trace_event = {
+                "name": event["name"],
+                "cat": "pmt",
+                "ph": "X",
+                "ts": event["ts"] * 1e6,
+                "dur": event["dur"] * 1e6,
+                "pid": event["pid"],
+                "tid": event["tid"],
+            }
+            if "path" in event:
+                trace_event["args"] = {"path": event["path"]}
+            trace_events.append(trace_event)
+        return {
+            "traceEvents": trace_events,
+            "displayTimeUnit": "ms",
+            "otherData": {"counters": dict(self._counters)},
+        }
+
+    def dump_trace(self, path: Path):
+        Path(path).write_text(json.dumps(self.to_chrome_trace()))
+
+
+def active_profiler() -> Optional[Profiler]:
+    return _active_profiler
+
+
+@contextmanager
+def phase(name: str, path: Optional[Union[str, Path]] = None):
+    """
+    Record the time spent in the body of the `with` statement as `name` in the
+    active profiler, if any.
+    """
+    if _active_profiler is None:
+        yield
+        return
+    with _active_profiler.phase(name, path=path):
+        yield
+
+
+def count(name: str, value: int = 1):
+    """
+    Increment the counter `name` in the active profiler, if any.
+    """
+    if _active_profiler is not None:
+        _active_profiler.count(name, value)
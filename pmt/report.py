@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Union
+
+
+class ReportError(ValueError):
+    """
+    Raised when a report cannot be read, e.g. because it is not valid JSON lines.
+    """
+
+
+def read_records(path: Union[str, Path]) -> List[dict]:
+    """
+    Read the records written by `pmt upgrade build-from-flow --format jsonl`.
+    """
+    records = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                raise ReportError(f"{path}:{line_number}: {exc}") from exc
+            if not isinstance(record, dict) or "path" not in record:
+                raise ReportError(f"{path}:{line_number}: not a pmt record")
+            records.append(record)
+    return records
+
+
+def _sort_key(record: dict):
+    span = record.get("span") or {}
+    return (record["path"], span.get("start_line", 0), span.get("start_column", 0))
+
+
+def merge_reports(paths: Iterable[Union[str, Path]]) -> dict:
+    """
+    Combine the JSON lines output of several runs, e.g. one per shard, into a
+    single report.
+
+    Calls and errors are sorted by file and location, so the report does not
+    depend on the order of `paths`. Records repeated across reports, e.g.
+    because a shard was run twice, are only included once. Each distinct
+    additional info message is listed once with the number of calls and files
+    it applies to, most frequent first.
+    """
+    calls: Dict[str, dict] = {}
+    errors: Dict[str, dict] = {}
+    for path in paths:
+        for record in read_records(path):
+            key = json.dumps(record, sort_keys=True)
+            if "error" in record:
+                errors[key] = record
+            else:
+                calls[key] = record
+
+    sorted_calls = sorted(calls.values(), key=_sort_key)
+    additional_info: Dict[str, dict] = {}
+    for call in sorted_calls:
+        for message in call.get("additional_info") or []:
+            summary = additional_info.setdefault(
+                message, {"message": message, "calls": 0, "files": []}
+            )
+            summary["calls"] += 1
+            if call["path"] not in summary["files"]:
+                summary["files"].append(call["path"])
+
+    return {
+        "summary": {
+            "files": len({call["path"] for call in sorted_calls}),
+            "calls": len(sorted_calls),
+            "errors": len(errors),
+        },
+        "additional_info": sorted(
+            additional_info.values(),
+            key=lambda summary: (-summary["calls"], summary["message"]),
+        ),
+        "calls": sorted_calls,
+        "errors": sorted(errors.values(), key=_sort_key),
+    }
@@ -0,0 +1,407 @@
+import ast
+from abc import ABC, abstractmethod
+from functools import cached_property
+from pathlib import Path
+from typing import (
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from pmt.blocks import BlockDocumentCache, BlockReference
+from pmt.symbols import Scope, target_name
+
+RuleT = TypeVar("RuleT", bound="Rule")
+
+
+class Rewrite(ABC):
+    """
+    A node found by a rule and the node that replaces it.
+    """
+
+    @property
+    @abstractmethod
+    def node(self) -> ast.AST:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def updated_node(self) -> ast.AST:
+        raise NotImplementedError
+
+    @property
+    def deployment_name(self) -> Optional[str]:
+        """
+        The source of the name of the deployment the node creates, if any.
+        """
+        return None
+
+    @property
+    def additional_info(self) -> List[str]:
+        """
+        Actions the user should take after applying the rewrite.
+        """
+        return []
+
+    @property
+    def required_imports(self) -> List[ast.stmt]:
+        """
+        Import statements the updated node depends on.
+        """
+        return []
+
+    @property
+    def shape(self) -> Optional[str]:
+        """
+        A fingerprint of the structure of the rewrite, shared by rewrites that
+        differ only in literals such as names and parameters, so that they can
+        be reviewed as a group. `None` if the rewrite should not be grouped.
+        """
+        return None
+
+    def invalidate(self):
+        """
+        Clear any cached state so that the updated node is computed again.
+        """
+
+    def release(self):
+        """
+        Drop any cached objects that refer back to the rewrite; see
+        `RuleEngine.release`.
+        """
+
+
+class Rule(ABC):
+    """
+    A migration applied by a `RuleEngine`.
+
+    Rules declare the nodes they inspect: calls to the dotted names in
+    `callee_names`, e.g. `Deployment.build_from_flow`, and nodes of the types in
+    `node_types`. The engine only calls `visit` with matching nodes, so a rule
+    never has to inspect every node in a module. Every rule applied to a module
+    shares the engine's parsed tree, scopes, and imports.
+
+    Rules also declare `markers`, byte strings that must all appear in a file
+    for the rule to find anything in it, e.g. `build_from_flow`. Files without
+    the markers of any registered rule are skipped without being parsed; a rule
+    without markers is applied to every file.
+
+    Rules record the nodes they will replace as `rewrites`; the engine replaces
+    them once every rule has visited the module and any blocks they use have
+    been loaded.
+    """
+
+    name: ClassVar[str]
+    node_types: ClassVar[Tuple[Type[ast.AST], ...]] = ()
+    callee_names: ClassVar[Tuple[str, ...]] = ()
+    markers: ClassVar[Tuple[bytes, ...]] = ()
+
+    def __init__(self, engine: "RuleEngine"):
+        self._engine = engine
+
+    @property
+    def engine(self) -> "RuleEngine":
+        return self._engine
+
+    @abstractmethod
+    def visit(self, node: ast.AST, scope: Scope):
+        """
+        Inspect a node matching `node_types` or `callee_names`. `scope` is the
+        scope the node is in; assignments after the node are not indexed yet.
+        """
+        raise NotImplementedError
+
+    @property
+    def rewrites(self) -> List[Rewrite]:
+        return []
+
+    @property
+    def block_references(self) -> Set[BlockReference]:
+        """
+        The infrastructure blocks the rewrites depend on, so that the engine can
+        load the blocks used by every rule together.
+        """
+        return set()
+
+
+_RULES: Dict[str, Type[Rule]] = {}
+
+
+def register_rule(rule: Type[RuleT]) -> Type[RuleT]:
+    """
+    Register a rule so that it is applied by every `RuleEngine` created without
+    an explicit list of rules. Can be used as a class decorator.
+    """
+    if not rule.node_types and not rule.callee_names:
+        raise ValueError(
+            f"Rule {rule.name!r} must declare node types or callee names to visit."
+        )
+    if _RULES.get(rule.name, rule) is not rule:
+        raise ValueError(f"A rule named {rule.name!r} is already registered.")
+    _RULES[rule.name] = rule
+    return rule
+
+
+def registered_rules() -> List[Type[Rule]]:
+    # the built-in rules register themselves when their module is imported
+    import pmt.transformers  # noqa: F401
+
+    return list(_RULES.values())
+
+
+def candidate_markers(
+    rules: Optional[Iterable[Type[Rule]]] = None,
+) -> List[Tuple[bytes, ...]]:
+    """
+    The markers of each of `rules`, by default of every registered rule; see
+    `pmt.files.contains_candidate_markers`.
+    """
+    if rules is None:
+        rules = registered_rules()
+    return [rule.markers for rule in rules]
+
+
+def get_rule(name: str) -> Type[Rule]:
+    for rule in registered_rules():
+        if rule.name == name:
+            return rule
+    raise KeyError(f"No rule named {name!r} is registered.")
+
+
+def callee_name(node: ast.Call) -> Optional[str]:
+    """
+    The dotted name of the function called by `node`, e.g.
+    `Deployment.build_from_flow`, or `None` if it is not a simple name or
+    attribute chain.
+    """
+    return target_name(node.func)
+
+
+class RuleEngine(ast.NodeTransformer):
+    """
+    Applies many rules to a module in a single traversal.
+
+    While visiting the module, the engine indexes assignments by scope and
+    records imports for every rule to share, and dispatches each node to the
+    rules that declared its type or, for calls, its callee name.
+
+    `collect` discovers the nodes to rewrite without changing the tree, so that
+    blocks used by every rule can be loaded together before `rewrite` replaces
+    them. Visiting a module with `visit` does both.
+    """
+
+    def __init__(
+        self,
+        current_file: Path,
+        tree: ast.AST,
+        block_cache: Optional[BlockDocumentCache] = None,
+        rules: Optional[Iterable[Type[Rule]]] = None,
+    ):
+        self._current_file = current_file
+        self._tree = tree
+        self._found_imports: List[ast.stmt] = []
+        self._rewrite = True
+        self._module_scope = Scope(tree)
+        self._scope = self._module_scope
+        if block_cache is None:
+            block_cache = BlockDocumentCache()
+        self._block_cache = block_cache
+        if rules is None:
+            rules = registered_rules()
+        self._rules = [rule(self) for rule in rules]
+
+        self._rules_by_callee: Dict[str, List[Rule]] = {}
+        self._rules_by_type: Dict[Type[ast.AST], List[Rule]] = {}
+        for rule in self._rules:
+            for name in rule.callee_names:
+                self._rules_by_callee.setdefault(name, []).append(rule)
+            for node_type in rule.node_types:
+                self._rules_by_type.setdefault(node_type, []).append(rule)
+
+    @property
+    def current_file(self) -> Path:
+        return self._current_file
+
+    @property
+    def tree(self) -> ast.AST:
+        return self._tree
+
+    @property
+    def rules(self) -> List[Rule]:
+        return self._rules
+
+    def rule(self, rule: Type[RuleT]) -> RuleT:
+        """
+        The instance of `rule` applied by this engine.
+        """
+        for instance in self._rules:
+            if type(instance) is rule:
+                return instance
+        raise KeyError(f"Rule {rule.name!r} is not applied by this engine.")
+
+    @property
+    def rewrites(self) -> List[Rewrite]:
+        """
+        The rewrites found by every rule, in source order.
+        """
+        return sorted(
+            (rewrite for rule in self._rules for rewrite in rule.rewrites),
+            key=lambda rewrite: (
+                getattr(rewrite.node, "lineno", 0),
+                getattr(rewrite.node, "col_offset", 0),
+            ),
+        )
+
+    @property
+    def additional_info(self) -> List[str]:
+        return [
+            action for rewrite in self.rewrites for action in rewrite.additional_info
+        ]
+
+    @property
+    def required_imports(self):
+        return {
+            required_import
+            for rewrite in self.rewrites
+            for required_import in rewrite.required_imports
+        }
+
+    @property
+    def found_imports(self) -> List[ast.stmt]:
+        return self._found_imports
+
+    @property
+    def module_scope(self) -> Scope:
+        return self._module_scope
+
+    @property
+    def block_cache(self) -> BlockDocumentCache:
+        return self._block_cache
+
+    @cached_property
+    def imported_names(self) -> Dict[str, str]:
+        """
+        A mapping of the names bound by `from ... import` statements to the names
+        of the objects they import, e.g. `{"K8sJob": "KubernetesJob"}` for
+        `from prefect.infrastructure import KubernetesJob as K8sJob`.
+        """
+        return {
+            alias.asname or alias.name: alias.name
+            for found_import in self.found_imports
+            if isinstance(found_import, ast.ImportFrom)
+            for alias in found_import.names
+        }
+
+    @property
+    def block_references(self) -> Set[BlockReference]:
+        """
+        The references to all infrastructure blocks used by the rewrites that
+        can be determined without loading the blocks.
+        """
+        return {
+            reference for rule in self._rules for reference in rule.block_references
+        }
+
+    def collect(self, tree: ast.AST):
+        """
+        Visit `tree` with every rule without rewriting any nodes. Use `rewrite`
+        to apply the updates once any infrastructure blocks have been loaded.
+        """
+        self._rewrite = False
+        try:
+            self.visit(tree)
+        finally:
+            self._rewrite = True
+
+    def rewrite(self, tree: ast.AST) -> ast.AST:
+        """
+        Replace every node found by `collect` in `tree` with its updated node.
+        """
+        return _Rewriter(self.rewrites).visit(tree)
+
+    def release(self):
+        """
+        Break the reference cycles between the engine, its rules, and their
+        rewrites, so that the tree is freed as soon as the last reference to it
+        is dropped rather than when the garbage collector next runs. The engine
+        must not be used afterwards; rewrites already retrieved keep working.
+        """
+        for rewrite in self.rewrites:
+            rewrite.release()
+        self._rules = []
+        self._rules_by_callee = {}
+        self._rules_by_type = {}
+
+    def visit(self, node):
+        rules = self._rules_by_type.get(type(node))
+        if rules:
+            for rule in rules:
+                rule.visit(node, self._scope)
+        return super().visit(node)
+
+    def visit_Module(self, node):
+        # rewrite nodes only once the whole module has been visited so that
+        # every assignment is indexed before any infrastructure is resolved
+        rewrite = self._rewrite
+        self._rewrite = False
+        try:
+            self.generic_visit(node)
+        finally:
+            self._rewrite = rewrite
+        if rewrite:
+            return self.rewrite(node)
+        return node
+
+    def _visit_scope(self, node):
+        self._scope = Scope(node, parent=self._scope)
+        try:
+            return self.generic_visit(node)
+        finally:
+            self._scope = self._scope.parent
+
+    visit_FunctionDef = _visit_scope
+    visit_AsyncFunctionDef = _visit_scope
+    visit_ClassDef = _visit_scope
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            self._scope.add(target, node, node.value)
+        return self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self._scope.add(node.target, node, node.value)
+        return self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if self._rules_by_callee:
+            rules = self._rules_by_callee.get(callee_name(node))
+            if rules:
+                for rule in rules:
+                    rule.visit(node, self._scope)
+        return self.generic_visit(node)
+
+    def visit_Import(self, node):
+        self._found_imports.append(node)
+        return self.generic_visit(node)
+
+    def visit_ImportFrom(self, node):
+        self._found_imports.append(node)
+        return self.generic_visit(node)
+
+
+class _Rewriter(ast.NodeTransformer):
+    def __init__(self, rewrites: List[Rewrite]):
+        self._rewrites_by_node = {id(rewrite.node): rewrite for rewrite in rewrites}
+
+    def visit(self, node):
+        rewrite = self._rewrites_by_node.get(id(node))
+        if rewrite:
+            return ast.copy_location(rewrite.updated_node, node)
+        return super().visit(node)
@@ -0,0 +1,104 @@
+import hashlib
+import heapq
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Sequence
+
+from pmt.files import count_candidate_calls
+from pmt.formats import display_path
+from pmt.options import ShardBalance
+
+
+class Shard(NamedTuple):
+    """
+    One of `count` parts of a run, numbered from 1.
+    """
+
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """
+        Parse a shard written as `index/count`, e.g. `2/4`.
+        """
+        index, separator, count = value.partition("/")
+        try:
+            shard = cls(int(index), int(count))
+        except ValueError:
+            shard = None
+        if not separator or shard is None or not 1 <= shard.index <= shard.count:
+            raise ValueError(
+                f"Invalid shard {value!r}. Expected INDEX/COUNT, e.g. 1/4, where"
+                " INDEX is between 1 and COUNT."
+            )
+        return shard
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+def _stable_hash(path: Path) -> int:
+    # `hash` is salted per process, so it would differ between CI machines, and
+    # the path is hashed relative to the current directory so that a file is in
+    # the same shard whether it is passed as a relative or absolute path, and
+    # wherever the repository is checked out
+    key = display_path(path).encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "big")
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+_WEIGHTS: Dict[ShardBalance, Callable[[Path], int]] = {
+    ShardBalance.size: _file_size,
+    ShardBalance.calls: count_candidate_calls,
+}
+
+
+def partition(
+    paths: Sequence[Path], count: int, balance: ShardBalance = ShardBalance.none
+) -> List[List[Path]]:
+    """
+    Split `paths` into `count` shards. The result only depends on the paths
+    (and their contents when balancing), never on their order or the machine,
+    so every CI node computes the same partition.
+
+    By default, each file is assigned to a shard by a hash of its path, which
+    keeps a file in the same shard as other files are added or removed. With
+    `balance`, files are assigned, heaviest first, to the shard with the least
+    total weight so far, where the weight of a file is its size or the number
+    of `Deployment.build_from_flow` calls found by a scan of its contents.
+    """
+    shards: List[List[Path]] = [[] for _ in range(count)]
+    paths = sorted(set(paths))
+    if balance == ShardBalance.none:
+        for path in paths:
+            shards[_stable_hash(path) % count].append(path)
+        return shards
+
+    weight = _WEIGHTS[balance]
+    weighted_paths = sorted(
+        ((weight(path), path) for path in paths),
+        key=lambda item: (-item[0], display_path(item[1])),
+    )
+    # ties are broken by the number of files, so that files with no weight are
+    # spread evenly, and then by shard index
+    heap = [(0, 0, index) for index in range(count)]
+    for path_weight, path in weighted_paths:
+        total, files, index = heapq.heappop(heap)
+        shards[index].append(path)
+        heapq.heappush(heap, (total + path_weight, files + 1, index))
+    return [sorted(shard) for shard in shards]
+
+
+def select_shard(
+    paths: Sequence[Path], shard: Shard, balance: ShardBalance = ShardBalance.none
+) -> List[Path]:
+    """
+    The paths in `shard` when `paths` are split with `partition`.
+    """
+    return partition(paths, shard.count, balance)[shard.index - 1]
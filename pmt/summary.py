@@ -0,0 +1,133 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from pmt.migrate import FileMigration, Span
+
+
+class CallRecord:
+    """
+    What is kept of an upgraded call once its file has been reported: where it
+    is, the deployment it creates, and its additional info as bit flags into
+    the messages stored by its `RunSummary`.
+    """
+
+    __slots__ = ("path", "span", "deployment_name", "info_flags")
+
+    def __init__(
+        self,
+        path: Path,
+        span: Optional["Span"],
+        deployment_name: Optional[str],
+        info_flags: int,
+    ):
+        self.path = path
+        self.span = span
+        self.deployment_name = deployment_name
+        self.info_flags = info_flags
+
+    def __repr__(self):
+        return (
+            f"CallRecord(path={self.path!r}, span={self.span!r},"
+            f" deployment_name={self.deployment_name!r},"
+            f" info_flags={self.info_flags!r})"
+        )
+
+
+class FileRecord:
+    """
+    What is kept of an upgraded file once it has been reported.
+    """
+
+    __slots__ = ("path", "calls", "error", "cached")
+
+    def __init__(
+        self,
+        path: Path,
+        calls: List[CallRecord],
+        error: Optional[str] = None,
+        cached: bool = False,
+    ):
+        self.path = path
+        self.calls = calls
+        self.error = error
+        self.cached = cached
+
+    def __repr__(self):
+        return (
+            f"FileRecord(path={self.path!r}, calls={len(self.calls)},"
+            f" error={self.error!r}, cached={self.cached!r})"
+        )
+
+
+class RunSummary:
+    """
+    A compact record of every file in a run, for the summary printed once all
+    files have been upgraded.
+
+    Adding a migration keeps only its location, status, and a `CallRecord` per
+    call, so the code, trees, and rendered output of each file can be released
+    as soon as the file has been reported. Each distinct additional info
+    message is stored once and referenced from call records by bit flag.
+    """
+
+    def __init__(self):
+        self._files: List[FileRecord] = []
+        self._info_flags: Dict[str, int] = {}
+
+    def add(self, migration: "FileMigration") -> FileRecord:
+        # every call record shares the path of its file
+        path = migration.path
+        record = FileRecord(
+            path,
+            [
+                CallRecord(
+                    path,
+                    call.span,
+                    call.deployment_name,
+                    self._flags(call.additional_info),
+                )
+                for call in migration.calls
+            ],
+            error=migration.error,
+            cached=migration.cached,
+        )
+        self._files.append(record)
+        return record
+
+    def _flags(self, additional_info: List[str]) -> int:
+        flags = 0
+        for message in additional_info:
+            flag = self._info_flags.get(message)
+            if flag is None:
+                flag = self._info_flags[message] = 1 << len(self._info_flags)
+            flags |= flag
+        return flags
+
+    @property
+    def files(self) -> List[FileRecord]:
+        return self._files
+
+    @property
+    def calls(self) -> Iterator[CallRecord]:
+        for file in self._files:
+            yield from file.calls
+
+    @property
+    def has_errors(self) -> bool:
+        return any(file.error for file in self._files)
+
+    @property
+    def has_calls(self) -> bool:
+        return any(file.calls for file in self._files)
+
+    @property
+    def additional_info(self) -> List[str]:
+        """
+        Every additional info message for the calls in the run, in the order
+        they were first seen.
+        """
+        flags = 0
+        for call in self.calls:
+            flags |= call.info_flags
+        return [message for message, flag in self._info_flags.items() if flags & flag]
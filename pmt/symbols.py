@@ -0,0 +1,112 @@
+import ast
+from typing import Dict, List, NamedTuple, Optional, Union
+
+Target = Union[ast.Name, ast.Attribute, ast.Tuple, ast.List, ast.Starred]
+
+
+class Assignment(NamedTuple):
+    """
+    A value assigned to a name by an assignment statement.
+    """
+
+    statement: ast.stmt
+    value: Optional[ast.expr]
+
+
+def target_name(target: ast.AST) -> Optional[str]:
+    """
+    The dotted name of an assignment target or expression, e.g. `infra` or
+    `self.infra`, or `None` if it is not a simple name or attribute chain.
+    """
+    if isinstance(target, ast.Name):
+        return target.id
+    if isinstance(target, ast.Attribute):
+        value_name = target_name(target.value)
+        if value_name:
+            return f"{value_name}.{target.attr}"
+    return None
+
+
+class Scope:
+    """
+    A module, class, or function scope and the assignments made directly in it.
+    """
+
+    def __init__(self, node: ast.AST, parent: Optional["Scope"] = None):
+        self._node = node
+        self._parent = parent
+        self._assignments: Dict[str, List[Assignment]] = {}
+
+    @property
+    def node(self) -> ast.AST:
+        return self._node
+
+    @property
+    def parent(self) -> Optional["Scope"]:
+        return self._parent
+
+    @property
+    def is_class(self) -> bool:
+        return isinstance(self._node, ast.ClassDef)
+
+    def add(self, target: Target, statement: ast.stmt, value: Optional[ast.expr]):
+        """
+        Record the assignment of `value` to `target`. Tuple and list targets are
+        matched element-wise against tuple and list values; any name that cannot
+        be matched to a single value is recorded without one.
+        """
+        if isinstance(target, (ast.Tuple, ast.List)):
+            values = None
+            if isinstance(value, (ast.Tuple, ast.List)) and len(value.elts) == len(
+                target.elts
+            ):
+                values = value.elts
+            for i, element in enumerate(target.elts):
+                self.add(element, statement, values[i] if values else None)
+            return
+        if isinstance(target, ast.Starred):
+            self.add(target.value, statement, None)
+            return
+
+        name = target_name(target)
+        if not name:
+            return
+        scope = self
+        if "." in name and self.parent and self.parent.is_class:
+            # attributes like self.infra assigned in a method are visible to
+            # every method of the class
+            scope = self.parent
+        scope._assignments.setdefault(name, []).append(Assignment(statement, value))
+
+    def lookup(self, name: str, line: Optional[int] = None) -> Optional[Assignment]:
+        """
+        Find the assignment to `name` visible from this scope.
+
+        Within a scope, the last assignment before `line` is preferred, falling
+        back to the first assignment. Enclosing function and module scopes are
+        searched when the name is not assigned in this scope; enclosing class
+        scopes are skipped, matching Python's name resolution rules, except for
+        attributes like `self.infra`.
+        """
+        scope = self
+        while scope:
+            if scope is self or not scope.is_class or "." in name:
+                assignments = scope._assignments.get(name)
+                if assignments:
+                    return _closest_assignment(assignments, line)
+            scope = scope.parent
+        return None
+
+
+def _closest_assignment(
+    assignments: List[Assignment], line: Optional[int]
+) -> Assignment:
+    if line is not None:
+        preceding = [
+            assignment
+            for assignment in assignments
+            if assignment.statement.lineno <= line
+        ]
+        if preceding:
+            return preceding[-1]
+    return assignments[0]
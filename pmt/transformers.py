@@ -1,9 +1,18 @@
 import ast
+import hashlib
+import json
+from functools import cached_property
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, List, Optional, Set, Union
 
 import astor
 
+from pmt.blocks import BlockDocumentCache, BlockNotFoundError, BlockReference
+from pmt.evaluation import evaluate_block_document_data, serialize_block
+from pmt.profiling import count, phase
+from pmt.rules import Rewrite, Rule, RuleEngine, register_rule
+from pmt.symbols import Assignment, Scope, target_name
+
 INFRA_ADDITIONAL_INFO = (
     "When deploying flows with `flow.deploy`, work pools replace"
     " infrastructure blocks as the source of infrastructure"
@@ -32,6 +41,70 @@ NO_INFRA_ADDITIONAL_INFO = (
 )
 
 
+def _static_block_reference(
+    node: ast.AST, call: "BuildFromFlowCall", seen=None
+) -> Optional[BlockReference]:
+    """
+    Determine which block document an expression loads without evaluating it.
+
+    Recognizes block slugs like `"kubernetes-job/my-job"`,
+    `Block.load("kubernetes-job/my-job")`, `KubernetesJob.load("my-job")`, and
+    variables that are assigned one of those expressions. Returns `None` if the
+    block cannot be determined statically.
+    """
+    # using block slug like kubernetes-job/my-job
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return BlockReference.from_slug(node.value)
+
+    # using a variable like infra or self.infra
+    name = target_name(node)
+    if name:
+        seen = seen or set()
+        assignment = call.find_assignment(name)
+        if name in seen or assignment is None or assignment.value is None:
+            return None
+        return _static_block_reference(assignment.value, call, seen | {name})
+
+    # using a loaded block object like Block.load("kubernetes-job/my-job")
+    # or KubernetesJob.load("my-job")
+    if not (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "load"
+    ):
+        return None
+    name_node = node.args[0] if node.args else None
+    for keyword in node.keywords:
+        if keyword.arg == "name":
+            name_node = keyword.value
+    if not (isinstance(name_node, ast.Constant) and isinstance(name_node.value, str)):
+        return None
+
+    block_class = node.func.value
+    if isinstance(block_class, ast.Attribute):
+        class_name = block_class.attr
+    elif isinstance(block_class, ast.Name):
+        class_name = call.imported_names.get(block_class.id, block_class.id)
+    else:
+        return None
+    if class_name == "Block":
+        return BlockReference.from_slug(name_node.value)
+    return BlockReference.from_class_name(class_name, name_node.value)
+
+
+def _argument_kind(node: ast.AST) -> str:
+    """
+    A description of how a storage or infrastructure argument is provided that
+    does not depend on the block it refers to, e.g. `github` for the slug
+    `"github/my-repo"` or `KubernetesJob.load` for a call to load a block.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value.partition("/")[0]
+    if isinstance(node, ast.Call):
+        return target_name(node.func) or "call"
+    return type(node).__name__.lower()
+
+
 class StorageKwarg:
     def __init__(self, node: Union[ast.Call, ast.Constant, ast.Name]):
         self._node = node
@@ -76,33 +149,67 @@ class InfrastructureKwarg:
     def node(self):
         return self._node
 
-    @property
+    @cached_property
+    def block_reference(self) -> Optional[BlockReference]:
+        """
+        The normalized reference to the block document used for infrastructure,
+        if it can be determined statically from the source code.
+        """
+        return _static_block_reference(self.node, self._call)
+
+    @cached_property
     def block_document_data(self):
+        block_cache = self._call.block_cache
+        if self.block_reference is None:
+            if block_cache.offline:
+                raise BlockNotFoundError(
+                    "Unable to resolve infrastructure"
+                    f" `{astor.to_source(self.node).strip()}` from the block"
+                    " snapshot because the block it refers to could not be"
+                    " determined statically."
+                )
+            return self._load_block_document_data()
+        return block_cache.get_or_load(
+            self.block_reference, self._read_block_document_data
+        )
+
+    def _read_block_document_data(self):
+        data = self._call.block_cache.source.read(self.block_reference)
+        if data is None:
+            # the block type slug may not match the block class name, so fall
+            # back to evaluating the code that loads the block
+            return self._load_block_document_data()
+        return data
+
+    def _load_block_document_data(self):
+        with phase("evaluate_block"):
+            data = self._evaluate_block_document_data()
+        count("blocks_evaluated")
+        return data
+
+    def _evaluate_block_document_data(self):
         # using block slug like kubernetes-job/my-job
         if isinstance(self.node, ast.Constant):
             from prefect.blocks.core import Block
 
             block = Block.load(self.node.value)
-            return block.dict(exclude_unset=True, exclude_defaults=True)
+            return serialize_block(block)
         # using a loaded block object like Block.load("kubernetes-job/my-job")
         # or KubernetesJob.load("my-job") or a variable like infra
         elif isinstance(self.node, ast.Call) or isinstance(self.node, ast.Name):
-            for found_import in self._call.found_imports:
-                # import all found imports so that we can run the block load code
-                exec(astor.to_source(found_import))
-            # load the block
-            if isinstance(self.node, ast.Call):
-                block = eval(astor.to_source(self.node))
-            else:
-                for node in ast.walk(self._call._transformer._tree):
-                    if (
-                        isinstance(node, ast.Assign)
-                        and node.targets[0].id == self.node.id
-                    ):
-                        exec(astor.to_source(node))
-                        break
-                block = eval(astor.to_source(self.node))
-            return block.dict(exclude_unset=True, exclude_defaults=True)
+            # the found imports are executed once per file in a worker process so
+            # that user code cannot take down the upgrade
+            statements = [
+                astor.to_source(found_import)
+                for found_import in self._call.found_imports
+            ]
+            if isinstance(self.node, ast.Name):
+                assignment = self._call.find_assignment(self.node.id)
+                if assignment:
+                    statements.append(astor.to_source(assignment.statement))
+            return evaluate_block_document_data(
+                str(self._call.from_file), statements, astor.to_source(self.node)
+            )
         else:
             return {}
 
@@ -113,13 +220,28 @@ class InfrastructureKwarg:
             return None
         return image
 
+    def invalidate(self):
+        """
+        Clear the cached block document data, including any entry for this
+        block in the shared block cache, so that it is loaded again on the next
+        access.
+        """
+        self.__dict__.pop("block_document_data", None)
+        if self.block_reference is not None:
+            self._call.block_cache.invalidate(self.block_reference)
 
-class BuildFromFlowCall:
+
+class BuildFromFlowCall(Rewrite):
     def __init__(
-        self, node: ast.Call, from_file: Path, transformer: "BuildFromFlowTransformer"
+        self,
+        node: ast.Call,
+        from_file: Path,
+        engine: RuleEngine,
+        scope: Optional[Scope] = None,
     ):
         self._node = node
-        self._transformer = transformer
+        self._engine = engine
+        self._scope = scope or engine.module_scope
         self._kwargs = {
             kw.arg: kw.value
             for kw in node.keywords
@@ -173,7 +295,7 @@ class BuildFromFlowCall:
     def flow(self):
         return self._flow
 
-    @property
+    @cached_property
     def storage(self):
         if self._storage:
             return StorageKwarg(self._storage)
@@ -187,9 +309,27 @@ class BuildFromFlowCall:
 
     @property
     def found_imports(self):
-        return self._transformer.found_imports
+        return self._engine.found_imports
+
+    @property
+    def imported_names(self) -> Dict[str, str]:
+        return self._engine.imported_names
 
     @property
+    def block_cache(self) -> BlockDocumentCache:
+        return self._engine.block_cache
+
+    @property
+    def scope(self) -> Scope:
+        return self._scope
+
+    def find_assignment(self, name: str) -> Optional[Assignment]:
+        """
+        Find the assignment to `name` visible from this call.
+        """
+        return self._scope.lookup(name, line=getattr(self.node, "lineno", None))
+
+    @cached_property
     def infrastructure(self):
         if self._infrastructure:
             return InfrastructureKwarg(self._infrastructure, self)
@@ -216,7 +356,7 @@ class BuildFromFlowCall:
     def from_file(self):
         return self._file
 
-    @property
+    @cached_property
     def additional_info(self):
         additional_info = []
         if self.infrastructure:
@@ -229,6 +369,26 @@ class BuildFromFlowCall:
         return additional_info
 
     @property
+    def shape(self) -> str:
+        if self.infrastructure and self.infrastructure.block_reference:
+            infrastructure = self.infrastructure.block_reference.block_type_slug
+        elif self.infrastructure:
+            infrastructure = _argument_kind(self.infrastructure.node)
+        else:
+            infrastructure = None
+        structure = {
+            "kwargs": sorted(self._kwargs),
+            "storage": _argument_kind(self.storage.node) if self.storage else None,
+            "entrypoint": self._entrypoint is not None,
+            "path": self._path is not None,
+            "infrastructure": infrastructure,
+            "additional_info": self.additional_info,
+        }
+        return hashlib.sha256(
+            json.dumps(structure, sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+    @cached_property
     def updated_node(self):
         new_node = self.flow
         if self.storage:
@@ -266,10 +426,9 @@ class BuildFromFlowCall:
             )
         else:
             # Create a new AST node for 'flow.deploy' call
+            kwargs = self.kwargs
             if self.infrastructure.configured_image:
-                self._kwargs["image"] = ast.Constant(
-                    s=self.infrastructure.configured_image
-                )
+                kwargs["image"] = ast.Constant(s=self.infrastructure.configured_image)
             new_node = ast.Call(
                 func=ast.Attribute(
                     value=new_node,
@@ -277,64 +436,79 @@ class BuildFromFlowCall:
                     ctx=ast.Load(),
                 ),
                 args=[],
-                keywords=[ast.keyword(arg=k, value=v) for k, v in self.kwargs.items()],
+                keywords=[ast.keyword(arg=k, value=v) for k, v in kwargs.items()],
             )
         return new_node
 
+    def invalidate(self):
+        """
+        Clear the cached updated node, additional info, and block document data
+        for this call so that they are computed again on the next access.
+        """
+        if "infrastructure" in self.__dict__ and self.infrastructure:
+            self.infrastructure.invalidate()
+        for name in ("updated_node", "additional_info"):
+            self.__dict__.pop(name, None)
+
+    def release(self):
+        # the infrastructure argument refers back to the call
+        self.__dict__.pop("infrastructure", None)
 
-class BuildFromFlowTransformer(ast.NodeTransformer):
+
+@register_rule
+class BuildFromFlowRule(Rule):
     """
-    A node transformer that will discover and transform any calls to
-    `Deployment.build_from_flow` to `flow.deploy` or `flow.serve` depending on the
-    usage.
+    Upgrades calls to `Deployment.build_from_flow` to `flow.deploy` or
+    `flow.serve` depending on the usage.
     """
 
-    def __init__(self, current_file: Path, tree: ast.AST):
-        self._current_file = current_file
-        self._calls = []
-        self._found_imports = []
-        self._tree = tree
+    name = "build-from-flow"
+    callee_names = ("Deployment.build_from_flow",)
+    markers = (b"build_from_flow", b"Deployment")
 
-    @property
-    def current_file(self):
-        return self._current_file
+    def __init__(self, engine: RuleEngine):
+        super().__init__(engine)
+        self._calls: List[BuildFromFlowCall] = []
 
     @property
     def calls(self) -> List[BuildFromFlowCall]:
         return self._calls
 
     @property
-    def additional_info(self):
-        return [action for call in self.calls for action in call.additional_info]
+    def rewrites(self) -> List[BuildFromFlowCall]:
+        return self._calls
+
+    def visit(self, node: ast.Call, scope: Scope):
+        self._calls.append(
+            BuildFromFlowCall(node, self.engine.current_file, self.engine, scope=scope)
+        )
 
     @property
-    def required_imports(self):
+    def block_references(self) -> Set[BlockReference]:
         return {
-            require_import
-            for call in self.calls
-            for require_import in call.required_imports
+            call.infrastructure.block_reference
+            for call in self._calls
+            if call.infrastructure and call.infrastructure.block_reference
         }
 
+
+class BuildFromFlowTransformer(RuleEngine):
+    """
+    A node transformer that will discover and transform any calls to
+    `Deployment.build_from_flow` to `flow.deploy` or `flow.serve` depending on the
+    usage.
+    """
+
+    def __init__(
+        self,
+        current_file: Path,
+        tree: ast.AST,
+        block_cache: Optional[BlockDocumentCache] = None,
+    ):
+        super().__init__(
+            current_file, tree, block_cache=block_cache, rules=[BuildFromFlowRule]
+        )
+
     @property
-    def found_imports(self):
-        return self._found_imports
-
-    def visit_Call(self, node):
-        if (
-            isinstance(node.func, ast.Attribute)
-            and node.func.value.id == "Deployment"
-            and node.func.attr == "build_from_flow"
-        ):
-            build_from_flow_call = BuildFromFlowCall(node, self.current_file, self)
-            self._calls.append(build_from_flow_call)
-            return ast.copy_location(build_from_flow_call.updated_node, node)
-
-        return self.generic_visit(node)
-
-    def visit_Import(self, node):
-        self._found_imports.append(node)
-        return self.generic_visit(node)
-
-    def visit_ImportFrom(self, node):
-        self._found_imports.append(node)
-        return self.generic_visit(node)
+    def calls(self) -> List[BuildFromFlowCall]:
+        return self.rule(BuildFromFlowRule).calls
@@ -1,6 +1,136 @@
+import ast
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
 import astor
-import black
 
+from pmt.formatting import DEFAULT_LINE_LENGTH, default_formatter
+
+
+def convert_ast_node_to_source_code(node, line_length: Optional[int] = None):
+    return default_formatter().format(astor.to_source(node), line_length)
+
+
+def convert_ast_nodes_to_source_code(
+    nodes: Sequence[ast.AST], line_length: Optional[int] = None, format: bool = True
+) -> List[str]:
+    """
+    Render the source code of many nodes, formatting them together. If `format`
+    is `False`, the code is returned as rendered from the syntax tree, without
+    running black.
+    """
+    sources = [astor.to_source(node) for node in nodes]
+    if not format:
+        return [source.strip() + "\n" for source in sources]
+    return default_formatter().format_many(sources, line_length)
+
+
+def _line_offsets(source: bytes) -> List[int]:
+    offsets = [0]
+    for line in source.splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def _newline(source: bytes) -> str:
+    """
+    The line ending used by the first line of `source`, `\r\n` or `\n`.
+    """
+    end = source.find(b"\n")
+    return "\r\n" if end > 0 and source[end - 1 : end] == b"\r" else "\n"
+
+
+def _import_insertion_line(tree: ast.Module) -> int:
+    """
+    The line number before which new imports should be inserted: directly after
+    any module docstring and `from __future__` imports, or otherwise before the
+    first statement so that header comments stay at the top of the file.
+    """
+    insertion_line = None
+    for i, statement in enumerate(tree.body):
+        is_docstring = (
+            i == 0
+            and isinstance(statement, ast.Expr)
+            and isinstance(statement.value, ast.Constant)
+            and isinstance(statement.value.value, str)
+        )
+        is_future_import = (
+            isinstance(statement, ast.ImportFrom) and statement.module == "__future__"
+        )
+        if not is_docstring and not is_future_import:
+            return insertion_line or statement.lineno
+        insertion_line = statement.end_lineno + 1
+    return insertion_line or 1
+
+
+def patch_source(
+    source: bytes,
+    tree: ast.Module,
+    replacements: Iterable[Tuple[ast.AST, ast.AST]],
+    imports: Iterable[str] = (),
+) -> str:
+    """
+    Replace the spans of the given nodes in `source` with the formatted source of
+    their replacements and add any missing `imports`, leaving the rest of the
+    source untouched.
+
+    `tree` must be the module parsed from `source`, and the nodes being replaced
+    must still carry their original positions. Only the replacements are
+    formatted; each is formatted to fit from the column it starts at, and lines
+    after the first are indented like the line it starts on. Each of `imports`
+    is only added once. Added lines end with the line ending `source` uses.
+    """
+    line_offsets = _line_offsets(source)
+    newline = _newline(source)
+    replacements = sorted(
+        replacements,
+        key=lambda item: (item[0].lineno, item[0].col_offset),
+        reverse=True,
+    )
+
+    # replacements starting at the same column and indentation are formatted
+    # together; a call may start after other code on its line, e.g. in
+    # `deployment = Deployment.build_from_flow(...)`, so the first line of its
+    # replacement must fit from the call's column
+    keys = []
+    nodes_by_key: Dict[Tuple[bytes, int], List[ast.AST]] = {}
+    for node, replacement in replacements:
+        line = source[line_offsets[node.lineno - 1] : line_offsets[node.lineno]]
+        indent = line[: len(line) - len(line.lstrip(b" \t"))]
+        key = (indent, node.col_offset)
+        keys.append(key)
+        nodes_by_key.setdefault(key, []).append(replacement)
+    formatted_by_key = {
+        key: iter(
+            convert_ast_nodes_to_source_code(
+                nodes, line_length=max(DEFAULT_LINE_LENGTH - key[1], 1)
+            )
+        )
+        for key, nodes in nodes_by_key.items()
+    }
+
+    patched = source
+    for (node, _), (indent, _) in zip(replacements, keys):
+        start = line_offsets[node.lineno - 1] + node.col_offset
+        end = line_offsets[node.end_lineno - 1] + node.end_col_offset
+        code = next(formatted_by_key[indent, node.col_offset]).rstrip("\n")
+        lines = code.split("\n")
+        code = lines[0] + "".join(
+            newline + (indent.decode() + code_line if code_line else code_line)
+            for code_line in lines[1:]
+        )
+        patched = patched[:start] + code.encode() + patched[end:]
+
+    existing_lines = {line.strip() for line in source.decode().splitlines()}
+    missing_imports = [
+        required_import
+        for required_import in dict.fromkeys(imports)
+        if required_import not in existing_lines
+    ]
+    if missing_imports:
+        insertion_offset = line_offsets[
+            min(_import_insertion_line(tree), len(line_offsets)) - 1
+        ]
+        import_lines = "".join(line + newline for line in missing_imports).encode()
+        patched = patched[:insertion_offset] + import_lines + patched[insertion_offset:]
 
-def convert_ast_node_to_source_code(node):
-    return black.format_str(astor.to_source(node).strip(), mode=black.FileMode())
+    return patched.decode()
@@ -0,0 +1,208 @@
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pmt.files import EXCLUDED_DIRECTORIES, find_python_files
+
+DEFAULT_INTERVAL = 1.0
+
+# changes that arrive within this many seconds of each other are reported
+# together, so that an editor saving a file in several steps triggers one update
+DEBOUNCE = 0.05
+
+
+class PollingWatcher:
+    """
+    Watches files and directories for changes to Python files by comparing
+    their modification times every `interval` seconds.
+    """
+
+    def __init__(
+        self, paths: Iterable[Union[str, Path]], interval: float = DEFAULT_INTERVAL
+    ):
+        self._paths = list(paths)
+        self._interval = interval
+        self._stats = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        stats = {}
+        for path in find_python_files(self._paths):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        """
+        Block until a Python file is created, modified, or deleted, or until
+        `timeout` seconds have passed, and return the paths that changed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stats = self._scan()
+            changed = {
+                path
+                for path in set(stats) | set(self._stats)
+                if stats.get(path) != self._stats.get(path)
+            }
+            self._stats = stats
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            delay = self._interval
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Watches files and directories for changes to Python files with Linux's
+    inotify API, so changes are reported as soon as they happen without
+    scanning the watched directories.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+
+    MASK = (
+        IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+    )
+
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, paths: Iterable[Union[str, Path]]):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Unable to initialize inotify")
+        self._directories: Dict[int, Path] = {}
+        # files passed explicitly are watched through their directory
+        self._files: Set[Path] = set()
+        self._roots: List[Path] = []
+        for path in paths:
+            path = Path(path)
+            if path.is_dir():
+                self._roots.append(path)
+                self._watch_tree(path)
+            else:
+                self._files.add(path)
+                self._watch_directory(path.parent)
+
+    def _watch_directory(self, directory: Path):
+        import ctypes
+
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Unable to watch {directory}")
+        self._directories[wd] = directory
+
+    def _watch_tree(self, directory: Path):
+        self._watch_directory(directory)
+        for root, dirnames, _ in os.walk(directory):
+            dirnames[:] = [
+                dirname for dirname in dirnames if dirname not in EXCLUDED_DIRECTORIES
+            ]
+            for dirname in dirnames:
+                self._watch_directory(Path(root) / dirname)
+
+    def _is_watched(self, path: Path) -> bool:
+        if path in self._files:
+            return True
+        return path.suffix == ".py" and any(
+            root == path or root in path.parents for root in self._roots
+        )
+
+    def _read_events(self) -> Set[Path]:
+        changed = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            directory = self._directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & self.IN_ISDIR:
+                if (
+                    mask & (self.IN_CREATE | self.IN_MOVED_TO)
+                    and path.name not in EXCLUDED_DIRECTORIES
+                ):
+                    self._watch_tree(path)
+                    changed.update(find_python_files([path]))
+                continue
+            if self._is_watched(path):
+                changed.add(path)
+        return changed
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        """
+        Block until a Python file is created, modified, or deleted, or until
+        `timeout` seconds have passed, and return the paths that changed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed: Set[Path] = set()
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            if changed:
+                remaining = DEBOUNCE
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable:
+                changed.update(self._read_events())
+                continue
+            if changed or remaining is not None:
+                return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher(
+    paths: Iterable[Union[str, Path]],
+    polling: bool = False,
+    interval: float = DEFAULT_INTERVAL,
+):
+    """
+    Create a watcher for `paths`, using inotify where it is available and
+    falling back to polling every `interval` seconds otherwise.
+    """
+    paths = list(paths)
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths, interval=interval)
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Set
+
+from pmt.profiling import count
+
+DEFAULT_QUEUE_SIZE = 64
+
+# the maximum number of files written before the directories they are in are
+# synced
+BATCH_SIZE = 64
+
+_STOP = object()
+
+
+class WriteResult(NamedTuple):
+    """
+    The outcome of writing the updated source of a single file.
+    """
+
+    path: Path
+    original_sha256: Optional[str]
+    updated_sha256: str
+    backup_path: Optional[Path] = None
+    written: bool = False
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "path": str(self.path),
+            "original_sha256": self.original_sha256,
+            "updated_sha256": self.updated_sha256,
+            "backup_path": str(self.backup_path) if self.backup_path else None,
+            "written": self.written,
+            "error": self.error,
+        }
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _fsync_directory(directory: Path):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # directories cannot be opened on some platforms, e.g. Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class AtomicFileWriter:
+    """
+    Writes updated files from a background thread so that writing one file
+    overlaps with updating the next.
+
+    Each file is written to a temporary file in the same directory, synced, and
+    renamed over the original, so a file is never left partially written.
+    Directories are synced once per batch of writes rather than once per file.
+    `submit` blocks once `queue_size` files are waiting to be written so that
+    memory use stays bounded when files are updated faster than they can be
+    written.
+
+    If `backup_suffix` is set, the original contents of each file are kept next
+    to it with that suffix. With `dry_run`, nothing is written; the results
+    still describe the changes that would have been made. If `manifest` is set,
+    the results are written to it as JSON lines when the writer is closed.
+    """
+
+    def __init__(
+        self,
+        backup_suffix: Optional[str] = None,
+        dry_run: bool = False,
+        manifest: Optional[Path] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        fsync: bool = True,
+    ):
+        self._backup_suffix = backup_suffix
+        self._dry_run = dry_run
+        self._manifest = Path(manifest) if manifest else None
+        self._fsync = fsync
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._results: List[WriteResult] = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def results(self) -> List[WriteResult]:
+        return self._results
+
+    def submit(self, path: Path, source: str):
+        """
+        Queue `source` to be written to `path`.
+        """
+        self._queue.put((Path(path), source.encode()))
+
+    def close(self) -> List[WriteResult]:
+        """
+        Wait for every queued file to be written and return the results in the
+        order the files were submitted.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self._manifest:
+            self._manifest.write_text(
+                "".join(json.dumps(result.to_dict()) + "\n" for result in self._results)
+            )
+        return self._results
+
+    def __enter__(self) -> "AtomicFileWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        directories: Set[Path] = set()
+        written = 0
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            path, source = item
+            try:
+                result = self._write(path, source)
+            except Exception as exc:
+                # keep consuming the queue so that `submit` never blocks forever
+                result = WriteResult(
+                    path, None, _sha256(source), error=f"{type(exc).__name__}: {exc}"
+                )
+            self._results.append(result)
+            if result.written:
+                directories.add(path.parent)
+                written += 1
+            # sync directories once the queue is drained or a batch is full so
+            # that renames are durable without syncing after every file
+            if directories and (self._queue.empty() or written >= BATCH_SIZE):
+                self._sync_directories(directories)
+                directories.clear()
+                written = 0
+        self._sync_directories(directories)
+
+    def _sync_directories(self, directories: Set[Path]):
+        if not self._fsync:
+            return
+        for directory in directories:
+            _fsync_directory(directory)
+
+    def _write(self, path: Path, source: bytes) -> WriteResult:
+        updated_sha256 = _sha256(source)
+        try:
+            original = path.read_bytes()
+        except FileNotFoundError:
+            original = None
+        except OSError as exc:
+            return WriteResult(
+                path, None, updated_sha256, error=f"{type(exc).__name__}: {exc}"
+            )
+        original_sha256 = _sha256(original) if original is not None else None
+        if original_sha256 == updated_sha256 or self._dry_run:
+            return WriteResult(path, original_sha256, updated_sha256)
+
+        backup_path = None
+        try:
+            if self._backup_suffix and original is not None:
+                backup_path = path.with_name(path.name + self._backup_suffix)
+                shutil.copy2(path, backup_path)
+            self._replace(path, source, keep_mode=original is not None)
+        except OSError as exc:
+            return WriteResult(
+                path,
+                original_sha256,
+                updated_sha256,
+                backup_path=backup_path,
+                error=f"{type(exc).__name__}: {exc}",
+            )
+        count("bytes_written", len(source))
+        count("files_written")
+        return WriteResult(
+            path, original_sha256, updated_sha256, backup_path=backup_path, written=True
+        )
+
+    def _replace(self, path: Path, source: bytes, keep_mode: bool):
+        fd, temp_path = tempfile.mkstemp(
+            dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(source)
+                f.flush()
+                if self._fsync:
+                    os.fsync(f.fileno())
+            if keep_mode:
+                shutil.copymode(path, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
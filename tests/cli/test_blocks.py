@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+from pmt.cli.app import app
+from pmt.transformers import InfrastructureKwarg
+
+cli_runner = CliRunner()
+
+
+@pytest.mark.usefixtures("prefect_server")
+def test_snapshot(tmp_path, base_scripts_folder):
+    snapshot_path = tmp_path / "blocks.json"
+    result = cli_runner.invoke(
+        app,
+        ["blocks", "snapshot", str(base_scripts_folder), "-o", str(snapshot_path)],
+    )
+    assert result.exit_code == 0, result.stdout
+    snapshot = json.loads(snapshot_path.read_text())
+    assert snapshot["version"] == 1
+    assert snapshot["blocks"]["kubernetes-job/my-job"]["image"] == "my-image:latest"
+    assert "kubernetes-job/my-job-default-image" in snapshot["blocks"]
+
+
+@pytest.mark.usefixtures("prefect_server")
+@pytest.mark.parametrize(
+    "scripts_folder",
+    [
+        "infra_and_storage",
+        "infra_and_no_storage",
+        "infra_slug_and_storage_slug",
+    ],
+)
+def test_upgrade_build_from_flow_with_snapshot(
+    tmp_path, base_scripts_folder, scripts_folder, monkeypatch
+):
+    snapshot_path = tmp_path / "blocks.json"
+    cli_runner.invoke(
+        app,
+        ["blocks", "snapshot", str(base_scripts_folder), "-o", str(snapshot_path)],
+    )
+
+    monkeypatch.setattr(
+        "pmt.blocks.read_block_documents",
+        lambda *args, **kwargs: pytest.fail("blocks should not be read from the API"),
+    )
+    monkeypatch.setattr(
+        InfrastructureKwarg,
+        "_load_block_document_data",
+        lambda self: pytest.fail("blocks should not be loaded"),
+    )
+
+    folder = base_scripts_folder / scripts_folder
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(folder / "start.py"),
+            "-o",
+            str(tmp_path / "output.py"),
+            "--blocks-from",
+            str(snapshot_path),
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    assert (tmp_path / "output.py").read_text() == (folder / "expected.py").read_text()
+
+
+def test_upgrade_build_from_flow_with_snapshot_missing_block(
+    tmp_path, base_scripts_folder
+):
+    snapshot_path = tmp_path / "blocks.json"
+    snapshot_path.write_text(json.dumps({"version": 1, "blocks": {}}))
+
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder / "infra_and_no_storage" / "start.py"),
+            "--blocks-from",
+            str(snapshot_path),
+        ],
+    )
+    assert result.exit_code == 1
+    assert "BlockNotFoundError" in result.stdout
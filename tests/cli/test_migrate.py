@@ -1,3 +1,9 @@
+import json
+import shutil
+import subprocess
+import sys
+import threading
+
 import pytest
 
 from typer.testing import CliRunner
@@ -66,3 +72,507 @@ def test_upgrade_build_from_flow_with_output(
     output_code = (tmp_path / "output.py").read_text()
     expected_code = (folder / "expected.py").read_text()
     assert output_code == expected_code
+
+
+def test_upgrade_build_from_flow_directory(base_scripts_folder):
+    result = cli_runner.invoke(
+        app, ["upgrade", "build-from-flow", str(base_scripts_folder)]
+    )
+    assert result.exit_code == 0, result.stdout
+    stdout = result.stdout.replace("\n", "")
+    for scripts_folder in ["infra_and_storage", "no_infra_no_storage"]:
+        start_path = base_scripts_folder / scripts_folder / "start.py"
+        assert (
+            f"Refer to the output below to see how to update your code in {start_path}"
+            in stdout
+        )
+    assert "Summary" in result.stdout
+
+
+def test_upgrade_build_from_flow_glob_with_jobs(base_scripts_folder):
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder / "no_infra_*" / "start.py"),
+            "--jobs",
+            "2",
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    stdout = result.stdout.replace("\n", "")
+    first = stdout.index(str(base_scripts_folder / "no_infra_no_storage" / "start.py"))
+    second = stdout.index(str(base_scripts_folder / "no_infra_storage" / "start.py"))
+    assert first < second
+
+
+def test_upgrade_build_from_flow_output_requires_single_file(
+    tmp_path, base_scripts_folder
+):
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder),
+            "-o",
+            str(tmp_path / "output.py"),
+        ],
+    )
+    assert result.exit_code != 0
+    assert not (tmp_path / "output.py").exists()
+
+
+def test_upgrade_build_from_flow_with_patch(tmp_path, base_scripts_folder):
+    start_path = base_scripts_folder / "infra_slug_and_storage_slug" / "start.py"
+    output_path = tmp_path / "output.py"
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(start_path),
+            "-o",
+            str(output_path),
+            "--patch",
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    start_code = start_path.read_text()
+    output_code = output_path.read_text()
+    call_start = start_code.index("    Deployment.build_from_flow(")
+    assert output_code.startswith(
+        "from prefect.blocks.core import Block\n" + start_code[:call_start]
+    )
+    assert "Deployment.build_from_flow" not in output_code
+    assert ".deploy(" in output_code
+
+
+def test_upgrade_build_from_flow_with_profile(tmp_path, base_scripts_folder):
+    trace_path = tmp_path / "trace.json"
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder / "infra_and_storage" / "start.py"),
+            str(base_scripts_folder / "no_infra_no_storage" / "start.py"),
+            "--jobs",
+            "2",
+            "--profile",
+            "--trace-json",
+            str(trace_path),
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    assert "Profile" in result.stdout
+    assert "black_format_calls" in result.stdout
+
+    trace = json.loads(trace_path.read_text())
+    event_names = {event["name"] for event in trace["traceEvents"]}
+    assert {"discover", "migrate_file", "parse", "format"} <= event_names
+    assert trace["otherData"]["counters"]["files_parsed"] == 2
+
+
+def test_upgrade_build_from_flow_jsonl(base_scripts_folder):
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder / "infra_and_storage" / "start.py"),
+            str(base_scripts_folder / "no_infra_no_storage" / "start.py"),
+            "--format",
+            "jsonl",
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record["path"] for record in records] == [
+        "tests/scripts/infra_and_storage/start.py",
+        "tests/scripts/no_infra_no_storage/start.py",
+    ]
+    assert records[0]["updated_code"].startswith("flow.from_source(")
+    assert records[0]["span"]["start_line"] > 1
+    assert records[1]["updated_code"].startswith("friendly_flow.serve(")
+
+
+def test_upgrade_build_from_flow_grouped(tmp_path, base_scripts_folder):
+    source = (base_scripts_folder / "no_infra_no_storage" / "start.py").read_text()
+    for name in ["a", "b", "c"]:
+        (tmp_path / f"{name}.py").write_text(source.replace("my-deployment", name))
+
+    result = cli_runner.invoke(
+        app, ["upgrade", "build-from-flow", str(tmp_path), "--group"]
+    )
+    assert result.exit_code == 0, result.stdout
+    assert "Found 3 call(s) with 1 distinct shape(s)" in result.stdout
+    assert result.stdout.count("Updated Code") == 1
+    for name in ["a", "b", "c"]:
+        assert f"{name}.py:" in result.stdout
+
+
+def test_upgrade_build_from_flow_grouped_requires_markdown(base_scripts_folder):
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder),
+            "--group",
+            "--format",
+            "jsonl",
+        ],
+    )
+    assert result.exit_code == 2
+    assert "--group can only be used" in result.stdout
+
+
+def test_upgrade_build_from_flow_jsonl_without_formatting(base_scripts_folder):
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder / "infra_and_storage" / "start.py"),
+            "--format",
+            "jsonl",
+            "--no-format-calls",
+            "--profile",
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    (record,) = [
+        json.loads(line) for line in result.stdout.splitlines() if line.startswith("{")
+    ]
+    assert record["updated_code"].startswith("flow.from_source(")
+    assert "Profile" in result.stdout
+    assert "black_format_calls" not in result.stdout
+
+
+def test_upgrade_build_from_flow_diff(tmp_path, monkeypatch, base_scripts_folder):
+    folder = base_scripts_folder / "no_infra_storage"
+    (tmp_path / "script.py").write_text((folder / "start.py").read_text())
+    monkeypatch.chdir(tmp_path)
+
+    result = cli_runner.invoke(
+        app, ["upgrade", "build-from-flow", "script.py", "--format", "diff"]
+    )
+    assert result.exit_code == 0, result.stdout
+    assert result.stdout.startswith("--- a/script.py\n+++ b/script.py\n@@ ")
+    assert "-    Deployment.build_from_flow(\n" in result.stdout
+    assert "+    flow.from_source(\n" in result.stdout
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+def test_upgrade_build_from_flow_diff_applies_with_unusual_characters(
+    tmp_path, monkeypatch, base_scripts_folder
+):
+    folder = base_scripts_folder / "no_infra_storage"
+    # a form feed and a line separator that `str.splitlines` would split on
+    source = (
+        (folder / "start.py")
+        .read_text()
+        .replace(
+            'if __name__ == "__main__":\n',
+            'if __name__ == "__main__":\n    # a \x0c form feed and \u2028 separator\n',
+        )
+    )
+    (tmp_path / "script.py").write_text(source)
+    monkeypatch.chdir(tmp_path)
+
+    result = cli_runner.invoke(
+        app, ["upgrade", "build-from-flow", "script.py", "--format", "diff"]
+    )
+    assert result.exit_code == 0, result.stdout
+    (tmp_path / "script.diff").write_text(result.stdout)
+
+    subprocess.run(["git", "apply", "script.diff"], cwd=tmp_path, check=True)
+    assert "flow.from_source(" in (tmp_path / "script.py").read_text()
+
+
+def test_upgrade_build_from_flow_sarif(base_scripts_folder):
+    start_path = base_scripts_folder / "infra_and_storage" / "start.py"
+    result = cli_runner.invoke(
+        app,
+        ["upgrade", "build-from-flow", str(start_path), "--format", "sarif"],
+    )
+    assert result.exit_code == 0, result.stdout
+    sarif = json.loads(result.stdout)
+    (run,) = sarif["runs"]
+    (sarif_result,) = run["results"]
+    region = sarif_result["locations"][0]["physicalLocation"]["region"]
+    start_line = start_path.read_text().splitlines()[region["startLine"] - 1]
+    assert start_line[region["startColumn"] - 1 :] == "Deployment.build_from_flow("
+    assert run["invocations"][0]["executionSuccessful"]
+
+
+def test_upgrade_build_from_flow_format_requires_stdout(tmp_path, base_scripts_folder):
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder / "infra_and_storage" / "start.py"),
+            "--format",
+            "jsonl",
+            "--output",
+            str(tmp_path / "output.py"),
+        ],
+    )
+    assert result.exit_code == 2
+    assert "--format can only be used" in result.stdout
+
+
+def test_upgrade_build_from_flow_in_place(tmp_path, base_scripts_folder):
+    scripts_folders = ["infra_and_storage", "no_infra_no_storage"]
+    for scripts_folder in scripts_folders:
+        (tmp_path / f"{scripts_folder}.py").write_text(
+            (base_scripts_folder / scripts_folder / "start.py").read_text()
+        )
+
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(tmp_path),
+            "--in-place",
+            "--backup-suffix",
+            ".bak",
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    assert "Updated 2 file(s) in place." in result.stdout
+    for scripts_folder in scripts_folders:
+        folder = base_scripts_folder / scripts_folder
+        assert (tmp_path / f"{scripts_folder}.py").read_text() == (
+            folder / "expected.py"
+        ).read_text()
+        assert (tmp_path / f"{scripts_folder}.py.bak").read_text() == (
+            folder / "start.py"
+        ).read_text()
+
+
+def test_upgrade_build_from_flow_in_place_dry_run(tmp_path, base_scripts_folder):
+    start_code = (base_scripts_folder / "infra_and_storage" / "start.py").read_text()
+    script_path = tmp_path / "script.py"
+    script_path.write_text(start_code)
+    manifest_path = tmp_path / "manifest.jsonl"
+
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(script_path),
+            "--in-place",
+            "--dry-run",
+            "--manifest",
+            str(manifest_path),
+        ],
+    )
+    assert result.exit_code == 0, result.stdout
+    assert "1 file(s) would be updated." in result.stdout
+    assert script_path.read_text() == start_code
+    (record,) = [json.loads(line) for line in manifest_path.read_text().splitlines()]
+    assert record["path"] == str(script_path)
+    assert not record["written"]
+
+
+def test_upgrade_build_from_flow_dry_run_requires_in_place(base_scripts_folder):
+    result = cli_runner.invoke(
+        app,
+        [
+            "upgrade",
+            "build-from-flow",
+            str(base_scripts_folder / "infra_and_storage" / "start.py"),
+            "--dry-run",
+        ],
+    )
+    assert result.exit_code == 2
+    assert "--dry-run can only be used with --in-place" in result.stdout
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+def test_upgrade_build_from_flow_since(tmp_path, monkeypatch, base_scripts_folder):
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=pmt", "-c", "user.email=pmt@example.com", *args],
+            cwd=tmp_path,
+            check=True,
+            capture_output=True,
+        )
+
+    start_code = (base_scripts_folder / "no_infra_no_storage" / "start.py").read_text()
+    (tmp_path / "committed.py").write_text(start_code)
+    git("init", "-q", "-b", "main")
+    git("add", ".")
+    git("commit", "-q", "-m", "initial")
+    (tmp_path / "changed.py").write_text(start_code)
+    monkeypatch.chdir(tmp_path)
+
+    result = cli_runner.invoke(
+        app, ["upgrade", "build-from-flow", "--since", "main", "--format", "jsonl"]
+    )
+    assert result.exit_code == 0, result.stdout
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record["path"] for record in records] == ["changed.py"]
+
+    git("add", ".")
+    git("commit", "-q", "-m", "change")
+    result = cli_runner.invoke(app, ["upgrade", "build-from-flow", "--staged"])
+    assert result.exit_code == 0, result.stdout
+    assert "No changed Python files found" in result.stdout
+
+    (tmp_path / "changed.py").write_text(start_code + "# staged\n")
+    git("add", ".")
+    (tmp_path / "changed.py").write_text(start_code + "# staged\n# unstaged\n")
+    result = cli_runner.invoke(app, ["upgrade", "build-from-flow", "--staged"])
+    assert result.exit_code == 0, result.stdout
+    assert "1 staged file(s) also have unstaged" in result.stdout
+
+
+def test_upgrade_build_from_flow_requires_files():
+    result = cli_runner.invoke(app, ["upgrade", "build-from-flow"])
+    assert result.exit_code == 2
+    assert "Provide at least one file" in result.stdout
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires Unix domain sockets")
+def test_upgrade_build_from_flow_daemon(tmp_path, monkeypatch, base_scripts_folder):
+    from pmt.daemon import DaemonServer, MigrationService
+
+    socket_path = tmp_path / "pmt.sock"
+    monkeypatch.setenv("PMT_DAEMON_SOCKET", str(socket_path))
+    start_path = base_scripts_folder / "infra_and_storage" / "start.py"
+    args = ["upgrade", "build-from-flow", str(start_path), "--daemon"]
+
+    result = cli_runner.invoke(app, args)
+    assert result.exit_code == 1
+    assert "pmt daemon start" in result.stdout
+
+    server = DaemonServer(socket_path, MigrationService())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        result = cli_runner.invoke(app, args)
+        assert result.exit_code == 0, result.stdout
+        assert "Updated Code" in result.stdout
+
+        result = cli_runner.invoke(app, ["daemon", "status"])
+        assert result.exit_code == 0, result.stdout
+        assert "misses" in result.stdout
+
+        result = cli_runner.invoke(app, ["daemon", "stop"])
+        assert result.exit_code == 0, result.stdout
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires Unix domain sockets")
+def test_upgrade_build_from_flow_daemon_failure(
+    tmp_path, monkeypatch, base_scripts_folder
+):
+    from pmt.daemon import DaemonServer, MigrationService
+
+    socket_path = tmp_path / "pmt.sock"
+    monkeypatch.setenv("PMT_DAEMON_SOCKET", str(socket_path))
+    service = MigrationService()
+
+    def migrate(*args, **kwargs):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(service, "migrate", migrate)
+    server = DaemonServer(socket_path, service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        result = cli_runner.invoke(
+            app,
+            [
+                "upgrade",
+                "build-from-flow",
+                str(base_scripts_folder / "infra_and_storage" / "start.py"),
+                str(base_scripts_folder / "no_infra_storage" / "start.py"),
+                "--daemon",
+            ],
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    assert result.exit_code == 1
+    assert "out of memory" in result.stdout
+    assert "No calls" not in result.stdout
+
+
+@pytest.mark.parametrize(
+    "option", [["--jobs", "2"], ["--blocks-from", "blocks.json"], ["--profile"]]
+)
+def test_upgrade_build_from_flow_daemon_rejects_in_process_options(
+    tmp_path, monkeypatch, base_scripts_folder, option
+):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "blocks.json").write_text("{}")
+    start_path = base_scripts_folder / "infra_and_storage" / "start.py"
+
+    result = cli_runner.invoke(
+        app, ["upgrade", "build-from-flow", str(start_path), "--daemon", *option]
+    )
+
+    assert result.exit_code == 2
+    assert f"'{option[0]}'" in result.stdout
+    assert "cannot be used with" in result.stdout
+
+
+@pytest.mark.parametrize("envvar", ["PMT_CACHE_DIR", "PMT_BLOCK_CACHE_DIR"])
+def test_upgrade_build_from_flow_daemon_rejects_options_from_environment(
+    tmp_path, monkeypatch, base_scripts_folder, envvar
+):
+    monkeypatch.setenv(envvar, str(tmp_path / "cache"))
+    start_path = base_scripts_folder / "infra_and_storage" / "start.py"
+
+    result = cli_runner.invoke(
+        app, ["upgrade", "build-from-flow", str(start_path), "--daemon"]
+    )
+
+    assert result.exit_code == 2
+    assert envvar in result.stdout
+    assert "cannot" in result.stdout
+
+
+def test_upgrade_build_from_flow_shards(base_scripts_folder):
+    paths = set()
+    for shard in ("1/3", "2/3", "3/3"):
+        result = cli_runner.invoke(
+            app,
+            [
+                "upgrade",
+                "build-from-flow",
+                str(base_scripts_folder / "*" / "start.py"),
+                "--shard",
+                shard,
+                "--format",
+                "jsonl",
+            ],
+        )
+        assert result.exit_code == 0, result.stdout
+        shard_paths = {json.loads(line)["path"] for line in result.stdout.splitlines()}
+        assert not paths & shard_paths
+        paths |= shard_paths
+    assert len(paths) == 6
+
+
+def test_upgrade_build_from_flow_invalid_shard(base_scripts_folder):
+    result = cli_runner.invoke(
+        app,
+        ["upgrade", "build-from-flow", str(base_scripts_folder), "--shard", "4/3"],
+    )
+    assert result.exit_code == 2
+    assert "Invalid shard" in result.stdout
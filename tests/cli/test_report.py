@@ -0,0 +1,49 @@
+import json
+
+from typer.testing import CliRunner
+
+from pmt.cli.app import app
+
+cli_runner = CliRunner()
+
+
+def test_merge_shards(tmp_path, base_scripts_folder):
+    reports = []
+    for shard in ("1/2", "2/2"):
+        result = cli_runner.invoke(
+            app,
+            [
+                "upgrade",
+                "build-from-flow",
+                str(base_scripts_folder / "*" / "start.py"),
+                "--shard",
+                shard,
+                "--shard-balance",
+                "calls",
+                "--format",
+                "jsonl",
+            ],
+        )
+        assert result.exit_code == 0, result.stdout
+        report = tmp_path / f"shard-{shard[0]}.jsonl"
+        report.write_text(result.stdout)
+        reports.append(str(report))
+
+    output = tmp_path / "report.json"
+    result = cli_runner.invoke(app, ["report", "merge", *reports, "-o", str(output)])
+
+    assert result.exit_code == 0, result.stdout
+    report = json.loads(output.read_text())
+    assert report["summary"] == {"files": 6, "calls": 6, "errors": 0}
+    assert sum(info["calls"] for info in report["additional_info"]) >= 6
+    assert "Merged 2 report(s) with 6 call(s)" in result.stdout
+
+
+def test_merge_invalid_report(tmp_path):
+    report = tmp_path / "shard-1.jsonl"
+    report.write_text("not json\n")
+
+    result = cli_runner.invoke(app, ["report", "merge", str(report)])
+
+    assert result.exit_code == 2
+    assert "shard-1.jsonl:1" in result.stdout
@@ -1,14 +1,68 @@
 from pathlib import Path
 import pytest
-from prefect.testing.utilities import prefect_test_harness
 
+from pmt.blocks import InMemoryBlockSource, use_block_source
+
+# the data the Prefect API returns for the blocks saved by `prefect_server`
+BLOCK_DOCUMENTS = {
+    "kubernetes-job/my-job": {
+        "type": "kubernetes-job",
+        "image": "my-image:latest",
+        "namespace": "default",
+    },
+    "kubernetes-job/my-job-default-image": {
+        "type": "kubernetes-job",
+        "image": "prefecthq/prefect:2.16.5-python3.11",
+        "namespace": "default",
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def block_source():
+    """
+    Serve blocks from memory so that tests do not need a Prefect server and can
+    run in parallel.
+    """
+    with use_block_source(InMemoryBlockSource(BLOCK_DOCUMENTS)) as source:
+        yield source
+
+
+@pytest.fixture(autouse=True)
+def formatter():
+    """
+    Start every test without any memoized formatted code.
+    """
+    from pmt.formatting import default_formatter
+
+    formatter = default_formatter()
+    formatter.clear()
+    yield formatter
+
+
+@pytest.fixture(scope="session")
+def prefect_server():
+    """
+    A Prefect server with the blocks in `BLOCK_DOCUMENTS` saved, for the tests
+    that exercise the Prefect API itself.
+    """
+    from prefect.infrastructure import KubernetesJob
+    from prefect.testing.utilities import prefect_test_harness
 
-@pytest.fixture(scope="session", autouse=True)
-def prefect_db():
     with prefect_test_harness():
+        KubernetesJob(image="my-image:latest").save("my-job")
+        KubernetesJob().save("my-job-default-image")
         yield
 
 
+@pytest.fixture
+def prefect_block_source(prefect_server):
+    from pmt.blocks import PrefectBlockSource, use_block_source
+
+    with use_block_source(PrefectBlockSource()) as source:
+        yield source
+
+
 @pytest.fixture
 def base_scripts_folder():
     return Path(__file__).parent / "scripts"
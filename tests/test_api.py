@@ -0,0 +1,161 @@
+import ast
+import shutil
+
+import pytest
+
+import pmt
+from pmt.blocks import DEFAULT_CONCURRENCY, BlockSource
+
+
+def test_migrate_source(base_scripts_folder):
+    folder = base_scripts_folder / "no_infra_storage"
+    source = (folder / "start.py").read_text()
+
+    migration = pmt.migrate_source(source, render_source=True)
+
+    assert migration.error is None
+    assert migration.updated_source == (folder / "expected.py").read_text()
+    (call,) = migration.calls
+    assert "my-deployment" in call.deployment_name
+    assert call.additional_info == migration.additional_info
+    assert migration.required_imports == []
+
+
+def test_migrate_source_span(base_scripts_folder):
+    source = (base_scripts_folder / "infra_and_storage" / "start.py").read_text()
+
+    (call,) = pmt.migrate_source(source, path="flows.py").calls
+
+    lines = source.splitlines()
+    assert lines[call.span.start_line - 1][call.span.start_column :].startswith(
+        "Deployment.build_from_flow("
+    )
+    assert lines[call.span.end_line - 1][: call.span.end_column].strip() == ")"
+
+
+def test_migrate_source_without_calls():
+    migration = pmt.migrate_source("print('hello')\n", render_source=True)
+
+    assert migration.calls == []
+    assert migration.updated_source is None
+    assert migration.error is None
+
+
+def test_migrate_source_reports_errors():
+    migration = pmt.migrate_source("Deployment.build_from_flow(\n")
+
+    assert migration.error.startswith("SyntaxError")
+
+
+def test_migrate_files_shares_block_cache(base_scripts_folder):
+    paths = pmt.find_python_files([str(base_scripts_folder / "*" / "start.py")])
+    block_cache = pmt.BlockDocumentCache()
+
+    migrations = list(pmt.migrate_files(map(str, paths), block_cache=block_cache))
+
+    assert [migration.path for migration in migrations] == paths
+    assert all(migration.calls for migration in migrations)
+    assert pmt.BlockReference.from_slug("kubernetes-job/my-job") in block_cache
+
+
+def test_span_round_trips_through_dict(base_scripts_folder):
+    source = (base_scripts_folder / "infra_and_storage" / "start.py").read_text()
+    migration = pmt.migrate_source(source)
+
+    restored = pmt.FileMigration.from_dict(migration.to_dict())
+
+    assert restored.calls[0].span == migration.calls[0].span
+    assert isinstance(restored.calls[0].span, pmt.Span)
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError, match="no_such_attribute"):
+        pmt.no_such_attribute
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_migrate_files_accepts_repeated_paths(base_scripts_folder, tmp_path, jobs):
+    plain = tmp_path / "plain.py"
+    plain.write_text("print('no deployments here')\n")
+    start = base_scripts_folder / "infra_and_storage" / "start.py"
+
+    migrations = list(pmt.migrate_files([plain, start, plain, start], jobs=jobs))
+
+    assert [migration.path for migration in migrations] == [
+        plain,
+        start,
+        plain,
+        start,
+    ]
+    assert [bool(migration.calls) for migration in migrations] == [
+        False,
+        True,
+        False,
+        True,
+    ]
+
+
+def test_migrate_files_parses_each_file_once(
+    base_scripts_folder, tmp_path, monkeypatch
+):
+    batches = []
+    parsed = []
+    parse = ast.parse
+
+    def counting_parse(source, *args, **kwargs):
+        parsed.append(source)
+        return parse(source, *args, **kwargs)
+
+    monkeypatch.setattr(ast, "parse", counting_parse)
+
+    class OnlineSource(pmt.InMemoryBlockSource):
+        offline = False
+
+        def read_many(self, references, concurrency=DEFAULT_CONCURRENCY):
+            batches.append(set(references))
+            return super().read_many(references, concurrency)
+
+    source = OnlineSource(
+        {
+            "kubernetes-job/my-job": {"type": "kubernetes-job", "image": "a"},
+            "kubernetes-job/my-job-default-image": {"type": "kubernetes-job"},
+        }
+    )
+    paths = []
+    for name in ["infra_and_no_storage", "infra_slug_and_storage_slug"]:
+        path = tmp_path / f"{name}.py"
+        shutil.copy(base_scripts_folder / name / "start.py", path)
+        paths.append(path)
+
+    migrations = list(
+        pmt.migrate_files(paths, block_cache=pmt.BlockDocumentCache(source=source))
+    )
+
+    assert all(migration.calls for migration in migrations)
+    assert len(parsed) == len(paths)
+    # the blocks referenced by both files are loaded together
+    assert batches == [
+        {
+            pmt.BlockReference.from_slug("kubernetes-job/my-job"),
+            pmt.BlockReference.from_slug("kubernetes-job/my-job-default-image"),
+        }
+    ]
+
+
+def test_migrate_files_reports_block_source_errors_per_file(
+    base_scripts_folder, tmp_path
+):
+    class FailingSource(BlockSource):
+        def read_many(self, references, concurrency=DEFAULT_CONCURRENCY):
+            raise RuntimeError("the Prefect API is unavailable")
+
+    plain = tmp_path / "plain.py"
+    plain.write_text("print('no deployments here')\n")
+    paths = [base_scripts_folder / "infra_and_no_storage" / "start.py", plain]
+    block_cache = pmt.BlockDocumentCache(source=FailingSource())
+
+    migrations = list(pmt.migrate_files(paths, block_cache=block_cache))
+
+    assert [migration.path for migration in migrations] == paths
+    assert "the Prefect API is unavailable" in migrations[0].error
+    assert migrations[1].error is None
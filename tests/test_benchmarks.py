@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.corpus import generate_corpus, generate_module
+from benchmarks.run import PHASES, run_benchmark
+from pmt.blocks import BlockDocumentCache
+from pmt.migrate import migrate_files
+
+
+@pytest.mark.parametrize("infra_style", ["slug", "variable", "load", "none", "mixed"])
+def test_generated_corpus_migrates_offline(tmp_path, infra_style):
+    corpus = generate_corpus(
+        tmp_path, files=3, calls_per_file=4, infra_style=infra_style, helpers=2
+    )
+
+    migrations = list(
+        migrate_files(
+            corpus.paths,
+            render_source=True,
+            block_cache=BlockDocumentCache(source=corpus.snapshot),
+        )
+    )
+
+    assert [migration.error for migration in migrations] == [None] * 3
+    assert sum(len(migration.calls) for migration in migrations) == corpus.calls
+    updated_source = migrations[0].updated_source
+    assert "build_from_flow" not in updated_source
+    if infra_style in ("slug", "variable", "load"):
+        assert 'image="registry.example.com/flows:0"' in updated_source
+
+
+def test_generate_module_rejects_unknown_style():
+    with pytest.raises(ValueError, match="Unknown infrastructure style"):
+        generate_module(0, infra_style="unknown")
+
+
+def test_run_benchmark(tmp_path):
+    corpus = generate_corpus(tmp_path, files=2, calls_per_file=2, helpers=1)
+
+    phases = run_benchmark(corpus, repeats=2)
+
+    assert set(phases) == set(PHASES)
+    for phase in PHASES:
+        assert len(phases[phase]["runs"]) == 2
+        assert phases[phase]["min"] <= phases[phase]["median"]
@@ -0,0 +1,253 @@
+import ast
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from pmt.blocks import (
+    BlockDocumentCache,
+    BlockNotFoundError,
+    BlockReference,
+    BlockSnapshot,
+    InMemoryBlockSource,
+    PrefectBlockSource,
+    prefetch_block_documents,
+    read_block_documents,
+    use_block_source,
+)
+from pmt.transformers import (
+    IMAGE_ADDITIONAL_INFO,
+    INFRA_ADDITIONAL_INFO,
+    BuildFromFlowTransformer,
+    InfrastructureKwarg,
+)
+from pmt.utils import convert_ast_node_to_source_code
+
+
+class TestBlockReference:
+    @pytest.mark.parametrize(
+        "class_name,expected_slug",
+        [
+            ("KubernetesJob", "kubernetes-job"),
+            ("Process", "process"),
+            ("ECSTask", "ecs-task"),
+            ("VertexAICustomTrainingJob", "vertex-ai-custom-training-job"),
+        ],
+    )
+    def test_from_class_name(self, class_name, expected_slug):
+        reference = BlockReference.from_class_name(class_name, "my-job")
+        assert reference == BlockReference.from_slug(f"{expected_slug}/my-job")
+
+    def test_from_invalid_slug(self):
+        with pytest.raises(ValueError, match="Invalid block slug"):
+            BlockReference.from_slug("my-job")
+
+
+class TestBlockDocumentCache:
+    @pytest.fixture(autouse=True)
+    def block_source(self):
+        # the cache only reads from an online source through `load`
+        with use_block_source(PrefectBlockSource()) as source:
+            yield source
+
+    def test_persists_entries(self, tmp_path):
+        reference = BlockReference.from_slug("kubernetes-job/my-job")
+        BlockDocumentCache(path=tmp_path).set(reference, {"image": "my-image"})
+
+        cache = BlockDocumentCache(path=tmp_path)
+        assert cache.get(reference) == {"image": "my-image"}
+        assert cache.hits == 1
+
+    def test_expires_entries(self, tmp_path):
+        reference = BlockReference.from_slug("kubernetes-job/my-job")
+        BlockDocumentCache(path=tmp_path).set(reference, {"image": "my-image"})
+
+        cache = BlockDocumentCache(path=tmp_path, ttl=0)
+        assert cache.get(reference) is None
+        assert cache.misses == 1
+        assert not list(tmp_path.glob("*.json"))
+
+    def test_evicts_oldest_entries(self, tmp_path):
+        cache = BlockDocumentCache(path=tmp_path, max_entries=10)
+        references = [
+            BlockReference.from_slug(f"kubernetes-job/my-job-{i}") for i in range(11)
+        ]
+        for i, reference in enumerate(references[:10]):
+            cache.set(reference, {"image": f"my-image-{i}"})
+            entry_path = cache._entry_path(reference)
+            os.utime(entry_path, (i, i))
+        assert len(list(tmp_path.glob("*.json"))) == 10
+
+        # a batch of entries is evicted once the directory is over the limit
+        cache.set(references[10], {"image": "my-image-10"})
+        assert len(list(tmp_path.glob("*.json"))) == 9
+        cache = BlockDocumentCache(path=tmp_path, max_entries=10)
+        assert cache.get(references[0]) is None
+        assert cache.get(references[1]) is None
+        assert cache.get(references[10]) == {"image": "my-image-10"}
+
+    def test_counts_entries_once(self, tmp_path, monkeypatch):
+        cache = BlockDocumentCache(path=tmp_path, max_entries=100)
+        listings = []
+        glob = Path.glob
+        monkeypatch.setattr(
+            Path,
+            "glob",
+            lambda self, pattern: listings.append(pattern) or glob(self, pattern),
+        )
+
+        for i in range(20):
+            reference = BlockReference.from_slug(f"kubernetes-job/my-job-{i}")
+            cache.set(reference, {"image": f"my-image-{i}"})
+
+        assert listings == ["*.json"]
+
+    def test_evicts_entries_removed_by_another_process(self, tmp_path, monkeypatch):
+        cache = BlockDocumentCache(path=tmp_path, max_entries=1)
+        first = BlockReference.from_slug("kubernetes-job/my-job-0")
+        cache.set(first, {"image": "my-image-0"})
+        stat = Path.stat
+
+        def racing_stat(self, *args, **kwargs):
+            if self == cache._entry_path(first):
+                # removed between listing the directory and reading its mtime
+                self.unlink()
+                raise FileNotFoundError(self)
+            return stat(self, *args, **kwargs)
+
+        monkeypatch.setattr(Path, "stat", racing_stat)
+        second = BlockReference.from_slug("kubernetes-job/my-job-1")
+        cache.set(second, {"image": "my-image-1"})
+
+        assert cache.get(second) == {"image": "my-image-1"}
+
+    def test_get_or_load(self):
+        cache = BlockDocumentCache()
+        reference = BlockReference.from_slug("kubernetes-job/my-job")
+        loads = []
+
+        def load():
+            loads.append(reference)
+            return {"image": "my-image"}
+
+        assert cache.get_or_load(reference, load) == {"image": "my-image"}
+        assert cache.get_or_load(reference, load) == {"image": "my-image"}
+        assert loads == [reference]
+
+
+def test_block_cache_is_shared_across_transformers(base_scripts_folder):
+    block_cache = BlockDocumentCache()
+    for scripts_folder in ["infra_and_storage", "infra_slug_and_storage_slug"]:
+        start_code = (base_scripts_folder / scripts_folder / "start.py").read_text()
+        tree = ast.parse(start_code)
+        transformer = BuildFromFlowTransformer(
+            current_file=Path(__file__), tree=tree, block_cache=block_cache
+        )
+        transformer.visit(tree)
+
+    assert block_cache.misses == 1
+    assert block_cache.hits == 1
+    reference = BlockReference.from_slug("kubernetes-job/my-job-default-image")
+    assert block_cache.get(reference)["image"].startswith("prefecthq/prefect")
+
+
+@pytest.mark.usefixtures("prefect_block_source")
+def test_prefetch_block_documents():
+    block_cache = BlockDocumentCache()
+    references = [
+        BlockReference.from_slug("kubernetes-job/my-job"),
+        BlockReference.from_slug("kubernetes-job/my-job-default-image"),
+        BlockReference.from_slug("kubernetes-job/does-not-exist"),
+    ]
+
+    prefetch_block_documents(references, block_cache)
+
+    assert block_cache.get(references[0])["image"] == "my-image:latest"
+    assert references[1] in block_cache
+    assert references[2] not in block_cache
+
+
+@pytest.mark.usefixtures("prefect_server")
+def test_read_block_documents_omits_missing_names():
+    references = [
+        BlockReference.from_slug("kubernetes-job/my-job"),
+        BlockReference.from_slug("kubernetes-job/does-not-exist"),
+        BlockReference.from_slug("no-such-block-type/my-job"),
+    ]
+
+    block_documents = asyncio.run(read_block_documents(references))
+
+    assert list(block_documents) == [references[0]]
+
+
+def test_collect_defers_block_loading(base_scripts_folder, monkeypatch):
+    start_code = (base_scripts_folder / "infra_and_no_storage" / "start.py").read_text()
+    tree = ast.parse(start_code)
+    transformer = BuildFromFlowTransformer(current_file=Path(__file__), tree=tree)
+    transformer.collect(tree)
+    assert transformer.block_references == {
+        BlockReference.from_slug("kubernetes-job/my-job")
+    }
+
+    prefetch_block_documents(transformer.block_references, transformer.block_cache)
+    monkeypatch.setattr(
+        InfrastructureKwarg,
+        "_load_block_document_data",
+        lambda self: pytest.fail("block should be loaded from the cache"),
+    )
+    tree = transformer.rewrite(tree)
+    assert "Deployment.build_from_flow" not in convert_ast_node_to_source_code(tree)
+    assert transformer.additional_info == [
+        INFRA_ADDITIONAL_INFO,
+        IMAGE_ADDITIONAL_INFO,
+    ]
+
+
+class TestInMemoryBlockSource:
+    def test_resolves_blocks_without_prefect_api(self, base_scripts_folder):
+        source = InMemoryBlockSource(
+            {"kubernetes-job/my-job": {"image": "in-memory-image:latest"}}
+        )
+        block_cache = BlockDocumentCache(source=source)
+        start_code = (
+            base_scripts_folder / "infra_and_no_storage" / "start.py"
+        ).read_text()
+        tree = ast.parse(start_code)
+        transformer = BuildFromFlowTransformer(
+            current_file=Path(__file__), tree=tree, block_cache=block_cache
+        )
+        transformer.visit(tree)
+
+        (call,) = transformer.calls
+        assert call.infrastructure.configured_image == "in-memory-image:latest"
+        assert block_cache.offline
+
+    def test_missing_block(self):
+        block_cache = BlockDocumentCache(source=InMemoryBlockSource({}))
+        reference = BlockReference.from_slug("kubernetes-job/my-job")
+
+        with pytest.raises(BlockNotFoundError):
+            block_cache.get_or_load(reference, lambda: pytest.fail("not offline"))
+
+    @pytest.mark.parametrize("versioned", [True, False])
+    def test_from_file(self, tmp_path, versioned):
+        blocks = {"kubernetes-job/my-job": {"image": "my-image:latest"}}
+        path = tmp_path / "blocks.json"
+        if versioned:
+            BlockSnapshot(blocks).dump(path)
+        else:
+            path.write_text(json.dumps(blocks))
+
+        source = InMemoryBlockSource.from_file(path)
+
+        reference = BlockReference.from_slug("kubernetes-job/my-job")
+        assert source.read(reference) == {"image": "my-image:latest"}
+        assert source.digest == BlockSnapshot(blocks).digest
+
+    def test_use_block_source(self):
+        source = InMemoryBlockSource({})
+        with use_block_source(source):
+            assert BlockDocumentCache().source is source
+        assert BlockDocumentCache().source is not source
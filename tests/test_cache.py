@@ -0,0 +1,89 @@
+import shutil
+import time
+
+import pytest
+
+from pmt.cache import MigrationCache
+from pmt.migrate import FileMigration, migrate_files
+
+
+def test_migrate_files_reuses_cached_results(
+    tmp_path, base_scripts_folder, monkeypatch
+):
+    script_path = tmp_path / "start.py"
+    shutil.copy(base_scripts_folder / "no_infra_storage" / "start.py", script_path)
+    migration_cache = MigrationCache(tmp_path / "cache")
+
+    (migration,) = migrate_files(
+        [script_path], render_source=True, migration_cache=migration_cache
+    )
+    assert not migration.cached
+    assert migration_cache.misses == 1
+
+    monkeypatch.setattr(
+        "pmt.migrate._Migrator.transform_source",
+        lambda *args: pytest.fail("unchanged files should not be transformed"),
+    )
+    (cached_migration,) = migrate_files(
+        [script_path], render_source=True, migration_cache=migration_cache
+    )
+    assert cached_migration.cached
+    assert cached_migration.calls == migration.calls
+    assert cached_migration.updated_source == migration.updated_source
+    assert migration_cache.hits == 1
+
+
+def test_cache_key_changes_with_contents_and_blocks(tmp_path):
+    script_path = tmp_path / "start.py"
+    migration_cache = MigrationCache(tmp_path / "cache")
+    key = migration_cache.key(script_path, b"print('hello')")
+
+    assert key == migration_cache.key(script_path, b"print('hello')")
+    assert key != migration_cache.key(script_path, b"print('goodbye')")
+    assert key != MigrationCache(tmp_path / "cache", blocks_digest="abc").key(
+        script_path, b"print('hello')"
+    )
+
+
+def test_results_without_source_are_not_used_when_rendering(tmp_path):
+    migration_cache = MigrationCache(tmp_path / "cache")
+    migration_cache.set(
+        "key",
+        FileMigration.from_dict(
+            {
+                "path": "start.py",
+                "calls": [
+                    {
+                        "deployment_name": "'my-deployment'",
+                        "original_code": "",
+                        "updated_code": "",
+                        "additional_info": [],
+                    }
+                ],
+            }
+        ),
+    )
+
+    assert migration_cache.get("key") is not None
+    assert migration_cache.get("key", render_source=True) is None
+
+
+def test_prune(tmp_path):
+    migration_cache = MigrationCache(tmp_path / "cache", max_size=0)
+    migration_cache.set("key", FileMigration.from_dict({"path": "a.py", "calls": []}))
+    assert migration_cache.get("key") is not None
+
+    migration_cache.prune()
+    assert migration_cache.get("key") is None
+
+
+def test_results_expire_after_ttl(tmp_path, monkeypatch):
+    migration_cache = MigrationCache(tmp_path / "cache", ttl=60)
+    migration_cache.set("key", FileMigration.from_dict({"path": "a.py", "calls": []}))
+    assert migration_cache.get("key") is not None
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert migration_cache.get("key") is None
+    # results cached against a block snapshot never expire
+    assert MigrationCache(tmp_path / "cache").get("key") is not None
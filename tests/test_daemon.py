@@ -0,0 +1,164 @@
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from pmt.daemon import DaemonError, DaemonServer, MigrationService, shutdown, status
+from pmt.daemon import upgrade as upgrade_in_daemon
+from pmt.daemon import watch
+from pmt.migrate import migrate_file
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="requires Unix domain sockets"
+)
+
+
+@pytest.fixture
+def flows(tmp_path, base_scripts_folder):
+    path = tmp_path / "flows.py"
+    shutil.copy(base_scripts_folder / "infra_and_storage" / "start.py", path)
+    return path
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = DaemonServer(tmp_path / "pmt.sock", MigrationService())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_service_reuses_results_for_unchanged_files(flows):
+    service = MigrationService()
+
+    (migration,) = service.migrate([flows])
+    (cached_migration,) = service.migrate([flows])
+
+    assert migration.calls
+    assert not migration.cached
+    assert cached_migration.cached
+    assert cached_migration.calls == migration.calls
+    assert service.hits == 1
+    assert service.misses == 1
+
+
+def test_service_migrates_changed_files_again(flows, base_scripts_folder):
+    service = MigrationService()
+    service.migrate([flows])
+
+    shutil.copy(base_scripts_folder / "no_infra_no_storage" / "start.py", flows)
+    (migration,) = service.migrate([flows])
+
+    assert not migration.cached
+    assert migration.calls[0].updated_code.startswith("friendly_flow.serve(")
+
+
+def test_service_keeps_results_per_options(flows):
+    service = MigrationService()
+    service.migrate([flows])
+
+    (migration,) = service.migrate([flows], render_source=True)
+
+    assert not migration.cached
+    assert migration.updated_source
+
+
+def test_service_refresh(flows):
+    service = MigrationService()
+
+    service.refresh([flows])
+    (migration,) = service.migrate([flows])
+    assert migration.cached
+
+    flows.unlink()
+    service.refresh([flows])
+    assert service.status()["files"] == 0
+
+
+def test_watch_migrates_files_when_started(flows):
+    service = MigrationService()
+    stop = threading.Event()
+    stop.set()
+
+    watch(service, [flows.parent], polling=True, stop=stop)
+
+    (migration,) = service.migrate([flows])
+    assert migration.cached
+
+
+def test_upgrade_in_daemon(server, flows, monkeypatch):
+    monkeypatch.chdir(flows.parent)
+
+    (migration,) = upgrade_in_daemon(server.socket_path, ["flows.py"])
+    (cached_migration,) = upgrade_in_daemon(server.socket_path, ["flows.py"])
+
+    assert str(migration.path) == "flows.py"
+    assert migration.calls[0].updated_code.startswith("flow.from_source(")
+    assert cached_migration.cached
+    assert status(server.socket_path)["hits"] == 1
+
+
+def test_upgrade_in_daemon_uses_paths_as_given(server, tmp_path, monkeypatch):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "st.py").write_text(
+        "from prefect.deployments import Deployment\n"
+        'Deployment.build_from_flow(f, name="d", storage="github/my-repo")\n'
+    )
+    monkeypatch.chdir(tmp_path)
+
+    (migration,) = upgrade_in_daemon(server.socket_path, [Path("d/st.py")])
+
+    # entrypoints are built from the path as given, as in the requesting process
+    assert migration.calls == migrate_file("d/st.py").calls
+    assert 'entrypoint="d/st.py:f"' in migration.calls[0].updated_code
+
+
+def test_upgrade_in_daemon_reports_failures(server, flows, monkeypatch):
+    def migrate(*args, **kwargs):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(server.service, "migrate", migrate)
+
+    with pytest.raises(DaemonError, match="RuntimeError: out of memory"):
+        list(upgrade_in_daemon(server.socket_path, [flows, flows]))
+
+
+def test_upgrade_in_daemon_requires_a_result_per_path(server, flows, monkeypatch):
+    monkeypatch.setattr(server.service, "migrate", lambda paths, **kwargs: [])
+
+    with pytest.raises(DaemonError, match="fewer results"):
+        list(upgrade_in_daemon(server.socket_path, [flows]))
+
+
+def test_server_refuses_to_replace_running_daemon(server):
+    with pytest.raises(DaemonError, match="already listening"):
+        DaemonServer(server.socket_path, MigrationService())
+
+
+def test_server_replaces_stale_socket(tmp_path):
+    socket_path = tmp_path / "pmt.sock"
+    DaemonServer(socket_path, MigrationService()).socket.close()
+
+    server = DaemonServer(socket_path, MigrationService())
+    server.server_close()
+
+    assert not socket_path.exists()
+
+
+def test_shutdown(tmp_path):
+    server = DaemonServer(tmp_path / "pmt.sock", MigrationService())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    shutdown(server.socket_path)
+    thread.join(timeout=5)
+    server.server_close()
+
+    assert not thread.is_alive()
+    with pytest.raises(DaemonError, match="Unable to connect"):
+        status(server.socket_path)
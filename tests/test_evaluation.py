@@ -0,0 +1,149 @@
+import os
+import sys
+
+import pytest
+
+from pmt.evaluation import EvaluationError, EvaluationPool, EvaluationTimeout
+from pmt.profiling import Profiler
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="requires fork to share test modules"
+)
+
+FAKE_BLOCKS = """
+import json
+import os
+import time
+
+LOADS = []
+
+
+class FakeBlock:
+    def __init__(self, name):
+        self.name = name
+
+    @classmethod
+    def load(cls, name):
+        LOADS.append(name)
+        return cls(name)
+
+    def json(self, **kwargs):
+        return json.dumps(
+            {"name": self.name, "loads": len(LOADS), "pid": os.getpid()}
+        )
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+"""
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    (tmp_path / "fake_blocks.py").write_text(FAKE_BLOCKS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    with EvaluationPool(timeout=5) as pool:
+        yield pool
+
+
+def test_evaluate_in_worker(pool):
+    data = pool.evaluate(
+        "flows.py",
+        ["from fake_blocks import FakeBlock\n"],
+        'FakeBlock.load("my-job")',
+    )
+
+    assert data["name"] == "my-job"
+    assert data["pid"] != os.getpid()
+
+
+def test_namespace_is_kept_per_file(pool):
+    statements = [
+        "from fake_blocks import FakeBlock\n",
+        'infra = FakeBlock.load("a")\n',
+    ]
+
+    assert pool.evaluate("flows.py", statements, "infra")["loads"] == 1
+    # the import already ran in this file's namespace, the assignment runs again
+    assert pool.evaluate("flows.py", statements[1:], "infra")["loads"] == 2
+    assert pool.evaluate("other.py", statements, "infra")["loads"] == 3
+
+    # assignments do not leak into the file's namespace
+    with pytest.raises(EvaluationError, match="NameError"):
+        pool.evaluate("flows.py", [], "infra")
+    with pytest.raises(EvaluationError, match="NameError"):
+        pool.evaluate("new.py", [], "infra")
+
+
+def test_repeated_assignments_are_executed_again(pool):
+    import_ = "from fake_blocks import FakeBlock\n"
+    names = []
+    for name in ["img-a", "img-b", "img-a"]:
+        data = pool.evaluate(
+            "flows.py", [import_, f'infra = FakeBlock("{name}")\n'], "infra"
+        )
+        names.append(data["name"])
+
+    assert names == ["img-a", "img-b", "img-a"]
+
+
+def test_evaluation_errors(pool):
+    with pytest.raises(EvaluationError, match="ModuleNotFoundError"):
+        pool.evaluate("flows.py", ["import missing_module\n"], "missing_module")
+
+
+def test_evaluation_timeout(tmp_path, monkeypatch):
+    (tmp_path / "fake_blocks.py").write_text(FAKE_BLOCKS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    with EvaluationPool(timeout=0.5) as pool:
+        with pytest.raises(EvaluationTimeout):
+            pool.evaluate("flows.py", ["import fake_blocks\n"], "fake_blocks.sleep(5)")
+
+        # the stuck worker is replaced
+        data = pool.evaluate(
+            "flows.py", ["import fake_blocks\n"], 'fake_blocks.FakeBlock("a")'
+        )
+        assert data["name"] == "a"
+
+
+def test_worker_crash(pool):
+    with pytest.raises(EvaluationError, match="exited unexpectedly"):
+        pool.evaluate("flows.py", ["import os\n", "os._exit(1)\n"], "None")
+
+    data = pool.evaluate(
+        "flows.py", ["import fake_blocks\n"], 'fake_blocks.FakeBlock("a")'
+    )
+    assert data["name"] == "a"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="requires RLIMIT_AS")
+def test_memory_limit():
+    with EvaluationPool(memory_limit=4 * 1024 * 1024 * 1024) as pool:
+        with pytest.raises(EvaluationError, match="MemoryError"):
+            pool.evaluate("flows.py", ["data = bytearray(8 * 1024 ** 3)\n"], "data")
+
+
+def test_least_recently_used_namespaces_are_dropped(tmp_path, monkeypatch):
+    (tmp_path / "fake_blocks.py").write_text(FAKE_BLOCKS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr("pmt.evaluation.MAX_NAMESPACES", 2)
+    import_ = ["from fake_blocks import FakeBlock\n"]
+    with EvaluationPool(timeout=5) as pool:
+        for namespace in ["a.py", "b.py", "a.py", "c.py"]:
+            pool.evaluate(namespace, import_, "FakeBlock('x')")
+
+        # b.py was used least recently, so its import must run again
+        pool.evaluate("a.py", [], "FakeBlock('x')")
+        pool.evaluate("c.py", [], "FakeBlock('x')")
+        with pytest.raises(EvaluationError, match="NameError"):
+            pool.evaluate("b.py", [], "FakeBlock('x')")
+
+
+def test_only_executed_imports_are_counted(pool):
+    statements = ["from fake_blocks import FakeBlock\n", "import json\n"]
+
+    with Profiler().activate() as profiler:
+        for name in ["a", "b", "c"]:
+            pool.evaluate("flows.py", statements, f"FakeBlock('{name}')")
+
+    assert profiler.counters["imports_executed"] == 2
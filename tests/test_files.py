@@ -0,0 +1,104 @@
+import pytest
+
+from pmt.files import (
+    filter_candidates,
+    find_python_files,
+    is_candidate,
+    select_python_files,
+)
+from pmt.migrate import migrate_files
+
+
+def test_find_python_files_expands_directories_and_globs(tmp_path):
+    (tmp_path / "flows").mkdir()
+    (tmp_path / "flows" / "b.py").write_text("")
+    (tmp_path / "flows" / "a.py").write_text("")
+    (tmp_path / "flows" / "notes.txt").write_text("")
+    (tmp_path / ".venv").mkdir()
+    (tmp_path / ".venv" / "site.py").write_text("")
+    (tmp_path / "deploy.py").write_text("")
+
+    assert find_python_files([tmp_path]) == [
+        tmp_path / "deploy.py",
+        tmp_path / "flows" / "a.py",
+        tmp_path / "flows" / "b.py",
+    ]
+    assert find_python_files([str(tmp_path / "flows" / "*.py")]) == [
+        tmp_path / "flows" / "a.py",
+        tmp_path / "flows" / "b.py",
+    ]
+
+
+def test_find_python_files_deduplicates(tmp_path):
+    (tmp_path / "deploy.py").write_text("")
+
+    assert find_python_files([tmp_path, tmp_path / "deploy.py"]) == [
+        tmp_path / "deploy.py"
+    ]
+
+
+def test_select_python_files(tmp_path):
+    (tmp_path / "flows").mkdir()
+    (tmp_path / "flows" / "a.py").write_text("")
+    (tmp_path / "flows" / "notes.txt").write_text("")
+    (tmp_path / ".venv").mkdir()
+    (tmp_path / ".venv" / "site.py").write_text("")
+    (tmp_path / "deploy.py").write_text("")
+    candidates = [
+        tmp_path / "flows" / "a.py",
+        tmp_path / "flows" / "notes.txt",
+        tmp_path / "flows" / "deleted.py",
+        tmp_path / ".venv" / "site.py",
+        tmp_path / "deploy.py",
+    ]
+
+    assert select_python_files(candidates, [tmp_path]) == [
+        tmp_path / "deploy.py",
+        tmp_path / "flows" / "a.py",
+    ]
+    assert select_python_files(candidates, [tmp_path / "flows"]) == [
+        tmp_path / "flows" / "a.py"
+    ]
+    assert select_python_files(candidates, [tmp_path / "deploy.py"]) == [
+        tmp_path / "deploy.py"
+    ]
+    assert select_python_files(candidates, [str(tmp_path / "flows" / "*.py")]) == [
+        tmp_path / "flows" / "a.py"
+    ]
+
+
+@pytest.mark.parametrize(
+    "source,expected",
+    [
+        ("Deployment.build_from_flow(my_flow, name='my-deployment')", True),
+        ("from prefect.deployments import Deployment", False),
+        ("my_flow.deploy(name='my-deployment')", False),
+    ],
+)
+def test_is_candidate(tmp_path, source, expected):
+    path = tmp_path / "deploy.py"
+    path.write_text(source)
+    assert is_candidate(path) is expected
+
+
+def test_is_candidate_finds_markers_across_chunks(tmp_path):
+    path = tmp_path / "deploy.py"
+    path.write_text("x" * 10 + "Deployment.build_from_flow()")
+    assert is_candidate(path, chunk_size=16)
+    assert is_candidate(path, chunk_size=3)
+
+
+def test_filter_candidates_skips_files_without_markers(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"deploy_{i}.py"
+        path.write_text("Deployment.build_from_flow(" if i != 1 else "invalid(")
+        paths.append(path)
+
+    assert filter_candidates(paths) == [paths[0], paths[2]]
+    migrations = list(migrate_files(paths))
+    assert [migration.error is None for migration in migrations] == [
+        False,
+        True,
+        False,
+    ]
@@ -0,0 +1,78 @@
+import ast
+
+import astor
+
+from pmt.formatting import Formatter
+from pmt.migrate import migrate_source
+from pmt.profiling import Profiler
+
+CALLS = [
+    "Deployment.build_from_flow(flow=my_flow, name='a', work_queue_name='default')",
+    "Deployment.build_from_flow(flow=my_flow, name='b', parameters={'x': 1, 'y': 2})",
+    (
+        "Deployment.build_from_flow(flow=my_flow, name='c', infrastructure=infra,"
+        " storage=storage, path='flows', entrypoint='flows/my_flow.py:my_flow',"
+        " apply=True)"
+    ),
+]
+
+
+class TestFormatter:
+    def test_memoizes_formatted_code(self):
+        formatter = Formatter()
+        profiler = Profiler()
+        with profiler.activate():
+            first = formatter.format(CALLS[0])
+            second = formatter.format(CALLS[0] + "\n")
+
+        assert first == second
+        assert (formatter.hits, formatter.misses) == (1, 1)
+        assert profiler.counters["black_format_calls"] == 1
+
+    def test_memoizes_by_line_length(self):
+        formatter = Formatter()
+        assert formatter.format(CALLS[0], line_length=40) != formatter.format(CALLS[0])
+        assert formatter.misses == 2
+
+    def test_evicts_least_recently_used(self):
+        formatter = Formatter(max_entries=2)
+        formatter.format(CALLS[0])
+        formatter.format(CALLS[1])
+        formatter.format(CALLS[0])
+        formatter.format(CALLS[2])
+
+        assert len(formatter) == 2
+        formatter.format(CALLS[0])
+        assert formatter.hits == 2
+        formatter.format(CALLS[1])
+        assert formatter.misses == 4
+
+    def test_formats_many_with_one_black_call(self):
+        sources = CALLS + ["def f():\n    return 1", "class A:\n    x = 1", CALLS[0]]
+        profiler = Profiler()
+        with profiler.activate():
+            formatted = Formatter().format_many(sources)
+
+        assert profiler.counters["black_format_calls"] == 1
+        assert formatted == [Formatter().format(source) for source in sources]
+
+    def test_formats_many_separately_when_batch_is_invalid(self):
+        sources = ["from __future__ import annotations\nx = 1", "y  =  2"]
+        formatted = Formatter().format_many(sources)
+        assert formatted == ["from __future__ import annotations\n\nx = 1\n", "y = 2\n"]
+
+
+def test_migrate_without_formatting_calls(base_scripts_folder):
+    source = (base_scripts_folder / "infra_and_storage" / "start.py").read_bytes()
+    migration = migrate_source(source, format_calls=False)
+    formatted_migration = migrate_source(source)
+
+    (call,) = migration.calls
+    (formatted_call,) = formatted_migration.calls
+    assert call.updated_code != formatted_call.updated_code
+    assert ast.dump(ast.parse(call.updated_code)) == ast.dump(
+        ast.parse(formatted_call.updated_code)
+    )
+    assert call.original_code == (
+        astor.to_source(ast.parse(call.original_code)).strip() + "\n"
+    )
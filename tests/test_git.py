@@ -0,0 +1,91 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from pmt.git import GitError, changed_files, unstaged_files
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+
+
+def git(repository, *args):
+    subprocess.run(
+        [
+            "git",
+            "-c",
+            "user.name=pmt",
+            "-c",
+            "user.email=pmt@example.com",
+            *args,
+        ],
+        cwd=repository,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repository(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    (tmp_path / "unchanged.py").write_text("print('unchanged')\n")
+    (tmp_path / "deleted.py").write_text("print('deleted')\n")
+    (tmp_path / ".gitignore").write_text("ignored.py\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "initial")
+    git(tmp_path, "checkout", "-q", "-b", "feature")
+    return tmp_path
+
+
+def test_changed_files_since(repository):
+    (repository / "committed.py").write_text("print('committed')\n")
+    git(repository, "add", "committed.py")
+    git(repository, "rm", "-q", "deleted.py")
+    git(repository, "commit", "-q", "-m", "change")
+    (repository / "pkg").mkdir()
+    (repository / "pkg" / "untracked.py").write_text("print('untracked')\n")
+    (repository / "ignored.py").write_text("print('ignored')\n")
+
+    paths = changed_files(since="main", cwd=repository)
+
+    assert [path.as_posix() for path in paths] == [
+        "committed.py",
+        "pkg/untracked.py",
+    ]
+
+
+def test_changed_files_staged(repository):
+    (repository / "staged.py").write_text("print('staged')\n")
+    (repository / "unstaged.py").write_text("print('unstaged')\n")
+    git(repository, "add", "staged.py")
+
+    paths = changed_files(staged=True, cwd=repository)
+
+    assert [path.as_posix() for path in paths] == ["staged.py"]
+
+
+def test_unstaged_files(repository):
+    (repository / "staged.py").write_text("print('staged')\n")
+    git(repository, "add", "staged.py")
+    (repository / "staged.py").write_text("print('edited')\n")
+    (repository / "unchanged.py").write_text("print('edited')\n")
+    (repository / "untracked.py").write_text("print('untracked')\n")
+
+    paths = unstaged_files(cwd=repository)
+
+    assert [path.as_posix() for path in paths] == ["staged.py", "unchanged.py"]
+
+
+def test_changed_files_relative_to_subdirectory(repository):
+    (repository / "pkg").mkdir()
+    (repository / "pkg" / "flow.py").write_text("print('flow')\n")
+    (repository / "other.py").write_text("print('other')\n")
+
+    paths = changed_files(since="main", cwd=repository / "pkg")
+
+    assert set(paths) == {Path("flow.py"), repository.resolve() / "other.py"}
+
+
+def test_changed_files_unknown_ref(repository):
+    with pytest.raises(GitError):
+        changed_files(since="does-not-exist", cwd=repository)
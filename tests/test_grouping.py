@@ -0,0 +1,52 @@
+from pathlib import Path
+
+from pmt.grouping import CallGrouper, group_calls
+from pmt.migrate import CallMigration, FileMigration, migrate_source
+
+SOURCE = """
+from prefect.deployments import Deployment
+
+Deployment.build_from_flow(my_flow, name="a", parameters={"x": 1})
+Deployment.build_from_flow(other_flow, name="b", parameters={"y": [1, 2]})
+Deployment.build_from_flow(my_flow, name="c", tags=["nightly"])
+Deployment.build_from_flow(
+    my_flow, name="d", parameters={}, infrastructure="kubernetes-job/my-job"
+)
+Deployment.build_from_flow(
+    my_flow,
+    name="e",
+    parameters={},
+    infrastructure="kubernetes-job/my-job-default-image",
+)
+"""
+
+
+def test_groups_calls_that_differ_only_in_literals():
+    migration = migrate_source(SOURCE, path="flows.py")
+    assert migration.error is None
+
+    groups = group_calls([migration, migrate_source(SOURCE, path="other.py")])
+
+    assert [len(group) for group in groups] == [4, 2, 2, 2]
+    largest = groups[0]
+    assert largest.representative.span.start_line == 4
+    assert [(str(site.path), site.span.start_line) for site in largest.sites] == [
+        ("flows.py", 4),
+        ("flows.py", 5),
+        ("other.py", 4),
+        ("other.py", 5),
+    ]
+    # the same block type, but only one block configures an image
+    assert groups[2].shape != groups[3].shape
+    assert groups[2].representative.additional_info != (
+        groups[3].representative.additional_info
+    )
+
+
+def test_calls_without_shape_are_not_grouped():
+    call = CallMigration(deployment_name=None, original_code="", updated_code="")
+    grouper = CallGrouper()
+    grouper.add(FileMigration(path=Path("a.py"), calls=[call]))
+    grouper.add(FileMigration(path=Path("b.py"), calls=[call]))
+
+    assert [len(group) for group in grouper.groups] == [1, 1]
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+# pmt runs as a pre-commit hook, so importing the CLI should stay cheap.
+# Measured in microseconds of cumulative import time, as reported by
+# `python -X importtime`.
+IMPORT_TIME_BUDGET = 500_000
+
+# only the CLI itself and the defaults of its options are imported up front
+HEAVY_MODULES = [
+    "black",
+    "prefect",
+    "asyncio",
+    "multiprocessing",
+    "concurrent.futures",
+    "pmt.migrate",
+    "pmt.evaluation",
+    "pmt.blocks",
+    "pmt.cache",
+    "pmt.files",
+    "pmt.formats",
+    "pmt.shard",
+]
+
+
+def run_python(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        import_times[module.strip()] = int(cumulative)
+    return import_times, result.stdout
+
+
+def test_cli_import_time():
+    import_times, _ = run_python("import pmt.cli.app")
+
+    assert import_times["pmt.cli.app"] < IMPORT_TIME_BUDGET
+    for module in HEAVY_MODULES:
+        assert module not in import_times
+
+
+def test_no_calls_does_not_import_formatter_or_prefect(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("print('hello')\n")
+
+    import_times, stdout = run_python(
+        "import sys\n"
+        "from pmt.cli.app import app\n"
+        f"app(['upgrade', 'build-from-flow', {str(script_path)!r}],"
+        " standalone_mode=False)\n"
+        "print(sorted(sys.modules))\n"
+    )
+
+    assert "No calls to Deployment.build_from_flow found" in stdout
+    for module in ["black", "prefect"]:
+        assert module not in import_times
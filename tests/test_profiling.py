@@ -0,0 +1,54 @@
+import time
+
+from pmt.profiling import Profiler, active_profiler, count, phase
+
+
+def test_records_self_time_of_nested_phases():
+    profiler = Profiler()
+    with profiler.activate():
+        with phase("outer", path="flow.py"):
+            time.sleep(0.01)
+            with phase("inner"):
+                time.sleep(0.02)
+
+    totals = profiler.phase_totals()
+    assert totals["inner"]["count"] == 1
+    assert totals["outer"]["total"] >= totals["inner"]["total"] + 0.01
+    assert totals["outer"]["self"] < totals["outer"]["total"] - 0.015
+
+
+def test_phase_and_count_without_active_profiler():
+    assert active_profiler() is None
+    with phase("parse"):
+        count("files_parsed")
+    assert active_profiler() is None
+
+
+def test_merge():
+    worker_profiler = Profiler()
+    with worker_profiler.activate():
+        with phase("migrate_file", path="flow.py"):
+            count("blocks_loaded", 2)
+
+    profiler = Profiler()
+    with profiler.activate():
+        count("blocks_loaded")
+    profiler.merge(worker_profiler.export())
+    profiler.merge(None)
+
+    assert profiler.counters == {"blocks_loaded": 3}
+    assert set(profiler.file_totals()) == {"flow.py"}
+
+
+def test_chrome_trace():
+    profiler = Profiler()
+    with profiler.activate():
+        with phase("parse", path="flow.py"):
+            count("files_parsed")
+
+    trace = profiler.to_chrome_trace()
+    (event,) = trace["traceEvents"]
+    assert event["name"] == "parse"
+    assert event["ph"] == "X"
+    assert event["args"] == {"path": "flow.py"}
+    assert trace["otherData"]["counters"] == {"files_parsed": 1}
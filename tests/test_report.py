@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from pmt.report import ReportError, merge_reports
+
+
+def call_record(path, line, additional_info):
+    return {
+        "path": path,
+        "deployment_name": "my-deployment",
+        "span": {
+            "start_line": line,
+            "start_column": 0,
+            "end_line": line,
+            "end_column": 1,
+        },
+        "original_code": "Deployment.build_from_flow(flow)",
+        "updated_code": "flow.serve()",
+        "additional_info": additional_info,
+        "required_imports": [],
+    }
+
+
+def write_records(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return path
+
+
+def test_merge_reports(tmp_path):
+    first = write_records(
+        tmp_path / "shard-1.jsonl",
+        [
+            call_record("b.py", 10, ["Serve it."]),
+            call_record("b.py", 2, ["Serve it.", "Add a worker."]),
+        ],
+    )
+    second = write_records(
+        tmp_path / "shard-2.jsonl",
+        [
+            call_record("a.py", 1, ["Serve it."]),
+            {"path": "c.py", "error": "SyntaxError: invalid syntax"},
+        ],
+    )
+
+    report = merge_reports([second, first])
+
+    assert report == merge_reports([first, second, first])
+    assert report["summary"] == {"files": 2, "calls": 3, "errors": 1}
+    assert [(call["path"], call["span"]["start_line"]) for call in report["calls"]] == [
+        ("a.py", 1),
+        ("b.py", 2),
+        ("b.py", 10),
+    ]
+    assert report["additional_info"] == [
+        {"message": "Serve it.", "calls": 3, "files": ["a.py", "b.py"]},
+        {"message": "Add a worker.", "calls": 1, "files": ["b.py"]},
+    ]
+    assert report["errors"] == [
+        {"path": "c.py", "error": "SyntaxError: invalid syntax"}
+    ]
+
+
+def test_merge_empty_reports(tmp_path):
+    report = merge_reports([write_records(tmp_path / "shard-1.jsonl", [])])
+
+    assert report["summary"] == {"files": 0, "calls": 0, "errors": 0}
+
+
+def test_merge_invalid_report(tmp_path):
+    path = tmp_path / "shard-1.jsonl"
+    path.write_text('{"path": "a.py"}\nnot json\n')
+
+    with pytest.raises(ReportError, match="shard-1.jsonl:2"):
+        merge_reports([path])
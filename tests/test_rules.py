@@ -0,0 +1,232 @@
+import ast
+import gc
+import weakref
+from pathlib import Path
+
+import pytest
+
+from pmt import rules
+from pmt.files import count_candidate_calls, filter_candidates
+from pmt.migrate import migrate_files
+from pmt.rules import Rewrite, Rule, RuleEngine, get_rule, register_rule
+from pmt.transformers import BuildFromFlowRule, NO_INFRA_ADDITIONAL_INFO
+from pmt.utils import convert_ast_node_to_source_code
+
+SOURCE = """
+from prefect import flow
+from prefect.deployments import Deployment
+
+@flow
+def my_flow():
+    pass
+
+def deploy():
+    schedule = {"cron": "0 0 * * *"}
+    my_flow.run_deployment("old")
+    Deployment.build_from_flow(my_flow, name="my-deployment")
+"""
+
+
+class RunDeploymentCall(Rewrite):
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def node(self):
+        return self._node
+
+    @property
+    def updated_node(self):
+        return ast.Call(
+            func=ast.Name(id="run_deployment", ctx=ast.Load()),
+            args=self._node.args,
+            keywords=[],
+        )
+
+    @property
+    def required_imports(self):
+        return [ast.parse("from prefect.deployments import run_deployment").body[0]]
+
+
+class RunDeploymentRule(Rule):
+    name = "run-deployment"
+    callee_names = ("my_flow.run_deployment",)
+    markers = (b"run_deployment",)
+
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.visited = []
+        self.scopes = []
+
+    def visit(self, node, scope):
+        self.visited.append(node)
+        self.scopes.append(scope)
+
+    @property
+    def rewrites(self):
+        return [RunDeploymentCall(node) for node in self.visited]
+
+
+class FunctionRule(Rule):
+    name = "functions"
+    node_types = (ast.FunctionDef,)
+
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.visited = []
+
+    def visit(self, node, scope):
+        self.visited.append(node.name)
+
+
+def test_engine_dispatches_nodes_to_rules():
+    tree = ast.parse(SOURCE)
+    engine = RuleEngine(
+        Path("flows.py"),
+        tree,
+        rules=[RunDeploymentRule, FunctionRule, BuildFromFlowRule],
+    )
+
+    engine.collect(tree)
+
+    (call,) = engine.rule(RunDeploymentRule).visited
+    assert convert_ast_node_to_source_code(call) == 'my_flow.run_deployment("old")\n'
+    assert engine.rule(FunctionRule).visited == ["my_flow", "deploy"]
+    assert len(engine.rule(BuildFromFlowRule).calls) == 1
+
+
+def test_rules_share_scopes_and_imports():
+    tree = ast.parse(SOURCE)
+    engine = RuleEngine(
+        Path("flows.py"), tree, rules=[RunDeploymentRule, BuildFromFlowRule]
+    )
+
+    engine.collect(tree)
+
+    (scope,) = engine.rule(RunDeploymentRule).scopes
+    (call,) = engine.rule(BuildFromFlowRule).calls
+    assert scope is call.scope
+    assert scope.lookup("schedule") is not None
+    assert call.imported_names == {"flow": "flow", "Deployment": "Deployment"}
+
+
+def test_engine_rewrites_every_rule_in_one_pass():
+    tree = ast.parse(SOURCE)
+    engine = RuleEngine(
+        Path("flows.py"), tree, rules=[BuildFromFlowRule, RunDeploymentRule]
+    )
+
+    engine.visit(tree)
+
+    code = convert_ast_node_to_source_code(tree)
+    assert '    run_deployment("old")\n' in code
+    assert 'my_flow.serve(name="my-deployment")' in code
+    # rewrites are reported in source order, whichever rule found them
+    assert [type(rewrite) for rewrite in engine.rewrites] == [
+        RunDeploymentCall,
+        type(engine.rule(BuildFromFlowRule).calls[0]),
+    ]
+    assert engine.additional_info == [NO_INFRA_ADDITIONAL_INFO]
+    (required_import,) = engine.required_imports
+    assert required_import.names[0].name == "run_deployment"
+
+
+def test_release_frees_the_tree_without_the_garbage_collector():
+    tree = ast.parse(
+        SOURCE.replace(
+            'name="my-deployment"',
+            'name="my-deployment", infrastructure="kubernetes-job/my-job"',
+        )
+    )
+    tree_ref = weakref.ref(tree)
+    engine = RuleEngine(Path("flows.py"), tree, rules=[BuildFromFlowRule])
+    engine.collect(tree)
+    (call,) = engine.rule(BuildFromFlowRule).calls
+    assert call.infrastructure is not None
+
+    gc.disable()
+    try:
+        engine.release()
+        del tree, engine
+        # the call keeps its engine, and so the tree, alive
+        assert tree_ref() is not None
+        del call
+        assert tree_ref() is None
+    finally:
+        gc.enable()
+
+
+def test_calls_outlive_their_engine():
+    tree = ast.parse(SOURCE)
+    engine = RuleEngine(Path("flows.py"), tree, rules=[BuildFromFlowRule])
+    engine.visit(tree)
+    calls = engine.rule(BuildFromFlowRule).calls
+    del engine
+
+    (call,) = calls
+    assert call.additional_info == [NO_INFRA_ADDITIONAL_INFO]
+    assert call.updated_node.func.attr == "serve"
+
+
+def test_engine_applies_registered_rules_by_default(monkeypatch):
+    monkeypatch.setattr(rules, "_RULES", dict(rules._RULES))
+    register_rule(RunDeploymentRule)
+    tree = ast.parse(SOURCE)
+
+    engine = RuleEngine(Path("flows.py"), tree)
+    engine.collect(tree)
+
+    assert {type(rule) for rule in engine.rules} == {
+        BuildFromFlowRule,
+        RunDeploymentRule,
+    }
+    assert len(engine.rewrites) == 2
+    assert get_rule("run-deployment") is RunDeploymentRule
+
+
+def test_files_are_prescanned_for_markers_of_every_rule(tmp_path, monkeypatch):
+    monkeypatch.setattr(rules, "_RULES", dict(rules._RULES))
+    register_rule(RunDeploymentRule)
+    path = tmp_path / "flows.py"
+    path.write_text('my_flow.run_deployment("old")\n')
+    other_path = tmp_path / "other.py"
+    other_path.write_text('print("no rewrites")\n')
+
+    assert filter_candidates([path, other_path]) == [path]
+    assert count_candidate_calls(path) == 1
+    (migration, other_migration) = migrate_files([path, other_path])
+    (call,) = migration.calls
+    assert call.updated_code == 'run_deployment("old")\n'
+    assert not other_migration.calls
+
+
+def test_register_rule_rejects_duplicate_names(monkeypatch):
+    monkeypatch.setattr(rules, "_RULES", dict(rules._RULES))
+
+    class DuplicateRule(RunDeploymentRule):
+        name = "build-from-flow"
+
+    with pytest.raises(ValueError, match="already registered"):
+        register_rule(DuplicateRule)
+
+
+def test_register_rule_requires_nodes_to_visit():
+    class EmptyRule(Rule):
+        name = "empty"
+
+    with pytest.raises(ValueError, match="must declare"):
+        register_rule(EmptyRule)
+
+
+def test_get_unknown_rule():
+    with pytest.raises(KeyError):
+        get_rule("unknown")
+
+
+def test_rules_must_implement_visit():
+    class EmptyRule(Rule):
+        name = "empty"
+        node_types = (ast.Call,)
+
+    with pytest.raises(TypeError, match="visit"):
+        RuleEngine(Path("flows.py"), ast.parse(SOURCE), rules=[EmptyRule])
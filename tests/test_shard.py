@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+
+from pmt.shard import Shard, ShardBalance, partition, select_shard
+
+
+@pytest.mark.parametrize("value", ["1/4", "4/4"])
+def test_parse_shard(value):
+    assert str(Shard.parse(value)) == value
+
+
+@pytest.mark.parametrize("value", ["0/4", "5/4", "1", "a/b", "1/0", "-1/4"])
+def test_parse_invalid_shard(value):
+    with pytest.raises(ValueError, match="Invalid shard"):
+        Shard.parse(value)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"flows_{i}.py"
+        calls = "Deployment.build_from_flow(flow)\n" * (i % 4)
+        path.write_text(f"from prefect.deployments import Deployment\n{calls}")
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("balance", list(ShardBalance))
+def test_partition_covers_every_file_once(paths, balance):
+    shards = partition(paths, 3, balance)
+
+    assert sorted(path for shard in shards for path in shard) == sorted(paths)
+
+
+@pytest.mark.parametrize("balance", list(ShardBalance))
+def test_partition_is_deterministic(paths, balance):
+    assert partition(paths, 3, balance) == partition(paths[::-1], 3, balance)
+
+
+def test_partition_by_path_is_stable():
+    paths = [Path(f"flows_{i}.py") for i in range(20)]
+    shards = partition(paths, 4)
+
+    # adding a file never moves other files between shards
+    new_shards = partition(paths + [Path("new.py")], 4)
+    for shard, new_shard in zip(shards, new_shards):
+        assert set(shard) <= set(new_shard)
+
+
+def test_partition_balanced_by_calls(paths):
+    shards = partition(paths, 3, ShardBalance.calls)
+
+    # 30 calls in total, in files with 0 to 3 calls each
+    totals = [sum(paths.index(path) % 4 for path in shard) for shard in shards]
+    assert sorted(totals) == [10, 10, 10]
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
+
+
+def test_partition_balanced_by_size(paths):
+    shards = partition(paths, 2, ShardBalance.size)
+
+    totals = [sum(path.stat().st_size for path in shard) for shard in shards]
+    assert abs(totals[0] - totals[1]) <= max(path.stat().st_size for path in paths)
+
+
+def test_select_shard(paths):
+    shards = partition(paths, 3, ShardBalance.calls)
+
+    assert select_shard(paths, Shard(2, 3), ShardBalance.calls) == shards[1]
+
+
+def test_partition_by_path_ignores_where_the_repository_is(tmp_path, monkeypatch):
+    names = [Path(f"flows_{i}.py") for i in range(20)]
+    shards_by_checkout = []
+    for checkout in ["a", "b/nested"]:
+        root = tmp_path / checkout
+        root.mkdir(parents=True)
+        monkeypatch.chdir(root)
+        shards = partition([root / name for name in names], 4)
+        shards_by_checkout.append([[path.name for path in shard] for shard in shards])
+        assert partition(names, 4) == [
+            [path.relative_to(root) for path in shard] for shard in shards
+        ]
+
+    assert shards_by_checkout[0] == shards_by_checkout[1]
@@ -0,0 +1,86 @@
+import ast
+import tracemalloc
+from pathlib import Path
+from typing import Tuple
+
+from benchmarks.corpus import generate_corpus
+from pmt.blocks import BlockDocumentCache
+from pmt.migrate import CallMigration, FileMigration, Span, migrate_files
+from pmt.summary import RunSummary
+
+
+def test_summary_keeps_compact_records():
+    summary = RunSummary()
+    summary.add(
+        FileMigration(
+            path=Path("a.py"),
+            calls=[
+                CallMigration(
+                    deployment_name="'a'",
+                    original_code="Deployment.build_from_flow(flow)",
+                    updated_code="flow.serve()",
+                    additional_info=["first", "second"],
+                    span=Span(1, 0, 1, 32),
+                ),
+                CallMigration(
+                    deployment_name="'b'",
+                    original_code="Deployment.build_from_flow(flow)",
+                    updated_code="flow.serve()",
+                    additional_info=["second"],
+                    span=Span(2, 0, 2, 32),
+                ),
+            ],
+            updated_source="flow.serve()\nflow.serve()\n",
+        )
+    )
+    summary.add(FileMigration(path=Path("b.py"), error="SyntaxError: invalid"))
+
+    assert summary.has_calls
+    assert summary.has_errors
+    assert [len(file.calls) for file in summary.files] == [2, 0]
+    first, second = summary.calls
+    assert (first.path, first.span, first.deployment_name) == (
+        Path("a.py"),
+        Span(1, 0, 1, 32),
+        "'a'",
+    )
+    assert not hasattr(first, "__dict__")
+    # each message is stored once and referenced by bit flag
+    assert (first.info_flags, second.info_flags) == (0b11, 0b10)
+    assert summary.additional_info == ["first", "second"]
+
+
+def _peak_memory(tmp_path: Path, files: int) -> Tuple[int, int]:
+    corpus = generate_corpus(
+        tmp_path, files=files, calls_per_file=5, infra_style="mixed", helpers=2
+    )
+    block_cache = BlockDocumentCache(source=corpus.snapshot)
+    # black has bounded caches of its own, so only the pipeline is measured
+    options = dict(block_cache=block_cache, format_calls=False)
+    list(migrate_files(corpus.paths[:1], **options))
+    # keep every identifier in the corpus interned so that the interpreter's
+    # table of interned strings does not grow while measuring
+    trees = [ast.parse(path.read_bytes()) for path in corpus.paths]
+
+    summary = RunSummary()
+    tracemalloc.start()
+    try:
+        for migration in migrate_files(corpus.paths, **options):
+            summary.add(migration)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(trees) == files
+    assert len(list(summary.calls)) == corpus.calls
+    return peak, corpus.calls
+
+
+def test_peak_memory_stays_flat_as_corpus_grows(tmp_path, monkeypatch):
+    # the trees of a window of files are held together, so keep windows
+    # smaller than either corpus
+    monkeypatch.setattr("pmt.migrate.PREFETCH_WINDOW", 10)
+    small, small_calls = _peak_memory(tmp_path / "small", files=20)
+    large, large_calls = _peak_memory(tmp_path / "large", files=80)
+
+    # only a compact record of each call outlives its file
+    assert large - small < 1024 * (large_calls - small_calls)
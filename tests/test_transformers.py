@@ -2,13 +2,12 @@ from pathlib import Path
 import pytest
 import ast
 
-from prefect.infrastructure import KubernetesJob
-
 from pmt.transformers import (
     INFRA_ADDITIONAL_INFO,
     NO_INFRA_ADDITIONAL_INFO,
     IMAGE_ADDITIONAL_INFO,
     BuildFromFlowTransformer,
+    InfrastructureKwarg,
 )
 from pmt.utils import convert_ast_node_to_source_code
 
@@ -32,22 +31,6 @@ def set_contains_import(node_set, module, name):
     return any(is_matching_import(node, module, name) for node in node_set)
 
 
-@pytest.fixture(autouse=True, scope="session")
-def k8s_block_with_image():
-    block = KubernetesJob(
-        image="my-image:latest",
-    )
-    block.save("my-job")
-    return block
-
-
-@pytest.fixture(autouse=True, scope="session")
-def k8s_block_default_image():
-    block = KubernetesJob()
-    block.save("my-job-default-image")
-    return block
-
-
 class TestBuildFromFlowTransformer:
     def test_finds_calls(self, base_scripts_folder):
         start_code = (
@@ -115,3 +98,165 @@ class TestBuildFromFlowTransformer:
                 required_import.module,
                 required_import.names[0].name,
             )
+
+    def test_loads_block_once_per_call(
+        self, base_scripts_folder, block_source, monkeypatch
+    ):
+        reads = []
+        original_read = block_source.read
+
+        def counting_read(reference):
+            reads.append(reference)
+            return original_read(reference)
+
+        monkeypatch.setattr(block_source, "read", counting_read)
+
+        start_code = (
+            base_scripts_folder / "infra_slug_and_storage_slug" / "start.py"
+        ).read_text()
+        tree = ast.parse(start_code)
+        transformer = BuildFromFlowTransformer(current_file=Path(__file__), tree=tree)
+        transformer.visit(tree)
+        (call,) = transformer.calls
+        convert_ast_node_to_source_code(call.updated_node)
+        assert call.additional_info == [INFRA_ADDITIONAL_INFO]
+        assert [str(reference) for reference in reads] == [
+            "kubernetes-job/my-job-default-image"
+        ]
+
+        call.invalidate()
+        assert call.additional_info == [INFRA_ADDITIONAL_INFO]
+        assert len(reads) == 2
+
+    @pytest.mark.parametrize(
+        "source,expected_reference",
+        [
+            ('"kubernetes-job/my-job"', "kubernetes-job/my-job"),
+            ('KubernetesJob.load("my-job")', "kubernetes-job/my-job"),
+            ('KubernetesJob.load(name="my-job")', "kubernetes-job/my-job"),
+            ('Block.load("kubernetes-job/my-job")', "kubernetes-job/my-job"),
+            ('K8sJob.load("my-job")', "kubernetes-job/my-job"),
+            ("infra", "kubernetes-job/my-job"),
+            ("alias", "kubernetes-job/my-job"),
+            ("KubernetesJob.load(job_name)", None),
+            ("undefined", None),
+        ],
+    )
+    def test_block_reference(self, source, expected_reference):
+        code = f"""
+from prefect.infrastructure import KubernetesJob as K8sJob
+infra = KubernetesJob.load("my-job")
+alias = infra
+Deployment.build_from_flow(my_flow, name="my-deployment", infrastructure={source})
+"""
+        tree = ast.parse(code)
+        transformer = BuildFromFlowTransformer(current_file=Path(__file__), tree=tree)
+        transformer.collect(tree)
+        (call,) = transformer.calls
+        block_reference = call.infrastructure.block_reference
+        assert (str(block_reference) if block_reference else None) == (
+            expected_reference
+        )
+
+    def test_resolves_variables_without_evaluation(
+        self, base_scripts_folder, monkeypatch
+    ):
+        monkeypatch.setattr(
+            InfrastructureKwarg,
+            "_load_block_document_data",
+            lambda self: pytest.fail("infrastructure should not be evaluated"),
+        )
+        start_code = (
+            base_scripts_folder / "infra_var_and_storage_var" / "start.py"
+        ).read_text()
+        tree = ast.parse(start_code)
+        transformer = BuildFromFlowTransformer(current_file=Path(__file__), tree=tree)
+        transformer.visit(tree)
+        assert transformer.additional_info == [INFRA_ADDITIONAL_INFO]
+
+    def test_block_reference_honors_scopes(self):
+        code = """
+infra = KubernetesJob.load("module-job")
+first, second = KubernetesJob.load("first-job"), KubernetesJob.load("second-job")
+(unpacked,) = jobs
+
+def deploy_module():
+    Deployment.build_from_flow(my_flow, name="module", infrastructure=infra)
+
+def deploy_local():
+    infra = KubernetesJob.load("local-job")
+    Deployment.build_from_flow(my_flow, name="local", infrastructure=infra)
+
+def deploy_late():
+    Deployment.build_from_flow(my_flow, name="late", infrastructure=late_infra)
+
+class Deployer:
+    infra = KubernetesJob.load("class-job")
+
+    def __init__(self):
+        self.infra = KubernetesJob.load("attribute-job")
+
+    def deploy(self):
+        Deployment.build_from_flow(my_flow, name="method", infrastructure=infra)
+        Deployment.build_from_flow(
+            my_flow, name="attribute", infrastructure=self.infra
+        )
+
+Deployment.build_from_flow(my_flow, name="second", infrastructure=second)
+Deployment.build_from_flow(my_flow, name="unpacked", infrastructure=unpacked)
+late_infra = KubernetesJob.load("late-job")
+"""
+        tree = ast.parse(code)
+        transformer = BuildFromFlowTransformer(current_file=Path(__file__), tree=tree)
+        transformer.collect(tree)
+        references = {
+            call.deployment_name.strip().strip(
+                "'\""
+            ): call.infrastructure.block_reference
+            for call in transformer.calls
+        }
+        assert {
+            name: reference.block_document_name if reference else None
+            for name, reference in references.items()
+        } == {
+            "module": "module-job",
+            "local": "local-job",
+            "late": "late-job",
+            "method": "module-job",
+            "attribute": "attribute-job",
+            "second": "second-job",
+            "unpacked": None,
+        }
+
+    @pytest.mark.usefixtures("prefect_block_source")
+    def test_evaluates_dynamic_infrastructure_in_worker(self, monkeypatch):
+        from pmt import transformers
+
+        evaluations = []
+        original_evaluate = transformers.evaluate_block_document_data
+
+        def recording_evaluate(namespace, statements, expression):
+            evaluations.append((namespace, statements, expression))
+            return original_evaluate(namespace, statements, expression)
+
+        monkeypatch.setattr(
+            transformers, "evaluate_block_document_data", recording_evaluate
+        )
+        code = """
+from prefect.infrastructure import KubernetesJob
+infra = KubernetesJob.load("my-" + "job")
+Deployment.build_from_flow(my_flow, name="my-deployment", infrastructure=infra)
+"""
+        tree = ast.parse(code)
+        transformer = BuildFromFlowTransformer(current_file=Path(__file__), tree=tree)
+        transformer.visit(tree)
+
+        (call,) = transformer.calls
+        assert call.infrastructure.configured_image == "my-image:latest"
+        ((namespace, statements, expression),) = evaluations
+        assert namespace == str(Path(__file__))
+        assert statements == [
+            "from prefect.infrastructure import KubernetesJob\n",
+            "infra = KubernetesJob.load('my-' + 'job')\n",
+        ]
+        assert expression == "infra\n"
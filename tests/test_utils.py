@@ -0,0 +1,120 @@
+import ast
+from pathlib import Path
+
+import pmt
+
+from pmt.transformers import BuildFromFlowTransformer
+from pmt.utils import patch_source
+
+SOURCE = '''"""My deployments."""
+from __future__ import annotations
+
+# a comment that should be preserved
+from prefect.deployments import Deployment
+
+
+def deploy():
+    x = [1,2,3]  # formatting that should be preserved
+    Deployment.build_from_flow(my_flow, name="my-deployment", storage="github/my-repo")
+'''
+
+
+def test_patch_source():
+    source = SOURCE.encode()
+    tree = ast.parse(source)
+    transformer = BuildFromFlowTransformer(current_file=Path("flows.py"), tree=tree)
+    transformer.collect(tree)
+    tree = transformer.rewrite(tree)
+
+    patched = patch_source(
+        source,
+        tree,
+        [(call.node, call.updated_node) for call in transformer.calls],
+        ["from prefect.blocks.core import Block"],
+    )
+
+    assert (
+        patched
+        == '''"""My deployments."""
+from __future__ import annotations
+from prefect.blocks.core import Block
+
+# a comment that should be preserved
+from prefect.deployments import Deployment
+
+
+def deploy():
+    x = [1,2,3]  # formatting that should be preserved
+    flow.from_source(
+        source=Block.load("github/my-repo"), entrypoint="flows.py:my_flow"
+    ).serve(name="my-deployment")
+'''
+    )
+    ast.parse(patched)
+
+
+def test_patch_source_does_not_duplicate_imports():
+    source = SOURCE.replace(
+        "from __future__ import annotations\n",
+        "from __future__ import annotations\nfrom prefect.blocks.core import Block\n",
+    ).encode()
+    tree = ast.parse(source)
+
+    patched = patch_source(source, tree, [], ["from prefect.blocks.core import Block"])
+
+    assert patched == source.decode()
+
+
+def test_patch_source_adds_each_import_once():
+    source = SOURCE.replace(
+        '    Deployment.build_from_flow(my_flow, name="my-deployment", storage="github/my-repo")\n',
+        '    Deployment.build_from_flow(my_flow, name="a", storage="github/my-repo")\n'
+        '    Deployment.build_from_flow(my_flow, name="b", storage="github/my-repo")\n',
+    )
+
+    migration = pmt.migrate_source(
+        source, path="flows.py", render_source=True, patch=True
+    )
+
+    assert migration.required_imports == ["from prefect.blocks.core import Block"]
+    assert migration.updated_source.count("from prefect.blocks.core import Block") == 1
+
+
+def test_patch_source_formats_calls_from_their_column():
+    source = """def deploy():
+    deployment_with_a_name_long_enough_to_push_it_past = Deployment.build_from_flow(
+        my_flow, name="my-deployment"
+    )
+"""
+
+    migration = pmt.migrate_source(
+        source, path="flows.py", render_source=True, patch=True
+    )
+
+    assert (
+        migration.updated_source
+        == """def deploy():
+    deployment_with_a_name_long_enough_to_push_it_past = my_flow.serve(
+        name="my-deployment"
+    )
+"""
+    )
+
+
+def test_patch_source_keeps_crlf_line_endings():
+    source = SOURCE.replace("\n", "\r\n").encode()
+    tree = ast.parse(source)
+    transformer = BuildFromFlowTransformer(current_file=Path("flows.py"), tree=tree)
+    transformer.collect(tree)
+    tree = transformer.rewrite(tree)
+
+    patched = patch_source(
+        source,
+        tree,
+        [(call.node, call.updated_node) for call in transformer.calls],
+        ["from prefect.blocks.core import Block"],
+    )
+
+    assert "from prefect.blocks.core import Block\r\n" in patched
+    assert "\n" not in patched.replace("\r\n", "")
+    ast.parse(patched)
@@ -0,0 +1,56 @@
+import sys
+
+import pytest
+
+from pmt.watch import InotifyWatcher, PollingWatcher, create_watcher
+
+
+@pytest.fixture
+def watched(tmp_path):
+    (tmp_path / "flows.py").write_text("print('flows')\n")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    return tmp_path
+
+
+def test_polling_watcher(watched):
+    watcher = PollingWatcher([watched], interval=0.01)
+
+    assert watcher.wait(timeout=0) == set()
+
+    (watched / "flows.py").write_text("print('updated flows')\n")
+    (watched / "notes.txt").write_text("updated notes\n")
+    (watched / "package").mkdir()
+    (watched / "package" / "new.py").write_text("print('new')\n")
+    assert watcher.wait(timeout=1) == {
+        watched / "flows.py",
+        watched / "package" / "new.py",
+    }
+
+    (watched / "flows.py").unlink()
+    assert watcher.wait(timeout=1) == {watched / "flows.py"}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="requires inotify")
+def test_inotify_watcher(watched):
+    watcher = InotifyWatcher([watched])
+    try:
+        assert watcher.wait(timeout=0) == set()
+
+        (watched / "flows.py").write_text("print('updated flows')\n")
+        (watched / "notes.txt").write_text("updated notes\n")
+        assert watcher.wait(timeout=1) == {watched / "flows.py"}
+
+        (watched / "package").mkdir()
+        (watched / "package" / "new.py").write_text("print('new')\n")
+        changed = watcher.wait(timeout=1)
+        (watched / "package" / "new.py").write_text("print('updated new')\n")
+        changed |= watcher.wait(timeout=1)
+        assert changed == {watched / "package" / "new.py"}
+    finally:
+        watcher.close()
+
+
+def test_create_watcher_polling(watched):
+    watcher = create_watcher([watched], polling=True)
+
+    assert isinstance(watcher, PollingWatcher)
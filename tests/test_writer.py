@@ -0,0 +1,86 @@
+import json
+import os
+import stat
+
+import pytest
+
+from pmt.writer import AtomicFileWriter
+
+
+def test_writes_files_atomically(tmp_path):
+    paths = [tmp_path / f"flow_{i}.py" for i in range(10)]
+    for path in paths:
+        path.write_text("original\n")
+
+    with AtomicFileWriter(queue_size=2) as writer:
+        for i, path in enumerate(paths):
+            writer.submit(path, f"updated {i}\n")
+
+    assert [path.read_text() for path in paths] == [f"updated {i}\n" for i in range(10)]
+    assert [result.path for result in writer.results] == paths
+    assert all(result.written for result in writer.results)
+    # no temporary files are left behind
+    assert sorted(tmp_path.iterdir()) == paths
+
+
+def test_preserves_file_mode(tmp_path):
+    path = tmp_path / "flow.py"
+    path.write_text("original\n")
+    path.chmod(0o755)
+
+    with AtomicFileWriter() as writer:
+        writer.submit(path, "updated\n")
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o755
+
+
+def test_skips_unchanged_files(tmp_path):
+    path = tmp_path / "flow.py"
+    path.write_text("original\n")
+
+    with AtomicFileWriter(backup_suffix=".bak") as writer:
+        writer.submit(path, "original\n")
+
+    (result,) = writer.results
+    assert not result.written
+    assert result.original_sha256 == result.updated_sha256
+    assert not (tmp_path / "flow.py.bak").exists()
+
+
+def test_backup(tmp_path):
+    path = tmp_path / "flow.py"
+    path.write_text("original\n")
+
+    with AtomicFileWriter(backup_suffix=".bak") as writer:
+        writer.submit(path, "updated\n")
+
+    assert path.read_text() == "updated\n"
+    assert (tmp_path / "flow.py.bak").read_text() == "original\n"
+    assert writer.results[0].backup_path == tmp_path / "flow.py.bak"
+
+
+@pytest.mark.parametrize("dry_run", [True, False])
+def test_manifest(tmp_path, dry_run):
+    path = tmp_path / "flow.py"
+    path.write_text("original\n")
+    manifest = tmp_path / "manifest.jsonl"
+
+    with AtomicFileWriter(dry_run=dry_run, manifest=manifest) as writer:
+        writer.submit(path, "updated\n")
+
+    assert path.read_text() == ("original\n" if dry_run else "updated\n")
+    (record,) = [json.loads(line) for line in manifest.read_text().splitlines()]
+    assert record["path"] == str(path)
+    assert record["written"] is not dry_run
+    assert record["original_sha256"] != record["updated_sha256"]
+
+
+def test_reports_write_errors(tmp_path):
+    path = tmp_path / "missing" / "flow.py"
+
+    with AtomicFileWriter() as writer:
+        writer.submit(path, "updated\n")
+
+    (result,) = writer.results
+    assert not result.written
+    assert result.error.startswith("FileNotFoundError")